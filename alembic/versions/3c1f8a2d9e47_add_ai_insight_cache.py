@@ -0,0 +1,40 @@
+"""Add ai_insight_cache table
+
+Revision ID: 3c1f8a2d9e47
+Revises: b79e07fb54c9
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c1f8a2d9e47'
+down_revision = 'b79e07fb54c9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'ai_insight_cache',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('osm_id', sa.BigInteger(), nullable=False),
+        sa.Column('preference_key', sa.String(), nullable=False, server_default=''),
+        sa.Column('variants', sa.JSON(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+        sa.UniqueConstraint('osm_id', 'preference_key', name='uq_ai_insight_cache_osm_id_preference_key'),
+    )
+    op.create_index('ix_ai_insight_cache_id', 'ai_insight_cache', ['id'])
+    op.create_index('ix_ai_insight_cache_osm_id', 'ai_insight_cache', ['osm_id'])
+    op.create_index('ix_ai_insight_cache_expires_at', 'ai_insight_cache', ['expires_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_ai_insight_cache_expires_at', table_name='ai_insight_cache')
+    op.drop_index('ix_ai_insight_cache_osm_id', table_name='ai_insight_cache')
+    op.drop_index('ix_ai_insight_cache_id', table_name='ai_insight_cache')
+    op.drop_table('ai_insight_cache')
@@ -0,0 +1,24 @@
+"""Add memory_snapshot_hash to user_trips
+
+Revision ID: 5a9e3f0b7c21
+Revises: 8d4b27e1c5f3
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5a9e3f0b7c21'
+down_revision = '8d4b27e1c5f3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('user_trips', sa.Column('memory_snapshot_hash', sa.String(length=64), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('user_trips', 'memory_snapshot_hash')
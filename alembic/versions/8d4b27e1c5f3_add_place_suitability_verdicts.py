@@ -0,0 +1,38 @@
+"""Add place_suitability_verdicts table
+
+Revision ID: 8d4b27e1c5f3
+Revises: 3c1f8a2d9e47
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d4b27e1c5f3'
+down_revision = '3c1f8a2d9e47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'place_suitability_verdicts',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('osm_id', sa.BigInteger(), nullable=False),
+        sa.Column('name', sa.String(), nullable=True),
+        sa.Column('is_suitable', sa.Boolean(), nullable=False),
+        sa.Column('judged_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+    )
+    op.create_index('ix_place_suitability_verdicts_id', 'place_suitability_verdicts', ['id'])
+    op.create_index('ix_place_suitability_verdicts_osm_id', 'place_suitability_verdicts', ['osm_id'], unique=True)
+    op.create_index('ix_place_suitability_verdicts_expires_at', 'place_suitability_verdicts', ['expires_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_place_suitability_verdicts_expires_at', table_name='place_suitability_verdicts')
+    op.drop_index('ix_place_suitability_verdicts_osm_id', table_name='place_suitability_verdicts')
+    op.drop_index('ix_place_suitability_verdicts_id', table_name='place_suitability_verdicts')
+    op.drop_table('place_suitability_verdicts')
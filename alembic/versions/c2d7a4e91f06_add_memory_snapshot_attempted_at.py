@@ -0,0 +1,24 @@
+"""Add memory_snapshot_attempted_at to user_trips
+
+Revision ID: c2d7a4e91f06
+Revises: 5a9e3f0b7c21
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2d7a4e91f06'
+down_revision = '5a9e3f0b7c21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('user_trips', sa.Column('memory_snapshot_attempted_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('user_trips', 'memory_snapshot_attempted_at')
@@ -1,21 +1,33 @@
 # /backend/api/itinerary.py (Complete File)
 
-from fastapi import APIRouter, Depends, Request, Response, status, Query
+import asyncio
+import json
+import logging
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Dict, Any
 
 from schemas import itinerary_schemas
-from database import get_db
+from database import AsyncSessionLocal, get_db
 from models.all_models import UserAccount
-from services import itinerary_service, location_service # <<< ADD location_service
+from services import autocomplete_service, itinerary_service, location_service # <<< ADD location_service
 from api.users import get_current_active_user
 
 from fastapi_cache.decorator import cache
+from core import constants
 from core.limiter import limiter
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 
+def _sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
 @router.post(
     "/generate-itinerary",
     response_model=itinerary_schemas.ItineraryResponse,
@@ -45,6 +57,67 @@ async def generate_itinerary_endpoint(
         gemini_model=gemini_model
     )
 
+@router.post(
+    "/generate-itinerary/stream",
+    summary="Generate a New Itinerary as a Server-Sent Events Stream",
+    status_code=status.HTTP_200_OK
+)
+@limiter.limit("10/hour")
+async def generate_itinerary_stream_endpoint(
+    payload: itinerary_schemas.ItineraryRequest,
+    request: Request,
+    current_user: UserAccount = Depends(get_current_active_user),
+):
+    """
+    Generates a new itinerary and streams it as Server-Sent Events: 'stage' progress,
+    each 'leg' as the planner commits it, 'insight', 'weather' and 'title' patches, and
+    finally 'complete' with the saved itinerary (or 'error').
+    """
+    http_client = request.app.state.httpx_client
+    gemini_model = request.app.state.gemini_model
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def on_event(event: str, data: Dict[str, Any]) -> None:
+        await queue.put((event, data))
+
+    async def run_build() -> None:
+        # The stream outlives the request's dependencies, so it uses its own session.
+        async with AsyncSessionLocal() as db:
+            try:
+                itinerary = await itinerary_service.build_itinerary(
+                    payload=payload,
+                    db=db,
+                    current_user=current_user,
+                    http_client=http_client,
+                    gemini_model=gemini_model,
+                    on_event=on_event
+                )
+                await queue.put(("complete", itinerary.model_dump(mode='json')))
+            except HTTPException as e:
+                await db.rollback()
+                await queue.put(("error", {"status_code": e.status_code, "detail": e.detail}))
+            except Exception as e:
+                await db.rollback()
+                logger.error(f"Streamed itinerary generation failed: {e}", exc_info=True)
+                await queue.put(("error", {"status_code": status.HTTP_500_INTERNAL_SERVER_ERROR, "detail": "Could not generate the itinerary."}))
+            finally:
+                await queue.put(None)
+
+    async def event_stream():
+        build_task = asyncio.create_task(run_build())
+        try:
+            while (message := await queue.get()) is not None:
+                yield _sse_event(*message)
+        finally:
+            # The client went away before the build finished.
+            if not build_task.done():
+                build_task.cancel()
+
+    return StreamingResponse(
+        event_stream(), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # +++ NEW ENDPOINT +++
 @router.get(
     "/reverse-geocode",
@@ -65,6 +138,25 @@ async def reverse_geocode(
     return address_details
 
 
+@router.get(
+    "/autocomplete",
+    response_model=itinerary_schemas.AutocompleteResponse,
+    summary="Autocomplete Place Names"
+)
+@limiter.limit("120/minute")
+async def autocomplete_place_names(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=100, description="What the user has typed so far"),
+    limit: int = Query(constants.AUTOCOMPLETE_DEFAULT_LIMIT, ge=1, le=constants.AUTOCOMPLETE_MAX_LIMIT)
+):
+    """
+    Suggests places for a partial name from the local gazetteer and previously geocoded
+    places, without calling Nominatim. Each suggestion carries coordinates that can be
+    sent as `start_lat`/`start_lon` when generating the itinerary.
+    """
+    return {"query": q, "suggestions": autocomplete_service.suggest(q, limit)}
+
+
 @router.post(
     "/serendipity-suggestion",
     response_model=itinerary_schemas.SerendipityResponse,
@@ -122,4 +214,52 @@ async def insert_activity_endpoint(
         # gmaps_client=gmaps_client, # <<< REMOVE THIS ARGUMENT
         gemini_model=gemini_model,
         current_user=current_user,
-    )
\ No newline at end of file
+    )
+
+@router.post(
+    "/insert-activities",
+    response_model=itinerary_schemas.ItineraryResponse,
+    summary="Insert Several Activities into an Itinerary"
+)
+async def insert_activities_endpoint(
+    payload: itinerary_schemas.ItineraryBatchInsertionRequest,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: UserAccount = Depends(get_current_active_user),
+):
+    """
+    Places several new activities into an existing itinerary with one matrix lookup and one save.
+    """
+    http_client = request.app.state.httpx_client
+
+    return await itinerary_service.insert_activities_into_itinerary(
+        payload=payload,
+        db=db,
+        http_client=http_client,
+        current_user=current_user,
+    )
+
+
+@router.post(
+    "/replan",
+    response_model=itinerary_schemas.ItineraryResponse,
+    summary="Replan the Rest of a Trip from the Current Position"
+)
+async def replan_endpoint(
+    payload: itinerary_schemas.ReplanRequest,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: UserAccount = Depends(get_current_active_user),
+):
+    """
+    Keeps completed stops, drops stops that no longer fit and refills the rest of the day
+    from the trip's cached candidate pool.
+    """
+    http_client = request.app.state.httpx_client
+
+    return await itinerary_service.replan_trip_itinerary(
+        payload=payload,
+        db=db,
+        http_client=http_client,
+        current_user=current_user,
+    )
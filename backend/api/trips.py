@@ -6,12 +6,14 @@ from fastapi import APIRouter, Depends, HTTPException, Path as FastApiPath, Requ
 from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from core import ai_bulkhead
 from database import get_db
 from models.all_models import UserAccount, UserTrip
-from schemas.itinerary_schemas import (MemorySnapshotResponse,
+from schemas.itinerary_schemas import (ItineraryResponse,
+                                         MemorySnapshotResponse,
                                          TripCompletionStatus,
                                          TripListResponse, UserTripPydantic)
-from services import ai_service
+from services import itinerary_service, memory_snapshot_service
 from api.users import get_current_active_user
 
 router = APIRouter()
@@ -71,6 +73,28 @@ async def get_user_trip_details(
     return UserTripPydantic.from_orm(trip)
 
 
+@router.get("/{trip_uuid}/itinerary", response_model=ItineraryResponse, summary="Get a Trip's Current Itinerary")
+async def get_trip_itinerary(
+    request: Request,
+    trip_uuid: str = FastApiPath(..., description="The UUID of the trip whose itinerary to fetch."),
+    db: AsyncSession = Depends(get_db),
+    current_user: UserAccount = Depends(get_current_active_user),
+):
+    """
+    Returns the trip's itinerary as currently saved. For trips generated with deferred
+    enrichment, poll until `enrichment_status` is no longer 'pending'.
+    """
+    stmt = select(UserTrip).where(
+        UserTrip.trip_uuid == trip_uuid, UserTrip.user_id == current_user.id
+    )
+    result = await db.execute(stmt)
+    trip = result.scalars().first()
+    if not trip:
+        raise HTTPException(status_code=404, detail="Trip not found or access denied.")
+
+    return itinerary_service.get_trip_itinerary(trip, request.app.state.gemini_model)
+
+
 @router.post("/{trip_uuid}/complete", response_model=TripCompletionStatus, summary="Mark Trip as Completed")
 async def mark_trip_as_completed(
     trip_uuid: str = FastApiPath(
@@ -112,6 +136,29 @@ async def mark_trip_as_completed(
     )
 
 
+@router.post("/{trip_uuid}/optimize", response_model=ItineraryResponse, summary="Reorder Trip Stops to Minimize Travel")
+async def optimize_trip(
+    request: Request,
+    trip_uuid: str = FastApiPath(..., description="The UUID of the trip to optimize."),
+    db: AsyncSession = Depends(get_db),
+    current_user: UserAccount = Depends(get_current_active_user),
+):
+    """
+    Reorders the stops of a saved trip to shorten travel, re-times every leg and saves the result.
+    """
+    stmt = select(UserTrip).where(
+        UserTrip.trip_uuid == trip_uuid, UserTrip.user_id == current_user.id
+    )
+    result = await db.execute(stmt)
+    trip = result.scalars().first()
+    if not trip:
+        raise HTTPException(status_code=404, detail="Trip not found or access denied.")
+
+    return await itinerary_service.optimize_trip_itinerary(
+        trip=trip, db=db, http_client=request.app.state.httpx_client
+    )
+
+
 @router.post(
     "/{trip_uuid}/generate-memory-snapshot",
     response_model=MemorySnapshotResponse,
@@ -122,12 +169,13 @@ async def generate_trip_memory_snapshot(
     trip_uuid: str = FastApiPath(
         ..., description="The UUID of the trip for snapshot generation."
     ),
+    force: bool = Query(False, description="Regenerate even if the trip has not changed since the last snapshot."),
     db: AsyncSession = Depends(get_db),
     current_user: UserAccount = Depends(get_current_active_user),
 ):
     """
-    Generates and saves a narrative 'memory' for a trip using the AI service.
-    If a memory already exists, it will be regenerated.
+    Returns a narrative 'memory' for a trip, generating and saving it with the AI service
+    only when the trip's content has changed since the stored one (or `force` is set).
     """
     stmt = select(UserTrip).where(
         UserTrip.trip_uuid == trip_uuid, UserTrip.user_id == current_user.id
@@ -138,24 +186,22 @@ async def generate_trip_memory_snapshot(
         raise HTTPException(status_code=404, detail="Trip not found or access denied.")
 
     gemini_model = request.app.state.gemini_model
+    await ai_bulkhead.begin_request(current_user.id)
 
-    snapshot_text = await ai_service.generate_ai_memory_snapshot_text(
-        gemini_model=gemini_model, trip=trip
+    snapshot_text, generated = await memory_snapshot_service.get_or_generate_snapshot(
+        db=db, gemini_model=gemini_model, trip=trip, force=force
     )
 
-    if snapshot_text and "taking a break" not in snapshot_text.lower():
-        trip.memory_snapshot_text = snapshot_text
-        trip.updated_at = datetime.now(dt_timezone.utc)
-        db.add(trip)
-        await db.commit()
-        return MemorySnapshotResponse(
-            trip_uuid=trip.trip_uuid,
-            memory_snapshot_text=snapshot_text,
-            message="Memory snapshot generated successfully.",
-        )
+    if generated:
+        message = "Memory snapshot generated successfully."
+    elif snapshot_text and (force or trip.memory_snapshot_hash != memory_snapshot_service.snapshot_content_hash(trip)):
+        message = "Could not regenerate the memory snapshot; showing the previous one."
+    elif snapshot_text:
+        message = "Memory snapshot is up to date."
     else:
-        return MemorySnapshotResponse(
-            trip_uuid=trip.trip_uuid,
-            memory_snapshot_text=None,
-            message="Failed to generate memory snapshot.",
-        )
\ No newline at end of file
+        message = "Failed to generate memory snapshot."
+    return MemorySnapshotResponse(
+        trip_uuid=trip.trip_uuid,
+        memory_snapshot_text=snapshot_text,
+        message=message,
+    )
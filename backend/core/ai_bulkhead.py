@@ -0,0 +1,243 @@
+# /backend/core/ai_bulkhead.py
+
+import asyncio
+import contextvars
+import functools
+import heapq
+import itertools
+import logging
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from core import cache, constants
+
+logger = logging.getLogger(__name__)
+
+# Process-wide limit on concurrent Gemini calls. Waiting calls are admitted in priority
+# order, so a critical-path keyword call overtakes a queued weather sentence, and a few
+# slots are held back for critical calls only. Each request also gets a token budget
+# (plus a per-user daily one); once either is spent, non-critical calls are refused with
+# AiBudgetExhausted, which the AI functions treat like any other failure and fall back.
+#
+# `guarded_generation` wraps the model the same way `cached_generation` does. List it
+# above `cached_generation` so cache hits neither wait for a slot nor spend tokens.
+
+F = TypeVar("F", bound=Callable[..., Awaitable[Any]])
+
+PRIORITIES: Dict[str, int] = {"critical": 0, "normal": 1, "decorative": 2}
+
+
+class AiBudgetExhausted(Exception):
+    """Raised instead of making a non-critical AI call once a token budget is spent."""
+
+    def __init__(self, message: str, budget: Optional["TokenBudget"] = None):
+        super().__init__(message)
+        self.budget = budget
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token) when the response has no usage data."""
+    return max(1, len(text) // 4) if text else 0
+
+
+class PriorityBulkhead:
+    """A semaphore whose waiters are admitted lowest priority value first, then FIFO."""
+
+    def __init__(self, limit: int, reserved_for_critical: int = 0):
+        self.limit = limit
+        self.reserved_for_critical = min(reserved_for_critical, limit - 1)
+        self.active = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._order = itertools.count()
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    def _cap(self, priority: int) -> int:
+        return self.limit if priority == PRIORITIES["critical"] else self.limit - self.reserved_for_critical
+
+    def _admit_waiters(self) -> None:
+        while self._waiters:
+            priority, _, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+            elif self.active < self._cap(priority):
+                heapq.heappop(self._waiters)
+                self.active += 1
+                future.set_result(None)
+            else:
+                break
+
+    async def acquire(self, priority: int) -> None:
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._order), future))
+        self._admit_waiters()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Admitted just as the caller gave up (e.g. a wait_for timeout).
+                self.release()
+            raise
+
+    def release(self) -> None:
+        self.active -= 1
+        self._admit_waiters()
+
+
+class TokenBudget:
+    """Tokens spent by one request, checked against the request and per-user daily limits."""
+
+    def __init__(self, user_id: Optional[int], limit: int, user_daily_limit: int, user_used_today: int = 0):
+        self.user_id = user_id
+        self.limit = limit
+        self.user_daily_limit = user_daily_limit
+        self.user_used_today = user_used_today
+        self.used = 0
+
+    @property
+    def exhausted(self) -> bool:
+        return self.used >= self.limit or self.user_used_today + self.used >= self.user_daily_limit
+
+
+_bulkhead: Optional[PriorityBulkhead] = None
+_current_budget: contextvars.ContextVar[Optional[TokenBudget]] = contextvars.ContextVar("ai_token_budget", default=None)
+_stats: Dict[str, Counter] = {}
+
+
+def get_bulkhead() -> PriorityBulkhead:
+    global _bulkhead
+    if _bulkhead is None:
+        _bulkhead = PriorityBulkhead(constants.AI_MAX_CONCURRENT_CALLS, constants.AI_CRITICAL_RESERVED_SLOTS)
+    return _bulkhead
+
+
+def _user_usage_key(user_id: int) -> str:
+    return f"ai_tokens:{user_id}:{datetime.now(dt_timezone.utc).date().isoformat()}"
+
+
+async def begin_request(user_id: Optional[int]) -> TokenBudget:
+    """
+    Starts a token budget for the current request. AI calls made in this context, and in
+    tasks created from it, are charged to it.
+    """
+    used_today = 0
+    redis = cache.get_redis()
+    if redis is not None and user_id is not None:
+        try:
+            used_today = int(await redis.get(_user_usage_key(user_id)) or 0)
+        except Exception as e:
+            logger.warning(f"Could not read AI token usage for user {user_id}: {e}")
+    budget = TokenBudget(user_id, constants.AI_TOKEN_BUDGET_PER_REQUEST, constants.AI_TOKEN_BUDGET_PER_USER_PER_DAY, used_today)
+    _current_budget.set(budget)
+    return budget
+
+
+def current_budget() -> Optional[TokenBudget]:
+    return _current_budget.get()
+
+
+async def _charge(budget: TokenBudget, tokens: int) -> None:
+    budget.used += tokens
+    if budget.user_id is None:
+        return
+    redis = cache.get_redis()
+    if redis is None:
+        return
+    try:
+        key = _user_usage_key(budget.user_id)
+        await redis.incrby(key, tokens)
+        await redis.expire(key, 2 * 24 * 3600)
+    except Exception as e:
+        logger.warning(f"Could not record AI token usage for user {budget.user_id}: {e}")
+
+
+def _response_tokens(prompt: Any, response: Any) -> int:
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None and getattr(usage, "total_token_count", None):
+        return int(usage.total_token_count)
+    try:
+        text = response.text or ""
+    except Exception:
+        text = ""
+    return estimate_tokens(str(prompt)) + estimate_tokens(text)
+
+
+class _GuardedModel:
+    """Proxy around a GenerativeModel whose `generate_content_async` goes through the bulkhead."""
+
+    def __init__(self, model: Any, name: str):
+        self._model = model
+        self._name = name
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._model, attr)
+
+    async def generate_content_async(self, prompt: Any, *args: Any, **kwargs: Any) -> Any:
+        stats = _stats.setdefault(self._name, Counter())
+        priority_name = constants.AI_CALL_PRIORITIES.get(self._name, "normal")
+        budget = _current_budget.get()
+        if budget is not None and budget.exhausted and priority_name != "critical":
+            stats["refused"] += 1
+            raise AiBudgetExhausted(f"AI token budget spent; skipping '{self._name}' call.", budget)
+
+        bulkhead = get_bulkhead()
+        queued_at = asyncio.get_running_loop().time()
+        await bulkhead.acquire(PRIORITIES[priority_name])
+        stats["wait_ms"] += int((asyncio.get_running_loop().time() - queued_at) * 1000)
+        stats["calls"] += 1
+        try:
+            response = await self._model.generate_content_async(prompt, *args, **kwargs)
+        finally:
+            bulkhead.release()
+        tokens = _response_tokens(prompt, response)
+        stats["tokens"] += tokens
+        if budget is not None:
+            await _charge(budget, tokens)
+        return response
+
+
+def _guard(model: Any, name: str) -> _GuardedModel:
+    # A guarded function handing its model to another one (e.g. the per-item insight
+    # fallback) must not nest proxies: each call takes one slot and is charged once.
+    return _GuardedModel(model._model if isinstance(model, _GuardedModel) else model, name)
+
+
+def guarded_generation(name: str) -> Callable[[F], F]:
+    """
+    Decorates an AI function whose first argument (or `gemini_model` keyword) is the
+    Gemini model, so its calls share the bulkhead at the priority AI_CALL_PRIORITIES
+    gives `name` and are charged to the current token budget.
+    """
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if "gemini_model" in kwargs:
+                if kwargs["gemini_model"]:
+                    kwargs["gemini_model"] = _guard(kwargs["gemini_model"], name)
+            elif args and args[0]:
+                args = (_guard(args[0], name),) + args[1:]
+            return await func(*args, **kwargs)
+        return wrapper  # type: ignore[return-value]
+    return decorator
+
+
+def stats() -> Dict[str, Any]:
+    """Slot usage plus per-function call, refusal, wait and token counts since startup."""
+    bulkhead = get_bulkhead()
+    return {
+        "active": bulkhead.active,
+        "waiting": bulkhead.waiting,
+        "limit": bulkhead.limit,
+        "functions": {
+            name: {
+                "calls": counts["calls"],
+                "refused": counts["refused"],
+                "tokens": counts["tokens"],
+                "mean_wait_ms": round(counts["wait_ms"] / counts["calls"]) if counts["calls"] else None,
+            }
+            for name, counts in sorted(_stats.items())
+        },
+    }
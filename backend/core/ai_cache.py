@@ -0,0 +1,145 @@
+# /backend/core/ai_cache.py
+
+import dataclasses
+import functools
+import hashlib
+import json
+import logging
+import random
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, TypeVar
+
+from core import ai_bulkhead, cache, constants, singleflight
+
+logger = logging.getLogger(__name__)
+
+# Response cache for Gemini calls. `cached_generation` wraps an AI function so the model
+# it receives answers repeated prompts from the shared two-tier cache (in-process +
+# Redis). Keys hash the whitespace-normalized prompt, the generation config and the
+# model name. Calls above AI_CACHE_MAX_TEMPERATURE are meant to vary, so they bypass
+# the cache unless the function keeps several variants to pick from. Concurrent misses
+# for the same key are coalesced into one call.
+
+F = TypeVar("F", bound=Callable[..., Awaitable[Any]])
+
+_stats: Dict[str, Counter] = {}
+
+
+class _CachedResponse:
+    """Stands in for a Gemini response; callers only read `.text`."""
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+def _config_dict(generation_config: Any) -> Dict[str, Any]:
+    if generation_config is None:
+        return {}
+    if dataclasses.is_dataclass(generation_config):
+        return dataclasses.asdict(generation_config)
+    if isinstance(generation_config, dict):
+        return dict(generation_config)
+    return {"repr": repr(generation_config)}
+
+
+def _cache_key(name: str, model_name: str, prompt: str, config: Dict[str, Any]) -> str:
+    normalized_prompt = " ".join(str(prompt).split())
+    digest = hashlib.sha256(
+        json.dumps([model_name, normalized_prompt, config], sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+    return f"ai_response:{name}:{digest}"
+
+
+def _filled_slots(entry: Any) -> int:
+    """Variant slots used so far; duplicates of a stored text count too."""
+    if not isinstance(entry, dict):
+        return 0
+    return max(entry.get("slots", 0), len(entry.get("texts", [])))
+
+
+class _CachingModel:
+    """Proxy around a GenerativeModel whose `generate_content_async` goes through the cache."""
+
+    def __init__(self, model: Any, name: str):
+        self._model = model
+        self._name = name
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._model, attr)
+
+    async def generate_content_async(self, prompt: Any, generation_config: Any = None, **kwargs: Any) -> Any:
+        stats = _stats.setdefault(self._name, Counter())
+        config = _config_dict(generation_config)
+        variants = constants.AI_CACHE_VARIANTS.get(self._name, 1)
+        temperature = config.get("temperature")
+        if kwargs or (variants <= 1 and temperature is not None and temperature > constants.AI_CACHE_MAX_TEMPERATURE):
+            stats["bypassed"] += 1
+            return await self._model.generate_content_async(prompt, generation_config=generation_config, **kwargs)
+
+        key = _cache_key(self._name, getattr(self._model, "model_name", ""), prompt, config)
+        entry = await cache.get_json(key)
+        texts = entry.get("texts", []) if isinstance(entry, dict) else []
+        if texts and _filled_slots(entry) >= variants:
+            stats["hits"] += 1
+            return _CachedResponse(random.choice(texts))
+
+        stats["misses"] += 1
+
+        async def generate() -> str:
+            response = await self._model.generate_content_async(prompt, generation_config=generation_config)
+            text = response.text
+            if text:
+                # Re-read so variants stored meanwhile (by another flight or worker) are merged, not overwritten.
+                current = await cache.get_json(key)
+                stored = list(current.get("texts", [])) if isinstance(current, dict) else []
+                if text not in stored:
+                    stored.append(text)
+                # A repeated answer still fills a slot, so a model that keeps giving the
+                # same text completes the entry instead of missing forever.
+                slots = min(_filled_slots(current) + 1, variants)
+                ttl_seconds = constants.AI_CACHE_TTL_SECONDS.get(self._name, constants.AI_CACHE_DEFAULT_TTL_SECONDS)
+                await cache.set_json(key, {"texts": stored[-variants:], "slots": slots}, ttl_seconds)
+            return text
+
+        # Identical prompts missing the cache at the same moment share one Gemini call.
+        try:
+            return _CachedResponse(await singleflight.run(key, generate, share_across_processes=True))
+        except ai_bulkhead.AiBudgetExhausted as e:
+            if e.budget is ai_bulkhead.current_budget():
+                raise
+            # The shared call was refused on another request's token budget; this caller
+            # makes it on its own budget instead of inheriting that refusal.
+            return _CachedResponse(await generate())
+
+
+def cached_generation(name: str) -> Callable[[F], F]:
+    """
+    Decorates an AI function whose first argument (or `gemini_model` keyword) is the
+    Gemini model, so its `generate_content_async` calls are cached under `name`.
+    TTL and variant count come from AI_CACHE_TTL_SECONDS / AI_CACHE_VARIANTS.
+    """
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if "gemini_model" in kwargs:
+                if kwargs["gemini_model"]:
+                    kwargs["gemini_model"] = _CachingModel(kwargs["gemini_model"], name)
+            elif args and args[0]:
+                args = (_CachingModel(args[0], name),) + args[1:]
+            return await func(*args, **kwargs)
+        return wrapper  # type: ignore[return-value]
+    return decorator
+
+
+def stats() -> Dict[str, Dict[str, Any]]:
+    """Per-function hit/miss/bypass counts and hit rate since startup."""
+    report = {}
+    for name, counts in sorted(_stats.items()):
+        lookups = counts["hits"] + counts["misses"]
+        report[name] = {
+            "hits": counts["hits"],
+            "misses": counts["misses"],
+            "bypassed": counts["bypassed"],
+            "hit_rate": round(counts["hits"] / lookups, 3) if lookups else None,
+        }
+    return report
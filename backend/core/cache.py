@@ -0,0 +1,89 @@
+# /backend/core/cache.py
+
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# A small two-tier cache for planning data that is expensive to rebuild (candidate
+# pools, matrices). Entries are JSON. The in-process tier answers repeat lookups
+# without a round trip; Redis, when configured, shares entries across workers and
+# restarts. Redis failures are logged and treated as misses. Large or long-lived
+# entries can pass `local=False` to stay out of the in-process tier when Redis is
+# configured.
+
+LOCAL_MAX_ENTRIES = 256
+
+_redis = None
+_local: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+
+def init(redis_client) -> None:
+    """Registers the shared Redis client created at startup."""
+    global _redis
+    _redis = redis_client
+
+
+def get_redis():
+    return _redis
+
+
+def _local_get(key: str) -> Optional[Any]:
+    entry = _local.get(key)
+    if entry is None:
+        return None
+    expires_at, value = entry
+    if expires_at < time.monotonic():
+        del _local[key]
+        return None
+    _local.move_to_end(key)
+    return value
+
+
+def _local_set(key: str, value: Any, ttl_seconds: int) -> None:
+    _local[key] = (time.monotonic() + ttl_seconds, value)
+    _local.move_to_end(key)
+    while len(_local) > LOCAL_MAX_ENTRIES:
+        _local.popitem(last=False)
+
+
+async def get_json(key: str, local: bool = True) -> Optional[Any]:
+    value = _local_get(key) if local or _redis is None else None
+    if value is not None or _redis is None:
+        return value
+    try:
+        raw = await _redis.get(key)
+        ttl_seconds = await _redis.ttl(key) if raw is not None else 0
+    except Exception as e:
+        logger.warning(f"Redis read failed for '{key}': {e}")
+        return None
+    if raw is None:
+        return None
+    value = json.loads(raw)
+    if local and ttl_seconds and ttl_seconds > 0:
+        _local_set(key, value, ttl_seconds)
+    return value
+
+
+async def set_json(key: str, value: Any, ttl_seconds: int, local: bool = True) -> None:
+    if local or _redis is None:
+        _local_set(key, value, ttl_seconds)
+    if _redis is None:
+        return
+    try:
+        await _redis.set(key, json.dumps(value), ex=ttl_seconds)
+    except Exception as e:
+        logger.warning(f"Redis write failed for '{key}': {e}")
+
+
+async def delete(key: str) -> None:
+    _local.pop(key, None)
+    if _redis is None:
+        return
+    try:
+        await _redis.delete(key)
+    except Exception as e:
+        logger.warning(f"Redis delete failed for '{key}': {e}")
@@ -1,13 +1,28 @@
 # /backend/core/config.py (Complete)
 
 from pathlib import Path
+from pydantic import BaseModel
 from pydantic_settings import BaseSettings
-from typing import List, Optional
+from typing import Dict, List, Literal, Optional
 
 # --- Explicit Path to .env file ---
 env_path = Path(__file__).parent.parent / ".env"
 
 
+class UpstreamHttpConfig(BaseModel):
+    """Connection pool and timeout settings for one upstream API's HTTP client."""
+    max_connections: int = 20
+    max_keepalive_connections: int = 10
+    keepalive_expiry_seconds: float = 30.0
+    # Needs the optional `h2` package (pip install "httpx[http2]"); HTTP/1.1 is used without it.
+    http2: bool = False
+    connect_timeout_seconds: float = 5.0
+    read_timeout_seconds: float = 30.0
+    # Seconds a request may wait for a free connection from the pool.
+    pool_timeout_seconds: float = 10.0
+    compression: bool = True
+
+
 class Settings(BaseSettings):
     """
     Manages application settings and secrets loaded from the environment.
@@ -28,6 +43,37 @@ class Settings(BaseSettings):
     CORS_ORIGINS: List[str] = ["http://localhost:5173", "http://localhost:3000", "https://www.cabito.co.in"]
     LOG_LEVEL: str = "INFO"
 
+    # --- Planning ---
+    # Worker processes for CPU-bound planning. None uses every core; 0 runs planning inline.
+    PLANNING_PROCESS_POOL_WORKERS: Optional[int] = None
+
+    # --- AI ---
+    # "fake" swaps Gemini for the deterministic local stand-in in core/fake_gemini.py,
+    # for load and latency testing without API quota.
+    GEMINI_BACKEND: Literal["google", "fake"] = "google"
+    FAKE_GEMINI_LATENCY_DISTRIBUTION: Literal["fixed", "normal", "lognormal"] = "lognormal"
+    FAKE_GEMINI_LATENCY_MS: float = 800.0  # median for lognormal, mean otherwise
+    FAKE_GEMINI_LATENCY_SPREAD: float = 0.4  # sigma for lognormal, std dev as a fraction of the mean for normal
+    FAKE_GEMINI_FAILURE_RATE: float = 0.0
+    FAKE_GEMINI_SEED: Optional[int] = None
+
+    # --- Gazetteer ---
+    # City and town centroids for offline nearest-settlement lookups. None uses the bundled
+    # data/gazetteer_cities.tsv; a GeoNames dump (e.g. cities15000.txt) also works.
+    GAZETTEER_PATH: Optional[str] = None
+
+    # --- Outbound HTTP ---
+    # One client (and connection pool) per upstream so a burst against one cannot starve
+    # the others. Requests to hosts not listed in core/http_clients.py use "default".
+    # Override as JSON, e.g. HTTP_UPSTREAMS='{"overpass": {"read_timeout_seconds": 120}, ...}'.
+    HTTP_UPSTREAMS: Dict[str, UpstreamHttpConfig] = {
+        "nominatim": UpstreamHttpConfig(max_connections=5, max_keepalive_connections=2, read_timeout_seconds=15.0),
+        "overpass": UpstreamHttpConfig(max_connections=10, max_keepalive_connections=4, read_timeout_seconds=90.0, pool_timeout_seconds=30.0),
+        "openrouteservice": UpstreamHttpConfig(max_connections=40, max_keepalive_connections=20, http2=True, read_timeout_seconds=30.0),
+        "open_meteo": UpstreamHttpConfig(max_connections=10, max_keepalive_connections=5, http2=True, read_timeout_seconds=15.0),
+        "default": UpstreamHttpConfig(read_timeout_seconds=90.0),
+    }
+
     class Config:
         env_file = env_path
         case_sensitive = True
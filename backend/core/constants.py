@@ -1,6 +1,6 @@
 # /backend/core/constants.py (Complete File)
 
-from typing import List, Literal, Dict, Set
+from typing import List, Literal, Dict, Set, Tuple
 
 # --- Core Algorithm & Search Parameters ---
 DEFAULT_TRAVEL_MODE: Literal["driving", "walking", "bicycling", "transit"] = "driving"
@@ -10,6 +10,12 @@ MAX_WAIT_TIME_HOURS: float = 1.5
 MIN_VIABLE_ACTIVITY_HOURS: float = 0.4
 MAX_SERENDIPITY_CANDIDATES_FROM_OVERPASS: int = 10
 
+# --- Planning Process Pool ---
+# Candidate ranking with fewer candidates than this runs inline. Measured: around 150
+# prepared candidates, scoring them inline (~2.5 ms) costs about the same as the pool
+# round trip; above that the pool keeps the event loop free for a similar latency.
+PLANNING_POOL_MIN_CANDIDATES: int = 150
+
 # --- Costing ---
 COST_PER_KM_INR_DRIVING: float = 15.0
 COST_BASE_FARE_INR_DRIVING: float = 30.0
@@ -105,9 +111,136 @@ GENERIC_STORE_MATCH_TERMS: Set[str] = {
     "spencer's", "reliance", "more", "big bazaar", "dmart", "easyday", "vishal mega mart"
 }
 
+# --- Routing ---
+ROUTING_MAX_CONCURRENCY: int = 5
+ROUTING_MIN_SLOT_SECONDS: float = 1.0
+ROUTE_PREFETCH_CONTENDERS: int = 3
+ROUTE_PREFETCH_DESTINATIONS: int = 10
+# Speculative routing requests in flight at once, and in total per build.
+ROUTE_PREFETCH_MAX_CONCURRENCY: int = 1
+ROUTE_PREFETCH_BUDGET_PER_BUILD: int = 15
+MAX_BATCH_INSERT_ACTIVITIES: int = 8
+TRIP_END_GRACE_HOURS: float = 1.0
+ROUTE_EXACT_MAX_STOPS: int = 9
+
+# --- Replanning ---
+REPLAN_POOL_SIZE: int = 40
+# Replan data lives until the trip ends, but at least this long.
+REPLAN_POOL_MIN_TTL_SECONDS: int = 3600
+REPLAN_SNAP_RADIUS_KM: float = 0.2
+REPLAN_GEOMETRY_TIMEOUT_SECONDS: float = 0.5
+
+# --- AI Insight Cache ---
+INSIGHT_CACHE_TTL_DAYS: int = 30
+INSIGHT_CACHE_MAX_VARIANTS: int = 3
+INSIGHT_CACHE_NEW_VARIANT_PROBABILITY: float = 0.2
+# Insight requests from concurrent builds are collected for this long and sent together.
+INSIGHT_BATCH_WINDOW_MS: int = 50
+INSIGHT_BATCH_MAX_PLACES: int = 25
+
+# --- Place Suitability Verdicts ---
+SUITABILITY_VERDICT_TTL_DAYS: int = 180
+SUITABILITY_BATCH_SIZE: int = 40
+
+# --- Deferred Enrichment ---
+ENRICHMENT_STALE_AFTER_SECONDS: int = 120
+
+# --- Memory Snapshots ---
+MEMORY_SNAPSHOT_PREGENERATION_INTERVAL_SECONDS: int = 300
+MEMORY_SNAPSHOT_PREGENERATION_BATCH_SIZE: int = 20
+# A trip whose pregeneration failed is skipped for this long before it is tried again.
+MEMORY_SNAPSHOT_PREGENERATION_RETRY_SECONDS: int = 24 * 3600
+
+# --- AI Response Cache ---
+AI_CACHE_MAX_TEMPERATURE: float = 0.5
+AI_CACHE_DEFAULT_TTL_SECONDS: int = 24 * 3600
+AI_CACHE_TTL_SECONDS: Dict[str, int] = {
+    "description_analysis": 7 * 24 * 3600,
+    "trip_title": 7 * 24 * 3600,
+    "place_insight": 30 * 24 * 3600,
+    "weather_sentence": 3 * 3600,
+}
+# Functions whose answers should vary keep this many cached variants and pick one at random.
+AI_CACHE_VARIANTS: Dict[str, int] = {
+    "trip_title": 3,
+    "place_insight": 3,
+    "weather_sentence": 3,
+}
+
+# --- AI Concurrency & Token Budgets ---
+AI_MAX_CONCURRENT_CALLS: int = 8
+# Slots only critical-path calls may use, so decorative calls cannot starve them.
+AI_CRITICAL_RESERVED_SLOTS: int = 2
+AI_TOKEN_BUDGET_PER_REQUEST: int = 40_000
+AI_TOKEN_BUDGET_PER_USER_PER_DAY: int = 400_000
+# "critical" calls shape the itinerary and still run once a budget is spent;
+# "normal" and "decorative" ones are skipped and fall back to their defaults.
+AI_CALL_PRIORITIES: Dict[str, str] = {
+    "description_analysis": "critical",
+    "local_keywords": "critical",
+    "suitability_verdicts": "critical",
+    "place_insights_batch": "normal",
+    "place_insight": "normal",
+    "trip_title": "normal",
+    "serendipity": "normal",
+    "memory_snapshot": "normal",
+    "weather_sentence": "decorative",
+}
+
+# --- Local Keyword Cache ---
+KEYWORD_CACHE_TTL_SECONDS: int = 60 * 24 * 3600
+KEYWORD_CACHE_REFRESH_AFTER_SECONDS: int = 14 * 24 * 3600
+
+# --- Weather Forecast Cache ---
+OPEN_METEO_FORECAST_URL: str = "https://api.open-meteo.com/v1/forecast"
+# Forecasts are cached per grid cell (about 11 km at 0.1 degrees) and UTC date.
+WEATHER_GRID_DEGREES: float = 0.1
+# Cached days expire when the next forecast run should be available.
+WEATHER_FORECAST_UPDATE_HOURS: int = 3
+WEATHER_FORECAST_PUBLISH_DELAY_MINUTES: int = 20
+WEATHER_FORECAST_MIN_TTL_SECONDS: int = 300
+WEATHER_RAIN_PROBABILITY_THRESHOLD: int = 40
+WEATHER_WINDY_KMH: float = 15.0
+# (upper bound in degrees C, label) for the temperature bands of weather sentences.
+WEATHER_TEMPERATURE_BANDS: List[Tuple[float, str]] = [(5, "cold"), (15, "cool"), (25, "mild"), (32, "warm")]
+
+# --- Geocoding ---
+# Nominatim's usage policy allows about one request per second per application.
+NOMINATIM_MIN_INTERVAL_SECONDS: float = 1.0
+NOMINATIM_MAX_QUEUE_WAIT_SECONDS: float = 10.0
+GEOCODE_CACHE_TTL_SECONDS: int = 30 * 24 * 3600
+GEOCODE_NOT_FOUND_TTL_SECONDS: int = 24 * 3600
+# Reverse lookups are cached (and requested) for coordinates rounded to this many decimals (~11 m).
+REVERSE_GEOCODE_PRECISION: int = 4
+
+# --- Gazetteer ---
+GAZETTEER_GRID_DEGREES: float = 0.5
+# A point farther than this from every settlement centroid gets no offline city name.
+GAZETTEER_MAX_DISTANCE_KM: float = 30.0
+# Rough urban radius (km) per sqrt(population), so points in a metro's outskirts still
+# resolve to the metro rather than a smaller town whose centre happens to be closer.
+GAZETTEER_URBAN_RADIUS_KM_PER_SQRT_POPULATION: float = 1 / 300
+
+# --- Place Autocomplete ---
+AUTOCOMPLETE_DEFAULT_LIMIT: int = 8
+AUTOCOMPLETE_MAX_LIMIT: int = 20
+AUTOCOMPLETE_FUZZY_MIN_CHARS: int = 3
+AUTOCOMPLETE_FUZZY_MIN_RATIO: float = 0.75
+AUTOCOMPLETE_MAX_GEOCODED_PLACES: int = 10000
+
+# --- Single-Flight Upstream Calls ---
+# How long other workers wait on the worker holding a single-flight lock.
+SINGLEFLIGHT_LOCK_TTL_SECONDS: int = 30
+SINGLEFLIGHT_RESULT_TTL_SECONDS: int = 10
+SINGLEFLIGHT_POLL_INTERVAL_SECONDS: float = 0.1
+
 # --- External APIs ---
 OVERPASS_API_URL: str = "https://overpass-api.de/api/interpreter"
 OVERPASS_TIMEOUT: int = 60
+# Extra seconds an Overpass single-flight lock outlives the slowest allowed call.
+OVERPASS_LOCK_MARGIN_SECONDS: int = 15
+# Overpass answers are kept this long, for workers that waited on the same query.
+OVERPASS_RESULT_TTL_SECONDS: int = 120
 WIKI_LOOKUP_TIMEOUT: int = 15
 
 # --- OSM Tag Definitions ---
@@ -0,0 +1,225 @@
+# /backend/core/fake_gemini.py
+
+import ast
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import re
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from core.ai_bulkhead import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# A local stand-in for genai.GenerativeModel, selected with GEMINI_BACKEND=fake. It
+# recognises each prompt that ai_service and weather_service send and answers with
+# well-formed output of the expected shape, so the whole planning path can be load
+# tested without API quota. Answers depend only on the prompt; latency and failures
+# are drawn from a separately seeded generator.
+
+_UNSUITABLE_NAME_HINTS = ("tower", "station", "plant", "supermarket", "department store", "office", "atm")
+
+
+class SimulatedGeminiError(RuntimeError):
+    """Raised for the share of calls configured to fail."""
+
+
+class _FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+def _json_after(marker: str, prompt: str) -> Any:
+    """Decodes the JSON value that starts right after `marker` in the prompt."""
+    start = prompt.find(marker)
+    if start < 0:
+        return None
+    try:
+        value, _ = json.JSONDecoder().raw_decode(prompt[start + len(marker):].lstrip())
+        return value
+    except ValueError:
+        return None
+
+
+def _quoted_after(pattern: str, prompt: str, default: str) -> str:
+    match = re.search(pattern, prompt)
+    return match.group(1) if match else default
+
+
+def _analyze_description(prompt: str, rng: random.Random) -> str:
+    categories_match = re.search(r"mapping are: (\[.*?\])\n", prompt)
+    try:
+        categories = ast.literal_eval(categories_match.group(1)) if categories_match else []
+    except (ValueError, SyntaxError):
+        categories = []
+    description = _quoted_after(r'User Description: "(.*)"\nJSON Output:\s*$', prompt, "")
+    words = [word.strip(".,!?") for word in description.split()]
+    keywords = [word for word in words if len(word) > 4][:3]
+    mapped = [category for category in categories if category.lower() in description.lower()]
+    if not mapped and categories and keywords:
+        mapped = [rng.choice(categories)]
+    return json.dumps({"keywords": keywords, "mapped_preferences": mapped})
+
+
+def _local_keywords(prompt: str, rng: random.Random) -> str:
+    city = _quoted_after(r"city of '(.+?)'", prompt, "the city")
+    interests = _json_after("whose keys are exactly these interests:", prompt) or []
+    answer = {
+        interest: [f"{city} {interest} {suffix}" for suffix in rng.sample(["landmark", "quarter", "market", "trail", "classic"], 2)]
+        for interest in interests
+    }
+    return json.dumps(answer)
+
+
+def _insights_batch(prompt: str, rng: random.Random) -> str:
+    places = _json_after("Places:", prompt) or []
+    tips = [
+        {"id": place.get("id"), "tip": f"{rng.choice(['Go early at', 'Ask a local about', 'Save time for'])} {place.get('name', 'this place')} for the best experience."}
+        for place in places
+    ]
+    return json.dumps({"insights": tips})
+
+
+def _suitability_verdicts(prompt: str, rng: random.Random) -> str:
+    places = _json_after("Places:", prompt) or []
+    verdicts = [
+        {"id": place.get("id"), "suitable": not any(hint in str(place.get("name", "")).lower() for hint in _UNSUITABLE_NAME_HINTS)}
+        for place in places
+    ]
+    return json.dumps({"verdicts": verdicts})
+
+
+def _trip_title(prompt: str, rng: random.Random) -> str:
+    city = _quoted_after(r"trip to '(.+?)'", prompt, "the City")
+    return rng.choice([f"{city} Unwrapped: Your Day of Discovery Awaits!", f"Hidden Corners of {city}: An Adventure Begins!"])
+
+
+def _place_insight(prompt: str, rng: random.Random) -> str:
+    place = _quoted_after(r"place named '(.+?)'", prompt, "this place")
+    return f"{rng.choice(['Go early at', 'Ask a local about', 'Save time for'])} {place} for the best experience."
+
+
+def _serendipity(prompt: str, rng: random.Random) -> str:
+    place = _quoted_after(r"place to suggest is: '(.+?)'", prompt, "a nearby spot")
+    return f"{rng.choice(['Fancy a detour?', 'Feeling spontaneous?'])} {place} is just around the corner!"
+
+
+def _memory_snapshot(prompt: str, rng: random.Random) -> str:
+    title = _quoted_after(r'trip titled "(.+?)"', prompt, "your trip")
+    return (
+        f"{title} began with a single step and a curious heart. Every stop added a new colour to the day. "
+        "Somewhere between the first sight and the last, the city started to feel like a friend."
+    )
+
+
+def _weather_sentence(prompt: str, rng: random.Random) -> str:
+    condition = _quoted_after(r"The current weather is: (.+?)\.", prompt, "pleasant")
+    return f"Expect {condition} today, so {rng.choice(['dress comfortably', 'keep water handy', 'plan a cafe break'])} and enjoy the day!"
+
+
+# (kind, phrase that identifies the prompt, answer builder), checked in order.
+_PROMPT_KINDS: List[Tuple[str, str, Callable[[str, random.Random], str]]] = [
+    ("description_analysis", '"keywords" and "mapped_preferences"', _analyze_description),
+    ("local_keywords", "whose keys are exactly these interests", _local_keywords),
+    ("place_insights_batch", '{"insights":', _insights_batch),
+    ("suitability_verdicts", '{"verdicts":', _suitability_verdicts),
+    ("trip_title", "captivating and friendly headline", _trip_title),
+    ("place_insight", "Provide a single, concise, and helpful tip", _place_insight),
+    ("serendipity", "inviting a user to visit a specific place", _serendipity),
+    ("memory_snapshot", "Cabito Memory Weaver", _memory_snapshot),
+    ("weather_sentence", "friendly weather update", _weather_sentence),
+]
+
+
+class FakeGenerativeModel:
+    """
+    Drop-in for genai.GenerativeModel's `generate_content_async`. Latency is drawn from
+    a fixed, normal or lognormal distribution around `latency_ms`, and `failure_rate` of
+    calls raise SimulatedGeminiError. Call counts and token estimates are kept in `stats()`.
+    """
+
+    def __init__(
+        self,
+        latency_distribution: str = "lognormal",
+        latency_ms: float = 800.0,
+        latency_spread: float = 0.4,
+        failure_rate: float = 0.0,
+        seed: Optional[int] = None,
+        model_name: str = "models/fake-gemini"
+    ):
+        if latency_distribution not in ("fixed", "normal", "lognormal"):
+            raise ValueError(f"Unknown latency distribution '{latency_distribution}'.")
+        self.model_name = model_name
+        self.latency_distribution = latency_distribution
+        self.latency_ms = latency_ms
+        self.latency_spread = latency_spread
+        self.failure_rate = failure_rate
+        self.seed = seed
+        self._rng = random.Random(seed)
+        self._calls: Counter = Counter()
+        self._failures: Counter = Counter()
+        self._prompt_tokens = 0
+        self._output_tokens = 0
+        self._latency_seconds = 0.0
+
+    @classmethod
+    def from_settings(cls, settings: Any) -> "FakeGenerativeModel":
+        return cls(
+            latency_distribution=settings.FAKE_GEMINI_LATENCY_DISTRIBUTION,
+            latency_ms=settings.FAKE_GEMINI_LATENCY_MS,
+            latency_spread=settings.FAKE_GEMINI_LATENCY_SPREAD,
+            failure_rate=settings.FAKE_GEMINI_FAILURE_RATE,
+            seed=settings.FAKE_GEMINI_SEED,
+        )
+
+    def _sample_latency_seconds(self) -> float:
+        if self.latency_ms <= 0:
+            return 0.0
+        if self.latency_distribution == "fixed":
+            latency_ms = self.latency_ms
+        elif self.latency_distribution == "normal":
+            latency_ms = self._rng.gauss(self.latency_ms, self.latency_ms * self.latency_spread)
+        else:
+            latency_ms = self.latency_ms * self._rng.lognormvariate(0.0, self.latency_spread)
+        return max(0.0, latency_ms) / 1000.0
+
+    @staticmethod
+    def respond(prompt: str) -> Tuple[str, str]:
+        """Returns (prompt kind, answer text); the same prompt always gets the same answer."""
+        rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).digest())
+        for kind, phrase, build in _PROMPT_KINDS:
+            if phrase in prompt:
+                return kind, build(prompt, rng)
+        return "other", "OK"
+
+    async def generate_content_async(self, prompt: Any, generation_config: Any = None, **kwargs: Any) -> _FakeResponse:
+        prompt = str(prompt)
+        kind, text = self.respond(prompt)
+        self._calls[kind] += 1
+        self._prompt_tokens += estimate_tokens(prompt)
+
+        latency_seconds = self._sample_latency_seconds()
+        self._latency_seconds += latency_seconds
+        fails = self.failure_rate > 0 and self._rng.random() < self.failure_rate
+        await asyncio.sleep(latency_seconds)
+        if fails:
+            self._failures[kind] += 1
+            raise SimulatedGeminiError(f"Simulated Gemini failure for a '{kind}' prompt.")
+
+        self._output_tokens += estimate_tokens(text)
+        return _FakeResponse(text)
+
+    def stats(self) -> Dict[str, Any]:
+        calls = sum(self._calls.values())
+        return {
+            "calls": calls,
+            "calls_by_kind": dict(self._calls),
+            "failures": sum(self._failures.values()),
+            "failures_by_kind": dict(self._failures),
+            "estimated_prompt_tokens": self._prompt_tokens,
+            "estimated_output_tokens": self._output_tokens,
+            "mean_latency_ms": round(self._latency_seconds * 1000 / calls, 1) if calls else None,
+        }
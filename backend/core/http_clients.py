@@ -0,0 +1,124 @@
+# /backend/core/http_clients.py
+
+import importlib.util
+import logging
+from collections import Counter
+from typing import Any, Dict, Mapping, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+from core.config import UpstreamHttpConfig
+
+logger = logging.getLogger(__name__)
+
+# Each upstream API gets its own httpx client, sized and timed out per Settings.HTTP_UPSTREAMS.
+# Services keep receiving a single `http_client`: UpstreamClients routes each request
+# to the client for the URL's host, so call sites do not need to know about the split.
+
+UPSTREAM_HOSTS: Dict[str, str] = {
+    "nominatim.openstreetmap.org": "nominatim",
+    "overpass-api.de": "overpass",
+    "api.openrouteservice.org": "openrouteservice",
+    "api.open-meteo.com": "open_meteo",
+}
+DEFAULT_UPSTREAM = "default"
+
+
+def _http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+def _use_http2(name: str, config: UpstreamHttpConfig) -> bool:
+    if config.http2 and not _http2_available():
+        logger.warning(f"HTTP/2 requested for '{name}' but the 'h2' package is not installed; using HTTP/1.1.")
+        return False
+    return config.http2
+
+
+def build_client(config: UpstreamHttpConfig, http2: bool) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=config.max_connections,
+            max_keepalive_connections=config.max_keepalive_connections,
+            keepalive_expiry=config.keepalive_expiry_seconds,
+        ),
+        timeout=httpx.Timeout(
+            connect=config.connect_timeout_seconds,
+            read=config.read_timeout_seconds,
+            write=config.read_timeout_seconds,
+            pool=config.pool_timeout_seconds,
+        ),
+        headers=None if config.compression else {"Accept-Encoding": "identity"},
+    )
+
+
+class UpstreamClients:
+    """
+    Routes `get`/`post`/`request` to the per-upstream client for the URL's host and keeps
+    in-flight and peak request counts against each pool's connection limit.
+    """
+
+    def __init__(self, configs: Mapping[str, UpstreamHttpConfig]):
+        configs = dict(configs)
+        configs.setdefault(DEFAULT_UPSTREAM, UpstreamHttpConfig())
+        self.configs = configs
+        self.http2 = {name: _use_http2(name, config) for name, config in configs.items()}
+        self.clients: Dict[str, httpx.AsyncClient] = {name: build_client(config, self.http2[name]) for name, config in configs.items()}
+        self._in_flight: Counter = Counter()
+        self._peak: Counter = Counter()
+        self._requests: Counter = Counter()
+        self._errors: Counter = Counter()
+        self._pool_timeouts: Counter = Counter()
+
+    def upstream_for(self, url: Any) -> str:
+        name = UPSTREAM_HOSTS.get(urlsplit(str(url)).hostname or "", DEFAULT_UPSTREAM)
+        return name if name in self.clients else DEFAULT_UPSTREAM
+
+    def client_for(self, url: Any) -> Tuple[str, httpx.AsyncClient]:
+        name = self.upstream_for(url)
+        return name, self.clients[name]
+
+    async def request(self, method: str, url: Any, **kwargs: Any) -> httpx.Response:
+        name, client = self.client_for(url)
+        self._requests[name] += 1
+        self._in_flight[name] += 1
+        self._peak[name] = max(self._peak[name], self._in_flight[name])
+        try:
+            return await client.request(method, url, **kwargs)
+        except httpx.PoolTimeout:
+            self._pool_timeouts[name] += 1
+            self._errors[name] += 1
+            raise
+        except Exception:
+            self._errors[name] += 1
+            raise
+        finally:
+            self._in_flight[name] -= 1
+
+    async def get(self, url: Any, **kwargs: Any) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: Any, **kwargs: Any) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def aclose(self) -> None:
+        for client in self.clients.values():
+            await client.aclose()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-upstream request counts and pool utilization (in-flight / max connections)."""
+        return {
+            name: {
+                "requests": self._requests[name],
+                "errors": self._errors[name],
+                "pool_timeouts": self._pool_timeouts[name],
+                "in_flight": self._in_flight[name],
+                "peak_in_flight": self._peak[name],
+                "max_connections": self.configs[name].max_connections,
+                "utilization": round(self._in_flight[name] / self.configs[name].max_connections, 3),
+                "http2": self.http2[name],
+            }
+            for name in self.clients
+        }
@@ -0,0 +1,82 @@
+# /backend/core/pipeline.py
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class Pipeline:
+    """
+    A small dependency graph of async stages. Each stage is started as a task right
+    away and waits only for the stages it names, whose results it receives as keyword
+    arguments of the same name. Stages must be added after their dependencies, which
+    also rules out cycles. If any stage fails, the rest are cancelled and the error is
+    re-raised. `on_stage`, if given, is awaited with (stage, "started" | "done" | "failed",
+    seconds since the run started) as stages progress.
+    """
+
+    def __init__(self, name: str, on_stage: Optional[Callable[[str, str, float], Awaitable[None]]] = None):
+        self.name = name
+        self._on_stage = on_stage
+        self._stages: Dict[str, Tuple[Callable[..., Awaitable[Any]], Tuple[str, ...]]] = {}
+        # stage -> (seconds after the run started that the stage began, seconds it took)
+        self.timings: Dict[str, Tuple[float, float]] = {}
+
+    def stage(self, name: str, func: Callable[..., Awaitable[Any]], deps: Iterable[str] = ()) -> None:
+        if name in self._stages:
+            raise ValueError(f"Stage '{name}' is already defined.")
+        deps = tuple(deps)
+        for dep in deps:
+            if dep not in self._stages:
+                raise ValueError(f"Stage '{name}' depends on unknown stage '{dep}'.")
+        self._stages[name] = (func, deps)
+
+    async def run(self) -> Dict[str, Any]:
+        """Runs every stage and returns their results by name."""
+        run_started = time.perf_counter()
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_stage(name: str, func: Callable[..., Awaitable[Any]], deps: Tuple[str, ...]) -> Any:
+            inputs = {dep: await tasks[dep] for dep in deps}
+            stage_started = time.perf_counter()
+            await self._notify(name, "started", stage_started - run_started)
+            try:
+                result = await func(**inputs)
+            except Exception:
+                self.timings[name] = (stage_started - run_started, time.perf_counter() - stage_started)
+                await self._notify(name, "failed", time.perf_counter() - run_started)
+                raise
+            self.timings[name] = (stage_started - run_started, time.perf_counter() - stage_started)
+            await self._notify(name, "done", time.perf_counter() - run_started)
+            return result
+
+        for name, (func, deps) in self._stages.items():
+            tasks[name] = asyncio.create_task(run_stage(name, func, deps), name=f"{self.name}:{name}")
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+        finally:
+            self._log_timings(time.perf_counter() - run_started)
+        return {name: task.result() for name, task in tasks.items()}
+
+    async def _notify(self, name: str, status: str, elapsed_seconds: float) -> None:
+        if self._on_stage is None:
+            return
+        try:
+            await self._on_stage(name, status, elapsed_seconds)
+        except Exception as e:
+            logger.warning(f"Stage listener failed for '{name}': {e}")
+
+    def _log_timings(self, total_seconds: float) -> None:
+        stages = ", ".join(
+            f"{name} +{offset:.2f}s/{duration:.2f}s"
+            for name, (offset, duration) in sorted(self.timings.items(), key=lambda entry: entry[1][0])
+        )
+        logger.info(f"--- {self.name} stages ({total_seconds:.2f}s total): {stages} ---")
@@ -0,0 +1,73 @@
+# /backend/core/rate_gate.py
+
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from core import cache
+
+logger = logging.getLogger(__name__)
+
+# Spaces calls to an upstream with a usage policy (e.g. Nominatim's 1 request/second)
+# across every worker. Callers reserve the next free slot atomically in Redis and sleep
+# until it comes up, which serializes them in arrival order. Without Redis the gate
+# only spaces calls within this process.
+
+# KEYS[1] = next free slot (ms); ARGV = interval ms, max wait ms. Returns the wait in ms, or -1.
+_RESERVE_SLOT_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) * 1000 + math.floor(tonumber(now_parts[2]) / 1000)
+local next_slot = tonumber(redis.call('GET', KEYS[1]) or '0')
+if next_slot < now then next_slot = now end
+local wait = next_slot - now
+if wait > tonumber(ARGV[2]) then return -1 end
+redis.call('SET', KEYS[1], next_slot + tonumber(ARGV[1]), 'PX', math.max(wait + tonumber(ARGV[1]) * 2, 1000))
+return wait
+"""
+
+
+class RateGateBusy(Exception):
+    """Raised when the queue ahead of a caller is longer than it is willing to wait."""
+
+
+class RateGate:
+    """Allows one call per `interval_seconds` for `name`, shared through Redis when available."""
+
+    def __init__(self, name: str, interval_seconds: float, max_wait_seconds: float):
+        self.name = name
+        self.interval_seconds = interval_seconds
+        self.max_wait_seconds = max_wait_seconds
+        self._local_next_slot = 0.0
+
+    async def _reserve_shared(self) -> Optional[float]:
+        redis = cache.get_redis()
+        if redis is None:
+            return None
+        try:
+            wait_ms = await redis.eval(
+                _RESERVE_SLOT_SCRIPT, 1, f"rate_gate:{self.name}",
+                int(self.interval_seconds * 1000), int(self.max_wait_seconds * 1000)
+            )
+        except Exception as e:
+            logger.warning(f"Shared rate gate '{self.name}' unavailable, spacing calls in this process only: {e}")
+            return None
+        return int(wait_ms) / 1000.0
+
+    def _reserve_local(self) -> float:
+        now = time.monotonic()
+        slot = max(self._local_next_slot, now)
+        wait = slot - now
+        if wait <= self.max_wait_seconds:
+            self._local_next_slot = slot + self.interval_seconds
+        return wait
+
+    async def wait_turn(self) -> None:
+        """Sleeps until this caller's slot; raises RateGateBusy if that is too far away."""
+        wait = await self._reserve_shared()
+        if wait is None:
+            wait = self._reserve_local()
+        if wait < 0 or wait > self.max_wait_seconds:
+            raise RateGateBusy(f"'{self.name}' is busy; try again shortly.")
+        if wait > 0:
+            await asyncio.sleep(wait)
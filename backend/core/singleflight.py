@@ -0,0 +1,109 @@
+# /backend/core/singleflight.py
+
+import asyncio
+import hashlib
+import json
+import logging
+from collections import Counter
+from typing import Awaitable, Callable, Dict, Tuple, TypeVar
+
+from core import cache, constants
+
+logger = logging.getLogger(__name__)
+
+# Coalesces identical in-flight upstream calls. The first caller for a key runs the
+# call; callers arriving while it is in flight await the same task. With
+# `share_across_processes`, workers also coordinate through a Redis lock: the holder
+# publishes its (JSON) result briefly and the others wait for it instead of calling
+# the upstream themselves. Calls whose result is too large to publish can pass
+# `publish_result=False` and store it in the cache themselves: the others then wait for
+# the lock to be released and call `func`, which finds the cached answer. Redis
+# problems fall back to calling directly.
+
+T = TypeVar("T")
+
+_flights: Dict[str, asyncio.Task] = {}
+_stats: Counter = Counter()
+
+
+def _redis_keys(key: str) -> Tuple[str, str]:
+    digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+    return f"singleflight:lock:{digest}", f"singleflight:result:{digest}"
+
+
+async def _run_with_redis_lock(key: str, func: Callable[[], Awaitable[T]], lock_ttl_seconds: int, publish_result: bool = True) -> T:
+    redis = cache.get_redis()
+    if redis is None:
+        return await func()
+    lock_key, result_key = _redis_keys(key)
+    try:
+        acquired = await redis.set(lock_key, "1", nx=True, ex=lock_ttl_seconds)
+    except Exception as e:
+        logger.warning(f"Single-flight lock unavailable for '{key[:80]}', calling directly: {e}")
+        return await func()
+
+    if acquired:
+        try:
+            result = await func()
+            if publish_result:
+                try:
+                    await redis.set(result_key, json.dumps(result), ex=constants.SINGLEFLIGHT_RESULT_TTL_SECONDS)
+                except Exception as e:
+                    logger.warning(f"Could not publish single-flight result for '{key[:80]}': {e}")
+            return result
+        finally:
+            try:
+                await redis.delete(lock_key)
+            except Exception:
+                pass
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + lock_ttl_seconds
+    try:
+        while loop.time() < deadline:
+            await asyncio.sleep(constants.SINGLEFLIGHT_POLL_INTERVAL_SECONDS)
+            raw = await redis.get(result_key) if publish_result else None
+            if raw is not None:
+                _stats["shared_across_processes"] += 1
+                return json.loads(raw)
+            if not await redis.exists(lock_key):
+                # The holder failed (or its result already expired).
+                break
+    except Exception as e:
+        logger.warning(f"Single-flight wait failed for '{key[:80]}', calling directly: {e}")
+    return await func()
+
+
+def _forget(key: str, task: asyncio.Task) -> None:
+    if _flights.get(key) is task:
+        del _flights[key]
+    if not task.cancelled():
+        task.exception()  # retrieved by the waiters; marks it handled if they were all cancelled
+
+
+async def run(
+    key: str,
+    func: Callable[[], Awaitable[T]],
+    share_across_processes: bool = False,
+    lock_ttl_seconds: int = constants.SINGLEFLIGHT_LOCK_TTL_SECONDS,
+    publish_result: bool = True
+) -> T:
+    """
+    Returns the result of `func()`, sharing one call among concurrent callers with the
+    same key. Exceptions are shared too. Cross-process sharing needs a JSON result.
+    """
+    task = _flights.get(key)
+    if task is None:
+        coro = _run_with_redis_lock(key, func, lock_ttl_seconds, publish_result) if share_across_processes else func()
+        task = asyncio.ensure_future(coro)
+        _flights[key] = task
+        task.add_done_callback(lambda done: _forget(key, done))
+        _stats["calls"] += 1
+    else:
+        _stats["coalesced"] += 1
+    # Shielded so one caller giving up does not cancel the call for the others.
+    return await asyncio.shield(task)
+
+
+def stats() -> Dict[str, int]:
+    return {"calls": _stats["calls"], "coalesced": _stats["coalesced"], "shared_across_processes": _stats["shared_across_processes"], "in_flight": len(_flights)}
@@ -23,7 +23,7 @@ engine = create_async_engine(settings.DATABASE_URL, echo=False)
 
 # Import all the models here so that Base has them registered
 # This is crucial for tools like Alembic and for create_db_and_tables to work
-from models.all_models import UserAccount, UserInteraction, LearnedUserProfile, UserTrip
+from models.all_models import UserAccount, UserInteraction, LearnedUserProfile, UserTrip, AiInsightCache, PlaceSuitabilityVerdict
 
 # Create a sessionmaker for creating AsyncSession instances
 AsyncSessionLocal = sessionmaker(
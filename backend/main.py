@@ -1,11 +1,11 @@
 # /backend/main.py (Complete File)
 
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 
 import google.generativeai as genai
 # import googlemaps # <<< Can be commented out or removed
-import httpx
 # import requests # <<< No longer needed
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -17,9 +17,13 @@ from slowapi.errors import RateLimitExceeded
 
 # --- Corrected absolute imports for deployment ---
 from api import auth, itinerary, trips, users
+from core import ai_bulkhead, ai_cache, cache, singleflight
 from core.config import settings
+from core.fake_gemini import FakeGenerativeModel
+from core.http_clients import UpstreamClients
 from core.limiter import limiter
 from database import create_db_and_tables
+from services import autocomplete_service, gazetteer_service, memory_snapshot_service, planning_service
 
 logging.basicConfig(level=settings.LOG_LEVEL.upper(), format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -38,12 +42,23 @@ async def lifespan(app: FastAPI):
     try:
         redis = aioredis.from_url("redis://localhost", encoding="utf-8", decode_responses=True)
         FastAPICache.init(RedisBackend(redis), prefix="fastapi-cache")
+        cache.init(redis)
         logger.info("Redis cache backend initialized.")
     except Exception as e:
         logger.error(f"Could not connect to Redis for cache. Cache will be unavailable. Error: {e}")
 
+    # --- PLANNING PROCESS POOL ---
+    planning_service.init_process_pool(settings.PLANNING_PROCESS_POOL_WORKERS)
+
+    # --- OFFLINE GAZETTEER & PLACE AUTOCOMPLETE ---
+    # Loaded here so the first trip does not pay for parsing the data file.
+    gazetteer_service.get_gazetteer()
+    await autocomplete_service.load_geocoded_places()
+
     # --- HTTP & API CLIENT INITIALIZATION ---
-    app.state.httpx_client = httpx.AsyncClient(timeout=90.0)
+    # Named per-upstream clients; `httpx_client` routes each request to the right one.
+    app.state.httpx_client = UpstreamClients(settings.HTTP_UPSTREAMS)
+    app.state.http_clients = app.state.httpx_client.clients
     app.state.gemini_model = None
     
     # --- OLD GOOGLE MAPS CLIENT INITIALIZATION (COMMENTED OUT) ---
@@ -57,7 +72,13 @@ async def lifespan(app: FastAPI):
     # else:
     #     logger.warning("MAPS_API_KEY not set. Google Maps features will be unavailable.")
 
-    if settings.GOOGLE_API_KEY_GEMINI:
+    if settings.GEMINI_BACKEND == "fake":
+        app.state.gemini_model = FakeGenerativeModel.from_settings(settings)
+        logger.warning(
+            f"Using the fake Gemini backend ({settings.FAKE_GEMINI_LATENCY_DISTRIBUTION} latency around "
+            f"{settings.FAKE_GEMINI_LATENCY_MS:.0f}ms, failure rate {settings.FAKE_GEMINI_FAILURE_RATE}). AI output is canned."
+        )
+    elif settings.GOOGLE_API_KEY_GEMINI:
         try:
             genai.configure(api_key=settings.GOOGLE_API_KEY_GEMINI)
             app.state.gemini_model = genai.GenerativeModel('gemini-1.5-flash-latest')
@@ -68,11 +89,18 @@ async def lifespan(app: FastAPI):
     else:
         logger.warning("GOOGLE_API_KEY_GEMINI not found. AI features will be disabled.")
     
+    # --- BACKGROUND JOBS ---
+    snapshot_pregeneration_task = asyncio.create_task(
+        memory_snapshot_service.run_pregeneration_loop(app.state.gemini_model)
+    )
+
     logger.info("Startup complete.")
     yield
     # --- SHUTDOWN LOGIC ---
     logger.info("Shutting down...")
+    snapshot_pregeneration_task.cancel()
     await app.state.httpx_client.aclose()
+    planning_service.shutdown_process_pool()
     logger.info("Shutdown complete.")
 
 
@@ -108,4 +136,17 @@ app.include_router(itinerary.router, prefix="/api/itinerary", tags=["Itinerary"]
 @app.get("/health", tags=["System"])
 def health_check():
     """A simple health check endpoint to confirm the server is running."""
-    return {"status": "ok", "version": app.version}
\ No newline at end of file
+    return {"status": "ok", "version": app.version}
+
+
+@app.get("/metrics", tags=["System"])
+def metrics():
+    """Process-local counters for the app's caches, AI bulkhead, coalesced and outbound HTTP calls (and the fake Gemini backend, when used)."""
+    report = {"ai_response_cache": ai_cache.stats(), "ai_bulkhead": ai_bulkhead.stats(), "singleflight": singleflight.stats()}
+    http_client = getattr(app.state, "httpx_client", None)
+    if isinstance(http_client, UpstreamClients):
+        report["http_upstreams"] = http_client.stats()
+    gemini_model = getattr(app.state, "gemini_model", None)
+    if isinstance(gemini_model, FakeGenerativeModel):
+        report["fake_gemini"] = gemini_model.stats()
+    return report
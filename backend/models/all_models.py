@@ -4,8 +4,8 @@ import secrets
 import uuid
 from datetime import datetime, timezone as dt_timezone
 
-from sqlalchemy import (Column, Integer, String, Boolean, DateTime, Text,
-                        ForeignKey, JSON, Enum as SAEnum, Float)
+from sqlalchemy import (Column, Integer, BigInteger, String, Boolean, DateTime, Text,
+                        ForeignKey, JSON, Enum as SAEnum, Float, UniqueConstraint)
 from sqlalchemy.dialects.postgresql import UUID as PG_UUID
 from sqlalchemy.orm import relationship
 
@@ -105,8 +105,40 @@ class UserTrip(Base):
     marked_completed_at = Column(DateTime(timezone=True), nullable=True) 
     updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(dt_timezone.utc), onupdate=lambda: datetime.now(dt_timezone.utc), nullable=False)
     memory_snapshot_text = Column(Text, nullable=True)
+    memory_snapshot_hash = Column(String(64), nullable=True)
+    memory_snapshot_attempted_at = Column(DateTime(timezone=True), nullable=True)
 
     user = relationship("UserAccount", back_populates="trips")
 
     def __repr__(self):
-        return f"<UserTrip(id={self.id}, trip_uuid='{self.trip_uuid}', user_id={self.user_id}, title='{self.trip_title}')>"
\ No newline at end of file
+        return f"<UserTrip(id={self.id}, trip_uuid='{self.trip_uuid}', user_id={self.user_id}, title='{self.trip_title}')>"
+
+
+class AiInsightCache(Base):
+    __tablename__ = "ai_insight_cache"
+    __table_args__ = (UniqueConstraint("osm_id", "preference_key", name="uq_ai_insight_cache_osm_id_preference_key"),)
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    osm_id = Column(BigInteger, nullable=False, index=True)
+    preference_key = Column(String, nullable=False, default="")
+    variants = Column(JSON, nullable=False)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(dt_timezone.utc), nullable=False)
+    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(dt_timezone.utc), onupdate=lambda: datetime.now(dt_timezone.utc), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<AiInsightCache(osm_id={self.osm_id}, preference_key='{self.preference_key}', variants={len(self.variants or [])})>"
+
+
+class PlaceSuitabilityVerdict(Base):
+    __tablename__ = "place_suitability_verdicts"
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    osm_id = Column(BigInteger, unique=True, nullable=False, index=True)
+    name = Column(String, nullable=True)
+    is_suitable = Column(Boolean, nullable=False)
+    judged_at = Column(DateTime(timezone=True), default=lambda: datetime.now(dt_timezone.utc), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<PlaceSuitabilityVerdict(osm_id={self.osm_id}, name='{self.name}', is_suitable={self.is_suitable})>"
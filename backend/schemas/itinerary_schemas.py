@@ -4,7 +4,7 @@ from pydantic import BaseModel, Field, field_validator, model_validator, Validat
 from typing import List, Optional, Dict, Any, Literal, Tuple # <<< ADD Tuple
 from datetime import datetime, time as dt_time, timedelta, timezone as dt_timezone
 
-from core.constants import DEFAULT_TRAVEL_MODE
+from core.constants import DEFAULT_TRAVEL_MODE, MAX_BATCH_INSERT_ACTIVITIES
 
 # --- Weather Schemas ---
 class WeatherCondition(BaseModel):
@@ -37,6 +37,8 @@ class ItineraryRequest(BaseModel):
     must_include_osm_ids: Optional[List[int]] = Field(default_factory=list)
     surprise_me: Optional[bool] = False
     travel_mode: Optional[Literal["driving", "walking", "bicycling", "transit"]] = Field(default=DEFAULT_TRAVEL_MODE)
+    # Return the plan as soon as it is routed; AI tips, title and weather sentence follow in the background.
+    defer_enrichment: Optional[bool] = False
 
     @field_validator('start_datetime', 'end_datetime', mode='before')
     @classmethod
@@ -92,9 +94,12 @@ class ItineraryItem(BaseModel):
     rating: Optional[float] = None
     user_ratings_total: Optional[int] = None
     opening_hours_today: Optional[str] = None
+    opening_hours: Optional[str] = None
     business_status: Optional[str] = None
     foodie_classification: Optional[str] = None
     shopping_classification: Optional[str] = None
+    # Hourly forecast for the activity's arrival time.
+    weather_forecast: Optional[WeatherForecast] = None
 
 class ItineraryResponse(BaseModel):
     trip_uuid: Optional[str] = None
@@ -105,6 +110,7 @@ class ItineraryResponse(BaseModel):
     custom_heading: Optional[str] = None
     notes: Optional[str] = None
     weather_info: Optional[WeatherForecast] = None
+    enrichment_status: Optional[Literal["pending", "complete", "failed"]] = None
 
 
 # --- Serendipity & Helper Schemas ---
@@ -120,6 +126,20 @@ class SerendipityResponse(BaseModel):
     replaces_activity_osm_id: Optional[int] = None
     time_extension_minutes: Optional[float] = None
 
+# --- Place Autocomplete ---
+class PlaceSuggestion(BaseModel):
+    name: str
+    display_name: str
+    lat: float
+    lon: float
+    country_code: Optional[str] = None
+    source: Literal["gazetteer", "geocoded"]
+    match: Literal["prefix", "fuzzy"]
+
+class AutocompleteResponse(BaseModel):
+    query: str
+    suggestions: List[PlaceSuggestion]
+
 class ActivityTimeViability(BaseModel):
     is_viable: bool
     adjusted_arrival_utc: Optional[datetime] = None
@@ -129,12 +149,47 @@ class ActivityTimeViability(BaseModel):
     reason: Optional[str] = None
 
 class ItineraryInsertionRequest(BaseModel):
+    trip_uuid: Optional[str] = None
     current_itinerary: List[ItineraryItem]
     new_activity: ItineraryItem
     original_request: ItineraryRequest
     current_heading: Optional[str] = None
     current_weather: Optional[WeatherForecast] = None
 
+class ItineraryBatchInsertionRequest(BaseModel):
+    trip_uuid: Optional[str] = None
+    current_itinerary: List[ItineraryItem]
+    new_activities: List[ItineraryItem] = Field(..., min_length=1, max_length=MAX_BATCH_INSERT_ACTIVITIES)
+    original_request: ItineraryRequest
+    current_heading: Optional[str] = None
+    current_weather: Optional[WeatherForecast] = None
+
+    @model_validator(mode='after')
+    def check_new_activities_have_coords(self) -> 'ItineraryBatchInsertionRequest':
+        if any(item.lat is None or item.lon is None for item in self.new_activities):
+            raise ValueError("Every new activity must include 'lat' and 'lon'.")
+        return self
+
+class ReplanRequest(BaseModel):
+    trip_uuid: str
+    current_lat: float
+    current_lon: float
+    current_datetime: Optional[str] = None
+    completed_osm_ids: Optional[List[int]] = None
+
+    @field_validator('current_datetime', mode='before')
+    @classmethod
+    def check_datetime_format(cls, v: Any) -> Optional[str]:
+        if v is None:
+            return v
+        if not isinstance(v, str):
+            raise ValueError("Field 'current_datetime': must be a string")
+        try:
+            datetime.fromisoformat(v.replace('Z', '+00:00'))
+            return v
+        except ValueError as e:
+            raise ValueError(f"Field 'current_datetime': Invalid ISO 8601 format for datetime '{v}'. Error: {e}")
+
 
 # --- Trip Management Schemas ---
 class UserTripPydantic(BaseModel):
@@ -8,6 +8,8 @@ from typing import Optional, List, Dict, Any
 
 from models.all_models import UserTrip
 from core import constants
+from core.ai_bulkhead import guarded_generation
+from core.ai_cache import cached_generation
 from schemas import itinerary_schemas
 
 logger = logging.getLogger(__name__)
@@ -16,6 +18,8 @@ logger = logging.getLogger(__name__)
 AI_CALL_TIMEOUT_SECONDS = 20.0
 
 
+@guarded_generation("description_analysis")
+@cached_generation("description_analysis")
 async def analyze_description_for_keywords_and_prefs(
     gemini_model: genai.GenerativeModel,
     description: str,
@@ -84,45 +88,57 @@ async def analyze_description_for_keywords_and_prefs(
     return {"keywords": [], "mapped_preferences": []}
 
 # <<< NEW EFFICIENT FUNCTION >>>
-async def get_dynamic_local_keywords_for_multiple_preferences(
+@guarded_generation("local_keywords")
+async def get_dynamic_local_keywords_by_preference(
     gemini_model: genai.GenerativeModel,
     city: str,
     preferences: List[str]
-) -> List[str]:
-    """Gets hyper-local, specific keywords for a list of preferences in a single AI call."""
+) -> Optional[Dict[str, List[str]]]:
+    """
+    Gets hyper-local, specific keywords for a list of preferences in a single AI call,
+    answered as a JSON object keyed by preference so each part can be cached on its own.
+    Returns None when the call fails.
+    """
     if not all([gemini_model, city, preferences]):
-        return []
+        return None
 
     prompt_parts = [
         f"You are an expert local guide for the city of '{city.title()}'. Your goal is to suggest specific, queryable keywords for a tourist based on their interests."
     ]
     for pref in preferences:
-        example_text = constants.PROMPT_EXAMPLES_FOR_PREFERENCES.get(pref)
-        if example_text:
-            prompt_parts.append(f"\nFor their interest in '{pref}', suggest unique local aspects. {example_text}")
+        example_text = constants.PROMPT_EXAMPLES_FOR_PREFERENCES.get(pref, "")
+        prompt_parts.append(f"\nFor their interest in '{pref}', suggest unique local aspects. {example_text}".rstrip())
 
-    prompt_parts.append("\nReturn your response ONLY as a single JSON formatted list of strings, combining all keywords from all preferences. If no truly iconic or unique local aspects come to mind for any preference, just return an empty list for that category inside the combined list.")
+    prompt_parts.append(
+        "\nReturn your response ONLY as a single JSON object whose keys are exactly these interests: "
+        f"{json.dumps(preferences)}, each mapped to a list of keyword strings. "
+        "If no truly iconic or unique local aspects come to mind for an interest, map it to an empty list."
+    )
     
     prompt = "\n".join(prompt_parts)
     
     try:
         generation_config = genai.types.GenerationConfig(
-            candidate_count=1, max_output_tokens=300, temperature=0.2, response_mime_type="application/json"
+            candidate_count=1, max_output_tokens=100 * len(preferences) + 100, temperature=0.2, response_mime_type="application/json"
         )
         coro = gemini_model.generate_content_async(prompt, generation_config=generation_config)
         response = await asyncio.wait_for(coro, timeout=AI_CALL_TIMEOUT_SECONDS)
 
         if response.text:
-            keywords = json.loads(response.text)
-            if isinstance(keywords, list) and all(isinstance(k, str) for k in keywords):
-                logger.info(f"Dynamically fetched keywords for preferences {preferences}: {keywords}")
-                return [k.lower() for k in keywords]
+            answer = json.loads(response.text)
+            if isinstance(answer, dict):
+                keywords_by_pref = {
+                    pref: [k.lower() for k in answer.get(pref, []) if isinstance(k, str)]
+                    for pref in preferences if isinstance(answer.get(pref, []), list)
+                }
+                logger.info(f"Dynamically fetched keywords for preferences {preferences}: {keywords_by_pref}")
+                return keywords_by_pref
+            logger.warning(f"Dynamic keywords AI call for {preferences} returned an unexpected shape: {type(answer).__name__}")
     except asyncio.TimeoutError:
         logger.warning(f"Dynamic keywords AI call for {preferences} timed out.")
     except Exception as e:
         logger.error(f"Dynamic keywords AI error for {preferences}: {e}", exc_info=True)
-    return []
-
+    return None
 
 
 #async def get_dynamic_local_keywords_for_preference(
@@ -166,6 +182,8 @@ async def get_dynamic_local_keywords_for_multiple_preferences(
 #    return []
 
 
+@guarded_generation("trip_title")
+@cached_generation("trip_title")
 async def generate_creative_trip_title(
     gemini_model: genai.GenerativeModel,
     city: str,
@@ -213,6 +231,8 @@ async def generate_creative_trip_title(
     return f"Your Adventure in {city.title()}"
 
 
+@guarded_generation("place_insight")
+@cached_generation("place_insight")
 async def generate_ai_insight(
     gemini_model: genai.GenerativeModel,
     place_name: str,
@@ -248,6 +268,77 @@ async def generate_ai_insight(
         return None
 
 
+@guarded_generation("place_insights_batch")
+async def generate_ai_insights_batch(
+    gemini_model: genai.GenerativeModel,
+    activities: List[itinerary_schemas.ItineraryItem]
+) -> List[Optional[str]]:
+    """
+    Generates 'Cabito Tips' for every activity in one structured JSON call and maps the
+    answers back by index (or osm_id). Activities the batch answer misses fall back to
+    individual `generate_ai_insight` calls.
+    """
+    if not gemini_model or not activities:
+        return [None] * len(activities)
+
+    places = [
+        {
+            "id": idx,
+            "osm_id": item.osm_id,
+            "name": item.activity,
+            "description": item.description or "a place of interest",
+            "user_interests": item.matched_preferences or [],
+        }
+        for idx, item in enumerate(activities)
+    ]
+    prompt = (
+        "You are 'Cabito', a witty and knowledgeable travel assistant. "
+        "For EACH place in the JSON list below, provide a single, concise, and helpful tip (max 20-25 words). "
+        "It should be a practical tip, a fun fact, or an insider's secret, tailored to the user's interests when given. Make each one unique and engaging. "
+        "Do NOT add a prefix like 'Cabito Tip:' to any tip.\n\n"
+        f"Places: {json.dumps(places, ensure_ascii=False)}\n\n"
+        "Return a single, valid JSON object of the form {\"insights\": [{\"id\": <id>, \"tip\": \"...\"}]} with one entry per place."
+    )
+
+    insights: List[Optional[str]] = [None] * len(activities)
+    try:
+        generation_config = genai.types.GenerationConfig(
+            candidate_count=1, max_output_tokens=80 * len(activities) + 50, temperature=0.75, response_mime_type="application/json"
+        )
+        coro = gemini_model.generate_content_async(prompt, generation_config=generation_config)
+        response = await asyncio.wait_for(coro, timeout=AI_CALL_TIMEOUT_SECONDS)
+
+        if response.text:
+            answers = json.loads(response.text)
+            answers = answers.get("insights", []) if isinstance(answers, dict) else answers
+            index_by_osm_id = {item.osm_id: idx for idx, item in enumerate(activities) if item.osm_id is not None}
+            for answer in answers if isinstance(answers, list) else []:
+                if not isinstance(answer, dict) or not isinstance(answer.get("tip"), str) or not answer["tip"].strip():
+                    continue
+                idx = answer.get("id")
+                if not (isinstance(idx, int) and 0 <= idx < len(activities)):
+                    idx = index_by_osm_id.get(answer.get("osm_id"))
+                if idx is not None:
+                    insights[idx] = answer["tip"].strip().replace('"', '')
+    except asyncio.TimeoutError:
+        logger.warning(f"Batched AI insight generation timed out for {len(activities)} activities.")
+    except Exception as e:
+        logger.error(f"Batched AI insight generation failed: {e}")
+
+    missing = [idx for idx, insight in enumerate(insights) if insight is None]
+    if missing:
+        logger.info(f"Batched insights missing for {len(missing)} of {len(activities)} activities; falling back to per-item calls.")
+        fallback_results = await asyncio.gather(
+            *[generate_ai_insight(gemini_model, activities[idx].activity, activities[idx].description, activities[idx].matched_preferences) for idx in missing],
+            return_exceptions=True
+        )
+        for idx, result in zip(missing, fallback_results):
+            if isinstance(result, str):
+                insights[idx] = result
+    return insights
+
+
+@guarded_generation("serendipity")
 async def generate_serendipity_suggestion_text(
     gemini_model: genai.GenerativeModel,
     place_to_suggest: Dict[str, Any],
@@ -282,6 +373,16 @@ async def generate_serendipity_suggestion_text(
     return f"✨ How about a quick visit to {place_name}?"
 
 
+# Texts returned instead of a narrative when generation could not run or failed.
+MEMORY_SNAPSHOT_UNAVAILABLE_TEXTS = (
+    "AI Storyteller is currently taking a break.",
+    "Could not retrieve itinerary details for this memory.",
+    "The details of this adventure seem to be written in the wind...",
+    "An unexpected gust of wind scattered the pages of this memory!",
+)
+
+
+@guarded_generation("memory_snapshot")
 async def generate_ai_memory_snapshot_text(
     gemini_model: genai.GenerativeModel,
     trip: UserTrip
@@ -322,40 +423,49 @@ async def generate_ai_memory_snapshot_text(
     return "An unexpected gust of wind scattered the pages of this memory!"
 
 
-async def validate_itinerary_with_ai(
+@guarded_generation("suitability_verdicts")
+async def judge_places_suitability(
     gemini_model: genai.GenerativeModel,
-    itinerary_items: List[itinerary_schemas.ItineraryItem],
     city: str,
-    preferences: List[str]
-) -> List[str]:
-    if not gemini_model or not itinerary_items:
-        return []
-    activity_names = [item.activity for item in itinerary_items if item.leg_type == 'ACTIVITY']
-    
+    places: List[Dict[str, Any]]
+) -> Optional[Dict[int, bool]]:
+    """
+    Asks in one call whether each place is worth a tourist's visit. `places` entries
+    carry 'osm_id', 'name' and 'kind'. Returns {osm_id: is_suitable} for the places the
+    answer covers, or None when the call fails.
+    """
+    if not gemini_model or not places:
+        return None
+
+    entries = [{"id": idx, "name": place["name"], "kind": place.get("kind") or "place"} for idx, place in enumerate(places)]
     prompt = (
-        f"You are an expert, discerning trip planner for '{city}', creating a high-quality experience for a client whose interests are: {', '.join(preferences)}. "
-        f"Perform a final quality check on this proposed list of activities: {activity_names}. "
-        "Your task is to identify and list any items that are CLEARLY unsuitable for a tourist. "
-        "This includes non-tourist infrastructure (e.g., 'Airtel Telecom Tower', 'Water Pumping Station'), "
-        "blatant duplicates, or things that are nonsensical for a tourist itinerary. "
-        "Crucially, also remove common, non-touristy commercial stores like 'Spencer's Supermarket', 'Reliance Fresh', 'Universal Stores', or generic 'Department Store' entries, "
-        "unless they are a famous, iconic part of the city's experience (like Harrods in London). The focus is on unique, local, or interesting places for a traveler. "
-        "Return ONLY a JSON formatted list of strings of the exact names of the activities to remove. "
-        "If all activities are suitable, return an empty list. Example of what to remove: [\"Sewage Treatment Plant\", \"Spencer's\"]"
+        f"You are an expert, discerning trip planner for '{city}'. "
+        "For EACH place in the JSON list below, decide whether it is suitable for a tourist itinerary. "
+        "Unsuitable places are non-tourist infrastructure (e.g., 'Airtel Telecom Tower', 'Water Pumping Station'), "
+        "things that are nonsensical for a tourist itinerary, and common, non-touristy commercial stores like 'Spencer's Supermarket', "
+        "'Reliance Fresh', 'Universal Stores', or generic 'Department Store' entries, unless they are a famous, iconic part of the city's "
+        "experience (like Harrods in London). Unique, local, or interesting places for a traveler are suitable.\n\n"
+        f"Places: {json.dumps(entries, ensure_ascii=False)}\n\n"
+        "Return a single, valid JSON object of the form {\"verdicts\": [{\"id\": <id>, \"suitable\": true|false}]} with one entry per place."
     )
     try:
         generation_config = genai.types.GenerationConfig(
-            temperature=0.1, response_mime_type="application/json"
+            candidate_count=1, max_output_tokens=20 * len(places) + 50, temperature=0.1, response_mime_type="application/json"
         )
         coro = gemini_model.generate_content_async(prompt, generation_config=generation_config)
         response = await asyncio.wait_for(coro, timeout=AI_CALL_TIMEOUT_SECONDS)
 
-        rejected_names = json.loads(response.text)
-        if isinstance(rejected_names, list):
-            logger.info(f"AI validation as 'expert trip planner' rejected the following items: {rejected_names}")
-            return rejected_names
+        answer = json.loads(response.text) if response.text else {}
+        verdicts: Dict[int, bool] = {}
+        for entry in answer.get("verdicts", []) if isinstance(answer, dict) else []:
+            idx = entry.get("id") if isinstance(entry, dict) else None
+            if isinstance(idx, int) and 0 <= idx < len(places) and isinstance(entry.get("suitable"), bool):
+                verdicts[places[idx]["osm_id"]] = entry["suitable"]
+        rejected = [place["name"] for place in places if verdicts.get(place["osm_id"]) is False]
+        logger.info(f"AI judged {len(verdicts)}/{len(places)} places for {city}; unsuitable: {rejected}")
+        return verdicts
     except asyncio.TimeoutError:
-        logger.warning("AI validation check timed out. Proceeding without AI validation.")
+        logger.warning(f"AI suitability check for {len(places)} places timed out.")
     except Exception as e:
-        logger.error(f"AI validation check failed: {e}")
-    return []
\ No newline at end of file
+        logger.error(f"AI suitability check failed: {e}")
+    return None
@@ -0,0 +1,177 @@
+# /backend/services/autocomplete_service.py
+
+import bisect
+import heapq
+import json
+import logging
+import re
+import unicodedata
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, Optional, Tuple
+
+from core import cache, constants
+from services import gazetteer_service
+
+logger = logging.getLogger(__name__)
+
+# Place-name suggestions served from memory while the user types. Gazetteer settlements
+# and places this app has already geocoded are kept in a sorted array of normalized
+# names: a prefix is a contiguous run found by binary search, and fuzzy matching only
+# scores the run of names sharing the query's first character.
+
+
+class PlaceEntry:
+    __slots__ = ("name", "display_name", "lat", "lon", "country_code", "population", "source")
+
+    def __init__(self, name: str, display_name: str, lat: float, lon: float, country_code: str, population: int, source: str):
+        self.name = name
+        self.display_name = display_name
+        self.lat = lat
+        self.lon = lon
+        self.country_code = country_code
+        self.population = population
+        self.source = source
+
+    def as_suggestion(self, match: str) -> Dict[str, Any]:
+        return {
+            "name": self.name, "display_name": self.display_name, "lat": self.lat, "lon": self.lon,
+            "country_code": self.country_code or None, "source": self.source, "match": match,
+        }
+
+
+def normalize_place_name(text: str) -> str:
+    """'  Thiruvananthapuram (Trivandrum) ' -> 'thiruvananthapuram trivandrum'; accents dropped."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return " ".join(re.sub(r"[^\w]+", " ", stripped).split())
+
+
+class PlaceNameIndex:
+    def __init__(self, entries: List[Tuple[str, PlaceEntry]] = ()):
+        pairs = sorted(((key, entry) for key, entry in entries if key), key=lambda pair: pair[0])
+        self._keys: List[str] = [key for key, _ in pairs]
+        self._entries: List[PlaceEntry] = [entry for _, entry in pairs]
+        self.geocoded_count = 0
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def has_key(self, key: str) -> bool:
+        idx = bisect.bisect_left(self._keys, key)
+        return idx < len(self._keys) and self._keys[idx] == key
+
+    def add(self, key: str, entry: PlaceEntry) -> None:
+        idx = bisect.bisect_right(self._keys, key)
+        self._keys.insert(idx, key)
+        self._entries.insert(idx, entry)
+
+    def _range(self, prefix: str) -> Tuple[int, int]:
+        return bisect.bisect_left(self._keys, prefix), bisect.bisect_left(self._keys, prefix + "\uffff")
+
+    def prefix_matches(self, query: str, limit: int) -> List[PlaceEntry]:
+        """The best `limit` entries whose name starts with `query`: exact names first, then by population."""
+        lo, hi = self._range(query)
+        ranked = heapq.nsmallest(limit, range(lo, hi), key=lambda i: (self._keys[i] != query, -self._entries[i].population, len(self._keys[i])))
+        return [self._entries[i] for i in ranked]
+
+    def fuzzy_matches(self, query: str) -> List[PlaceEntry]:
+        """Entries whose name (or its start) is close to `query`, best first."""
+        lo, hi = self._range(query[0])
+        scored = []
+        for i in range(lo, hi):
+            key = self._keys[i]
+            head = key[:len(query) + 1]
+            matcher = SequenceMatcher(None, query, head)
+            if matcher.real_quick_ratio() < constants.AUTOCOMPLETE_FUZZY_MIN_RATIO or matcher.quick_ratio() < constants.AUTOCOMPLETE_FUZZY_MIN_RATIO:
+                continue
+            ratio = max(matcher.ratio(), SequenceMatcher(None, query, key).ratio())
+            if ratio >= constants.AUTOCOMPLETE_FUZZY_MIN_RATIO:
+                scored.append((-ratio, -self._entries[i].population, i))
+        return [self._entries[i] for _, _, i in sorted(scored)]
+
+    def suggest(self, query: str, limit: int) -> List[Dict[str, Any]]:
+        query = normalize_place_name(query)
+        if not query:
+            return []
+        suggestions: List[Dict[str, Any]] = []
+        seen = set()
+
+        def take(entries: List[PlaceEntry], match: str) -> None:
+            for entry in entries:
+                if len(suggestions) >= limit:
+                    return
+                if entry.display_name.lower() in seen:
+                    continue
+                seen.add(entry.display_name.lower())
+                suggestions.append(entry.as_suggestion(match))
+
+        # Some headroom for entries dropped as duplicates.
+        take(self.prefix_matches(query, 2 * limit), "prefix")
+        if len(suggestions) < limit and len(query) >= constants.AUTOCOMPLETE_FUZZY_MIN_CHARS:
+            take(self.fuzzy_matches(query), "fuzzy")
+        return suggestions
+
+
+def _gazetteer_entries() -> List[Tuple[str, PlaceEntry]]:
+    entries = []
+    for settlement in gazetteer_service.get_gazetteer().settlements:
+        display_name = ", ".join(part for part in (settlement.name, settlement.admin1, settlement.country_code) if part)
+        entry = PlaceEntry(settlement.name, display_name, settlement.latitude, settlement.longitude, settlement.country_code, settlement.population, "gazetteer")
+        entries.append((normalize_place_name(settlement.name), entry))
+    return entries
+
+
+_index: Optional[PlaceNameIndex] = None
+
+
+def get_index() -> PlaceNameIndex:
+    """The process-wide index, built from the gazetteer on first use."""
+    global _index
+    if _index is None:
+        _index = PlaceNameIndex(_gazetteer_entries())
+        logger.info(f"Place autocomplete index built with {len(_index)} gazetteer name(s).")
+    return _index
+
+
+def remember_geocoded_place(query: str, result: Dict[str, Any]) -> None:
+    """Adds a Nominatim search result under the text it was found for, unless that name is already indexed."""
+    index = get_index()
+    key = normalize_place_name(query)
+    if not key or index.has_key(key) or index.geocoded_count >= constants.AUTOCOMPLETE_MAX_GEOCODED_PLACES:
+        return
+    try:
+        lat, lon = float(result["lat"]), float(result["lon"])
+    except (KeyError, TypeError, ValueError):
+        return
+    address = result.get("address") or {}
+    name = result.get("name") or query.split(",")[0].strip() or query
+    display_name = result.get("display_name") or query
+    index.add(key, PlaceEntry(name, display_name, lat, lon, (address.get("country_code") or "").upper(), 0, "geocoded"))
+    index.geocoded_count += 1
+
+
+async def load_geocoded_places() -> int:
+    """Seeds the index from the shared geocode cache so every worker suggests past searches."""
+    redis = cache.get_redis()
+    index = get_index()
+    if redis is None:
+        return 0
+    loaded = 0
+    try:
+        async for cache_key in redis.scan_iter(match="geocode:*", count=500):
+            if index.geocoded_count >= constants.AUTOCOMPLETE_MAX_GEOCODED_PLACES:
+                break
+            raw = await redis.get(cache_key)
+            results = (json.loads(raw) or {}).get("result") if raw else None
+            if results:
+                before = index.geocoded_count
+                remember_geocoded_place(cache_key[len("geocode:"):], results[0])
+                loaded += index.geocoded_count - before
+    except Exception as e:
+        logger.warning(f"Could not seed place autocomplete from the geocode cache: {e}")
+    logger.info(f"Place autocomplete index seeded with {loaded} previously geocoded place(s).")
+    return loaded
+
+
+def suggest(query: str, limit: int = constants.AUTOCOMPLETE_DEFAULT_LIMIT) -> List[Dict[str, Any]]:
+    return get_index().suggest(query, limit)
@@ -0,0 +1,146 @@
+# /backend/services/gazetteer_service.py
+
+import csv
+import logging
+import math
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from core import constants
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# An offline index of city and town centroids, so a city name for a pair of coordinates
+# does not need a Nominatim reverse lookup. Settlements are bucketed into a grid of
+# GAZETTEER_GRID_DEGREES cells; a query only scans the cells within the search radius.
+
+BUNDLED_GAZETTEER_PATH = Path(__file__).parent.parent / "data" / "gazetteer_cities.tsv"
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE_LAT = 111.32
+GEONAMES_COLUMNS = 19
+
+
+class Settlement:
+    __slots__ = ("name", "latitude", "longitude", "country_code", "admin1", "population", "timezone")
+
+    def __init__(self, name: str, latitude: float, longitude: float, country_code: str = "", admin1: str = "", population: int = 0, timezone: str = ""):
+        self.name = name
+        self.latitude = latitude
+        self.longitude = longitude
+        self.country_code = country_code
+        self.admin1 = admin1
+        self.population = population
+        self.timezone = timezone
+
+    @property
+    def key(self) -> str:
+        """Stable lower-case city key, as used for AI prompt caches."""
+        return self.name.strip().lower()
+
+    def utc_offset_minutes(self, at: datetime) -> Optional[int]:
+        """Offset of the settlement's IANA zone at the aware instant `at`; None if the zone is unknown."""
+        if not self.timezone:
+            return None
+        try:
+            offset = at.astimezone(ZoneInfo(self.timezone)).utcoffset()
+        except (ZoneInfoNotFoundError, ValueError):
+            logger.warning(f"Unknown time zone '{self.timezone}' for settlement {self.name}.")
+            return None
+        return int(offset.total_seconds() // 60)
+
+    def __repr__(self) -> str:
+        return f"Settlement({self.name!r}, {self.latitude}, {self.longitude}, {self.country_code!r})"
+
+
+def _haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((phi2 - phi1) / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def _parse_row(row: List[str]) -> Optional[Settlement]:
+    """A bundled row (name, lat, lon, country, admin1, population, timezone) or a GeoNames row."""
+    try:
+        if len(row) >= GEONAMES_COLUMNS:
+            return Settlement(row[1], float(row[4]), float(row[5]), row[8], row[10], int(row[14] or 0), row[17])
+        if len(row) >= 3:
+            extra = row[3:7] + [""] * (7 - len(row))
+            return Settlement(row[0], float(row[1]), float(row[2]), extra[0], extra[1], int(extra[2] or 0), extra[3])
+    except ValueError:
+        pass
+    return None
+
+
+class Gazetteer:
+    def __init__(self, settlements: Iterable[Settlement], cell_degrees: float = constants.GAZETTEER_GRID_DEGREES):
+        self.cell_degrees = cell_degrees
+        self.settlements: List[Settlement] = list(settlements)
+        self._cells: Dict[Tuple[int, int], List[Settlement]] = defaultdict(list)
+        for settlement in self.settlements:
+            self._cells[self._cell(settlement.latitude, settlement.longitude)].append(settlement)
+
+    @classmethod
+    def from_file(cls, path: Path) -> "Gazetteer":
+        with open(path, encoding="utf-8", newline="") as f:
+            rows = csv.reader((line for line in f if line.strip() and not line.startswith("#")), delimiter="\t", quoting=csv.QUOTE_NONE)
+            settlements = [settlement for settlement in map(_parse_row, rows) if settlement is not None]
+        return cls(settlements)
+
+    def __len__(self) -> int:
+        return len(self.settlements)
+
+    def _cell(self, latitude: float, longitude: float) -> Tuple[int, int]:
+        return math.floor(latitude / self.cell_degrees), math.floor(longitude / self.cell_degrees)
+
+    def nearest(
+        self,
+        latitude: float,
+        longitude: float,
+        max_distance_km: float = constants.GAZETTEER_MAX_DISTANCE_KM
+    ) -> Optional[Settlement]:
+        """
+        The settlement the point most plausibly belongs to within `max_distance_km`:
+        the distance to each centroid is reduced by a rough urban radius for its
+        population, so large cities win over small towns at their edges.
+        """
+        row_span = math.ceil(max_distance_km / KM_PER_DEGREE_LAT / self.cell_degrees)
+        lon_km_per_degree = KM_PER_DEGREE_LAT * max(math.cos(math.radians(latitude)), 0.01)
+        col_span = min(math.ceil(max_distance_km / lon_km_per_degree / self.cell_degrees), math.ceil(360 / self.cell_degrees))
+        row, col = self._cell(latitude, longitude)
+
+        best, best_score = None, math.inf
+        for r in range(row - row_span, row + row_span + 1):
+            for c in range(col - col_span, col + col_span + 1):
+                for settlement in self._cells.get((r, c), ()):
+                    distance = _haversine_km(latitude, longitude, settlement.latitude, settlement.longitude)
+                    if distance > max_distance_km:
+                        continue
+                    score = distance - constants.GAZETTEER_URBAN_RADIUS_KM_PER_SQRT_POPULATION * math.sqrt(settlement.population)
+                    if score < best_score:
+                        best, best_score = settlement, score
+        return best
+
+
+_gazetteer: Optional[Gazetteer] = None
+
+
+def get_gazetteer() -> Gazetteer:
+    """The process-wide gazetteer, loaded on first use. A missing file gives an empty one."""
+    global _gazetteer
+    if _gazetteer is None:
+        path = Path(settings.GAZETTEER_PATH) if settings.GAZETTEER_PATH else BUNDLED_GAZETTEER_PATH
+        try:
+            _gazetteer = Gazetteer.from_file(path)
+            logger.info(f"Gazetteer loaded {len(_gazetteer)} settlement(s) from {path}.")
+        except OSError as e:
+            logger.error(f"Could not load the gazetteer from {path}; city names will come from reverse geocoding: {e}")
+            _gazetteer = Gazetteer([])
+    return _gazetteer
+
+
+def nearest_settlement(latitude: float, longitude: float) -> Optional[Settlement]:
+    return get_gazetteer().nearest(latitude, longitude)
@@ -0,0 +1,206 @@
+# /backend/services/insight_service.py
+
+import asyncio
+import contextvars
+import logging
+import random
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+import google.generativeai as genai
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core import constants
+from models.all_models import AiInsightCache
+from schemas import itinerary_schemas
+from services import ai_service
+
+logger = logging.getLogger(__name__)
+
+# 'Cabito Tips' depend only on the place and the interests it was matched for, so they
+# are shared across users. Each (osm_id, preference key) row keeps a few variants that
+# are served at random; hits occasionally generate a fresh variant until the row is full.
+
+InsightKey = Tuple[int, str]
+
+
+def preference_key(preferences: Optional[Iterable[str]]) -> str:
+    """Order- and case-insensitive key for a set of preferences."""
+    return ",".join(sorted({pref.strip().lower() for pref in preferences or [] if pref and pref.strip()}))
+
+
+def _insight_key(item: itinerary_schemas.ItineraryItem) -> Optional[InsightKey]:
+    if item.osm_id is None:
+        return None
+    return (int(item.osm_id), preference_key(item.matched_preferences))
+
+
+async def _load_variants(db: AsyncSession, keys: List[InsightKey]) -> Dict[InsightKey, List[str]]:
+    """One query for every key; expired rows are ignored."""
+    if not keys:
+        return {}
+    wanted = set(keys)
+    stmt = select(AiInsightCache).where(
+        AiInsightCache.osm_id.in_({osm_id for osm_id, _ in keys}),
+        AiInsightCache.expires_at > datetime.now(dt_timezone.utc),
+    )
+    rows = (await db.execute(stmt)).scalars().all()
+    return {
+        (row.osm_id, row.preference_key): list(row.variants or [])
+        for row in rows if (row.osm_id, row.preference_key) in wanted
+    }
+
+
+async def _store_variants(db: AsyncSession, variants_by_key: Dict[InsightKey, List[str]]) -> None:
+    """Upserts the rows inside a savepoint; the caller's commit makes them durable."""
+    if not variants_by_key:
+        return
+    now = datetime.now(dt_timezone.utc)
+    expires_at = now + timedelta(days=constants.INSIGHT_CACHE_TTL_DAYS)
+    values = [
+        {"osm_id": osm_id, "preference_key": pref_key, "variants": variants, "created_at": now, "updated_at": now, "expires_at": expires_at}
+        for (osm_id, pref_key), variants in variants_by_key.items()
+    ]
+    stmt = pg_insert(AiInsightCache).values(values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[AiInsightCache.osm_id, AiInsightCache.preference_key],
+        set_={"variants": stmt.excluded.variants, "updated_at": stmt.excluded.updated_at, "expires_at": stmt.excluded.expires_at},
+    )
+    try:
+        async with db.begin_nested():
+            await db.execute(stmt)
+    except Exception as e:
+        logger.warning(f"Could not store {len(values)} AI insight(s) in the cache: {e}")
+
+
+class InsightBatcher:
+    """
+    Merges insight requests from concurrent builds. Requests arriving within
+    `INSIGHT_BATCH_WINDOW_MS` of the first pending one are deduplicated by place and
+    preference key and sent as `generate_ai_insights_batch` calls of at most
+    `INSIGHT_BATCH_MAX_PLACES` places; each caller gets back the tips for its own items.
+    """
+
+    def __init__(self):
+        self._model: Optional[genai.GenerativeModel] = None
+        self._pending: Dict[Hashable, Tuple[itinerary_schemas.ItineraryItem, asyncio.Future]] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    @staticmethod
+    def _batch_key(item: itinerary_schemas.ItineraryItem) -> Hashable:
+        return _insight_key(item) or ("name", item.activity, preference_key(item.matched_preferences))
+
+    async def generate(
+        self,
+        gemini_model: genai.GenerativeModel,
+        activities: List[itinerary_schemas.ItineraryItem]
+    ) -> List[Optional[str]]:
+        if self._pending and gemini_model is not self._model:
+            self._flush()
+        self._model = gemini_model
+        loop = asyncio.get_running_loop()
+        futures = []
+        for item in activities:
+            key = self._batch_key(item)
+            if key not in self._pending:
+                self._pending[key] = (item, loop.create_future())
+            futures.append(self._pending[key][1])
+
+        if len(self._pending) >= constants.INSIGHT_BATCH_MAX_PLACES:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(constants.INSIGHT_BATCH_WINDOW_MS / 1000, self._flush)
+        # Shielded: other callers may be waiting on the same future.
+        return list(await asyncio.gather(*(asyncio.shield(future) for future in futures)))
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        # The merged batch is not charged to the token budget of whichever request flushed it.
+        task = contextvars.Context().run(asyncio.create_task, self._run(self._model, list(pending.values())))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(
+        self,
+        gemini_model: genai.GenerativeModel,
+        entries: List[Tuple[itinerary_schemas.ItineraryItem, asyncio.Future]]
+    ) -> None:
+        size = constants.INSIGHT_BATCH_MAX_PLACES
+        chunks = [entries[i:i + size] for i in range(0, len(entries), size)]
+        logger.info(f"Sending {len(entries)} merged insight request(s) in {len(chunks)} batch(es).")
+        try:
+            results = await asyncio.gather(
+                *(ai_service.generate_ai_insights_batch(gemini_model, [item for item, _ in chunk]) for chunk in chunks),
+                return_exceptions=True
+            )
+            for chunk, insights in zip(chunks, results):
+                if isinstance(insights, BaseException):
+                    logger.error(f"Merged insight batch failed: {insights}")
+                    continue
+                for (_, future), insight in zip(chunk, insights):
+                    if not future.done():
+                        future.set_result(insight)
+        finally:
+            for _, future in entries:
+                if not future.done():
+                    future.set_result(None)
+
+
+_batcher = InsightBatcher()
+
+
+async def get_insights(
+    db: AsyncSession,
+    gemini_model: genai.GenerativeModel,
+    activities: List[itinerary_schemas.ItineraryItem]
+) -> List[Optional[str]]:
+    """
+    Returns a 'Cabito Tip' per activity, serving cached variants where possible and
+    generating the rest through the shared InsightBatcher.
+    """
+    if not activities:
+        return []
+    keys = [_insight_key(item) for item in activities]
+    try:
+        cached = await _load_variants(db, [key for key in keys if key is not None])
+    except Exception as e:
+        logger.warning(f"AI insight cache lookup failed, generating every insight: {e}")
+        cached = {}
+
+    insights: List[Optional[str]] = [None] * len(activities)
+    to_generate: List[int] = []
+    for idx, key in enumerate(keys):
+        variants = cached.get(key) if key else None
+        wants_new_variant = (
+            variants is not None and len(variants) < constants.INSIGHT_CACHE_MAX_VARIANTS
+            and random.random() < constants.INSIGHT_CACHE_NEW_VARIANT_PROBABILITY
+        )
+        if variants and not wants_new_variant:
+            insights[idx] = random.choice(variants)
+        else:
+            to_generate.append(idx)
+    logger.info(f"AI insight cache: {len(activities) - len(to_generate)} hit(s), {len(to_generate)} to generate.")
+    if not to_generate or not gemini_model:
+        return insights
+
+    generated = await _batcher.generate(gemini_model, [activities[idx] for idx in to_generate])
+    updates: Dict[InsightKey, List[str]] = {}
+    for idx, insight in zip(to_generate, generated):
+        insights[idx] = insight
+        key = keys[idx]
+        if not insight or key is None:
+            continue
+        variants = updates.get(key, cached.get(key, []))
+        if insight not in variants:
+            variants = (variants + [insight])[-constants.INSIGHT_CACHE_MAX_VARIANTS:]
+        updates[key] = variants
+    await _store_variants(db, updates)
+    return insights
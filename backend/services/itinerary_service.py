@@ -5,13 +5,11 @@ import inspect
 import logging
 import math
 import random
-import re
 import time
 import uuid
 from collections import Counter
 from datetime import datetime, time as dt_time, timedelta, timezone as dt_timezone
-from difflib import SequenceMatcher
-from typing import Any, Coroutine, Dict, List, Optional, Set, Tuple
+from typing import Any, Awaitable, Callable, Coroutine, Dict, List, Optional, Set, Tuple
 
 import google.generativeai as genai
 import httpx
@@ -20,9 +18,11 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 import models
-from core import constants
+from core import ai_bulkhead, cache, constants, singleflight
+from core.pipeline import Pipeline
+from database import AsyncSessionLocal
 from schemas import itinerary_schemas
-from services import ai_service, location_service, weather_service
+from services import ai_service, gazetteer_service, insight_service, keyword_service, location_service, opening_hours_service, planning_service, route_optimizer, suitability_service, weather_service
 from services.location_service import LocationServiceError
 
 try:
@@ -37,39 +37,196 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# Progress listener for streamed builds: awaited with (event name, JSON-ready payload).
+EventCallback = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+# Strong references to fire-and-forget tasks so they are not garbage collected mid-run.
+_background_tasks: Set[asyncio.Task] = set()
+
 
 # --- Internal Helper Functions ---
 
-def _haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    R = 6371
-    dLat = math.radians(lat2 - lat1)
-    dLon = math.radians(lon2 - lon1)
-    a = (math.sin(dLat / 2) * math.sin(dLat / 2) +
-         math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) *
-         math.sin(dLon / 2) * math.sin(dLon / 2))
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    distance = R * c
-    return distance
+def _spawn_background(coro: Coroutine) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+async def _emit(on_event: Optional[EventCallback], event: str, data: Dict[str, Any]) -> None:
+    if on_event is None:
+        return
+    try:
+        await on_event(event, data)
+    except Exception as e:
+        logger.warning(f"Itinerary event listener failed for '{event}': {e}")
+
+class _RouteFetcher:
+    """
+    Per-build cache of direction requests keyed by (origin, destination).
+    Requests are started as tasks so the greedy loop can route ahead from likely
+    next stops, reuse return-journey legs across iterations, and cancel guesses
+    that did not pan out. Speculative requests never get ahead of required ones:
+    they have a small concurrency limit and per-build budget of their own, and only
+    queue for a routing slot once every required request waiting for one has it.
+    """
+
+    def __init__(self, http_client: httpx.AsyncClient, travel_mode: str):
+        self._http_client = http_client
+        self._travel_mode = travel_mode
+        self._tasks: Dict[Tuple[Tuple[float, float], Tuple[float, float]], asyncio.Task] = {}
+        self._semaphore = asyncio.Semaphore(constants.ROUTING_MAX_CONCURRENCY)
+        self._prefetch_semaphore = asyncio.Semaphore(constants.ROUTE_PREFETCH_MAX_CONCURRENCY)
+        self._prefetch_budget = constants.ROUTE_PREFETCH_BUDGET_PER_BUILD
+        # Speculative requests that do not hold a routing slot yet.
+        self._queued_prefetches: Set[Tuple[Tuple[float, float], Tuple[float, float]]] = set()
+        self._required_waiting = 0
+        self._required_admitted = asyncio.Event()
+        self._required_admitted.set()
+
+    async def _call(self, origin: Tuple[float, float], destination: Tuple[float, float]) -> Dict[str, Any]:
+        started = time.monotonic()
+        try:
+            return await location_service.get_directions(self._http_client, origin, destination, self._travel_mode)
+        finally:
+            # Hold the slot for a minimum time to respect the routing provider's rate limit.
+            await asyncio.sleep(max(0.0, constants.ROUTING_MIN_SLOT_SECONDS - (time.monotonic() - started)))
+
+    async def _fetch(self, origin: Tuple[float, float], destination: Tuple[float, float]) -> Dict[str, Any]:
+        self._required_waiting += 1
+        self._required_admitted.clear()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._required_waiting -= 1
+            if self._required_waiting == 0:
+                self._required_admitted.set()
+        try:
+            return await self._call(origin, destination)
+        finally:
+            self._semaphore.release()
+
+    async def _prefetch(self, origin: Tuple[float, float], destination: Tuple[float, float]) -> Dict[str, Any]:
+        key = (origin, destination)
+        try:
+            async with self._prefetch_semaphore:
+                await self._required_admitted.wait()
+                async with self._semaphore:
+                    self._queued_prefetches.discard(key)
+                    return await self._call(origin, destination)
+        finally:
+            self._queued_prefetches.discard(key)
+
+    def _start(self, key: Tuple[Tuple[float, float], Tuple[float, float]], coro: Coroutine) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        # Speculative results may never be awaited; retrieve exceptions so they are not logged as lost.
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._tasks[key] = task
+        return task
+
+    def request(self, origin: Tuple[float, float], destination: Tuple[float, float]) -> asyncio.Task:
+        key = (origin, destination)
+        task = self._tasks.get(key)
+        if task is not None and key in self._queued_prefetches:
+            # Needed now: don't leave it behind the speculative limits.
+            task.cancel()
+            task = None
+        if task is None:
+            task = self._start(key, self._fetch(origin, destination))
+        return task
+
+    def prefetch(self, origin: Tuple[float, float], destinations: List[Tuple[float, float]]) -> None:
+        for destination in destinations:
+            key = (origin, destination)
+            if key in self._tasks:
+                continue
+            if self._prefetch_budget <= 0:
+                return
+            self._prefetch_budget -= 1
+            self._queued_prefetches.add(key)
+            self._start(key, self._prefetch(origin, destination))
+
+    def cancel_speculative(self, origins: Set[Tuple[float, float]]) -> None:
+        """Cancels unfinished requests that start from stops the planner did not choose."""
+        for key, task in list(self._tasks.items()):
+            if key[0] in origins and not task.done():
+                task.cancel()
+                del self._tasks[key]
+
+    def cancel_pending(self) -> None:
+        for task in self._tasks.values():
+            if not task.done():
+                task.cancel()
+        self._tasks.clear()
 
 def _normalize_city_name(location_str: str) -> str:
     if not location_str: return ""
     return location_str.split(',')[0].strip().lower()
 
+def _city_key(coords: Tuple[float, float], location_str: str) -> str:
+    """The offline gazetteer's settlement for `coords`, else the normalized location text."""
+    settlement = gazetteer_service.nearest_settlement(*coords)
+    return settlement.key if settlement else _normalize_city_name(location_str)
+
+def _resolve_place_utc_offset_minutes(start_datetime: str, coords: Tuple[float, float]) -> int:
+    # Opening hours are local wall-clock times. Use the time zone of the gazetteer settlement,
+    # then an explicit offset in the request (a trailing 'Z' only says the time is in UTC,
+    # not where the place is), and only then estimate from the longitude.
+    start_dt = datetime.fromisoformat(start_datetime.replace('Z', '+00:00'))
+    settlement = gazetteer_service.nearest_settlement(*coords)
+    place_offset = settlement.utc_offset_minutes(start_dt) if settlement and start_dt.tzinfo else None
+    if place_offset is not None:
+        return place_offset
+    request_utc_offset = start_dt.utcoffset()
+    if request_utc_offset is not None and not start_datetime.endswith('Z'):
+        return int(request_utc_offset.total_seconds() // 60)
+    return opening_hours_service.estimate_utc_offset_minutes(coords[1])
+
 async def _check_place_viability_and_timing(
     place_name: str,
-    opening_hours: Optional[Any], # This is now generic, as we don't get structured data
+    opening_hours: Optional[str],
+    utc_offset_minutes: int,
     current_arrival_utc: datetime,
     activity_duration_hrs: float,
     itinerary_end_utc: datetime,
     return_journey_hrs: float
 ) -> itinerary_schemas.ActivityTimeViability:
-    # As we no longer have a reliable source for opening hours, this check is simplified.
-    # It now primarily checks if there's enough time left in the user's window.
     total_time_for_activity_and_return = timedelta(hours=(activity_duration_hrs + return_journey_hrs))
     if current_arrival_utc + total_time_for_activity_and_return > itinerary_end_utc:
         return itinerary_schemas.ActivityTimeViability(is_viable=False, reason="Not enough time for activity and return journey.")
 
-    return itinerary_schemas.ActivityTimeViability(is_viable=True, adjusted_arrival_utc=current_arrival_utc, adjusted_departure_utc=current_arrival_utc + timedelta(hours=activity_duration_hrs), adjusted_activity_duration_hrs=activity_duration_hrs, reason="Time window is sufficient.")
+    # The OSM string is compiled once per distinct value, so this lookup is cheap for every candidate.
+    schedule = opening_hours_service.compile_opening_hours(opening_hours)
+    if schedule is None or schedule.is_always_open:
+        return itinerary_schemas.ActivityTimeViability(is_viable=True, adjusted_arrival_utc=current_arrival_utc, adjusted_departure_utc=current_arrival_utc + timedelta(hours=activity_duration_hrs), adjusted_activity_duration_hrs=activity_duration_hrs, reason="Time window is sufficient.")
+
+    wait_time_hrs, actual_arrival_utc = 0.0, current_arrival_utc
+    if not schedule.is_open(current_arrival_utc, utc_offset_minutes):
+        next_open_utc = schedule.next_change(current_arrival_utc, utc_offset_minutes)
+        if not next_open_utc: return itinerary_schemas.ActivityTimeViability(is_viable=False, reason="Closed indefinitely.")
+        if next_open_utc > itinerary_end_utc: return itinerary_schemas.ActivityTimeViability(is_viable=False, reason="Next opening is after trip ends.")
+        wait_time_hrs = max(0, (next_open_utc - current_arrival_utc).total_seconds() / 3600.0)
+        if wait_time_hrs > constants.MAX_WAIT_TIME_HOURS: return itinerary_schemas.ActivityTimeViability(is_viable=False, reason=f"Wait time of {wait_time_hrs:.1f} hrs is too long.")
+        actual_arrival_utc = next_open_utc
+
+    final_duration_hrs = activity_duration_hrs
+    potential_departure_utc = actual_arrival_utc + timedelta(hours=final_duration_hrs)
+
+    if potential_departure_utc + timedelta(hours=return_journey_hrs) > itinerary_end_utc:
+        available_time_hrs = (itinerary_end_utc - actual_arrival_utc - timedelta(hours=return_journey_hrs)).total_seconds() / 3600.0
+        if available_time_hrs < constants.MIN_VIABLE_ACTIVITY_HOURS:
+            return itinerary_schemas.ActivityTimeViability(is_viable=False, reason="Not enough time for activity and return journey after waiting.")
+        final_duration_hrs = available_time_hrs
+        potential_departure_utc = actual_arrival_utc + timedelta(hours=final_duration_hrs)
+
+    next_closing_utc = schedule.next_change(actual_arrival_utc, utc_offset_minutes)
+    if next_closing_utc and potential_departure_utc > next_closing_utc:
+        duration_before_closing_hrs = (next_closing_utc - actual_arrival_utc).total_seconds() / 3600.0
+        if duration_before_closing_hrs < constants.MIN_VIABLE_ACTIVITY_HOURS:
+            return itinerary_schemas.ActivityTimeViability(is_viable=False, reason="Closes too soon after arrival.")
+        final_duration_hrs = duration_before_closing_hrs
+        potential_departure_utc = next_closing_utc
+
+    return itinerary_schemas.ActivityTimeViability(is_viable=True, adjusted_arrival_utc=actual_arrival_utc, adjusted_departure_utc=potential_departure_utc, adjusted_activity_duration_hrs=final_duration_hrs, wait_time_hrs=wait_time_hrs)
 
 # --- OLD VIABILITY CHECK (COMMENTED OUT) ---
 # async def _check_place_viability_and_timing(
@@ -147,133 +304,6 @@ async def _check_place_viability_and_timing(
 #         logger.error(f"Opening hours check error for '{place_name}': {e}")
 #         return itinerary_schemas.ActivityTimeViability(is_viable=False, reason="Opening hours parsing error.")
 
-def _get_matched_preferences(tags: Dict[str, Any], user_prefs: Set[str]) -> List[str]:
-    """
-    Determines which user preferences match a given set of OSM tags.
-    """
-    matched = []
-    for pref in user_prefs:
-        if pref in constants.PREFERENCE_TO_OSM_SELECTOR:
-            selectors = constants.PREFERENCE_TO_OSM_SELECTOR[pref]
-            for selector in selectors:
-                # Basic parsing of Overpass-style selectors like '[key="value"]' or '[key]'
-                match = re.match(r'\[(\w+)(?:~"([^"]+)")?\]', selector)
-                if match:
-                    key, values_str = match.groups()
-                    if key in tags:
-                        if values_str:
-                            # Handles key~"value1|value2"
-                            possible_values = set(values_str.split('|'))
-                            if tags.get(key) in possible_values:
-                                if pref not in matched:
-                                    matched.append(pref)
-                                break  # Move to the next preference once one selector matches
-                        else:
-                            # Handles [key]
-                            if pref not in matched:
-                                matched.append(pref)
-                            break
-            if pref in matched:
-                continue # Skip other selectors for this pref if already matched
-    return matched
-
-# --- REVISED SCORING FUNCTION ---
-def _get_candidate_score(
-    candidate: Dict[str, Any],
-    all_keywords: List[str],
-    matched_prefs: List[str],
-    distance_from_start: float,
-    fulfilled_preferences: Set[str],
-    added_activity_signatures: Set[str],
-    ideal_arrival_utc: datetime, # Kept for potential future use with timing scores
-    added_meal_times: Set[str] # Kept for meal diversity logic
-) -> int:
-    """
-    Calculates a candidate's score based on available OSM data, keywords, and user preferences.
-    This version is lightweight and does NOT rely on external API calls (like Google ratings).
-    """
-    score = 0
-    name_lower = (candidate.get('name') or '').lower()
-    tags = candidate.get('tags', {})
-    description = (candidate.get('description') or '').lower()
-    is_foodie = 'foodie' in matched_prefs
-    is_shopping = 'shopping' in matched_prefs
-    is_sightseeing_or_history = any(p in matched_prefs for p in ["sights", "history", "religious"])
-    is_park = 'park' in matched_prefs
-
-    # --- 1. Preference & Keyword Matching ---
-
-    # Big bonus if a user's specific keyword is in the place name (high relevance)
-    if any(re.search(re.escape(kw), name_lower, re.IGNORECASE) for kw in all_keywords):
-        score += constants.KEYWORD_DISCOVERY_BONUS
-
-    # Bonus for fulfilling a preference category for the first time
-    newly_fulfilled_prefs = set(matched_prefs) - fulfilled_preferences
-    if newly_fulfilled_prefs:
-        score += constants.PREFERENCE_COVERAGE_BONUS * len(newly_fulfilled_prefs)
-
-    # Smaller bonus for simply diversifying the plan
-    if matched_prefs and not fulfilled_preferences.intersection(matched_prefs):
-        score += constants.DIVERSIFICATION_BONUS
-
-    # --- 2. Notability & Quality Proxies (from OSM data) ---
-
-    # Having a Wikipedia tag is a strong indicator of notability
-    if 'wikipedia' in tags or 'wikidata' in tags:
-        if is_foodie: score += constants.WIKIPEDIA_NOTABILITY_BOOST_FOOD
-        elif is_shopping: score += constants.WIKIPEDIA_NOTABILITY_BOOST_SHOP
-        elif is_sightseeing_or_history: score += constants.SIGNIFICANCE_BONUS_SIGHTS
-        elif is_park: score += constants.SIGNIFICANCE_BONUS_PARK
-        else: score += 50 # Generic notability bonus
-
-    # Check for authenticity keywords in the description
-    if description:
-        if is_foodie and any(kw in description for kw in constants.AUTHENTICITY_KEYWORDS):
-            score += constants.AUTHENTICITY_KEYWORD_BOOST_FOOD
-        if is_shopping and any(kw in description for kw in constants.SHOPPING_AUTHENTICITY_KEYWORDS):
-            score += constants.SHOPPING_AUTHENTICITY_KEYWORD_BOOST
-
-    # --- 3. Preference-Specific Heuristics & Penalties ---
-
-    if is_foodie:
-        # Penalize generic international fast-food chains
-        if any(chain in name_lower for chain in constants.INTERNATIONAL_FOOD_CHAINS_EXCLUDE):
-            return -9999  # Disqualify immediately
-        # Penalize generic fast food tags
-        if tags.get('amenity') == 'fast_food':
-            score += constants.GENERIC_FAST_FOOD_PENALTY
-
-    if is_shopping:
-        # Heavily penalize common, non-touristy generic stores by name
-        if any(term in name_lower.split() for term in constants.GENERIC_STORE_MATCH_TERMS):
-            score += constants.GENERIC_STORE_KEYWORDS_PENALTY
-        # Boost specific, desirable shop types
-        shop_type = tags.get('shop')
-        if shop_type == 'mall': score += constants.SHOPPING_MALL_BOOST
-        elif shop_type in {'souvenir', 'gift', 'crafts', 'art'}: score += constants.SOUVENIR_GIFT_CRAFT_ART_BOOST
-        # Penalize generic shop tags that passed the name check
-        elif shop_type in {'general', 'department_store'}: score += constants.GENERAL_SHOP_PENALTY
-
-    # Penalize adding too many activities of the same specific type (e.g., two museums)
-    activity_signature = None
-    if matched_prefs:
-        # Create a signature like "history_museum" or "foodie_restaurant"
-        primary_pref = matched_prefs[0]
-        sub_type = tags.get('amenity') or tags.get('shop') or tags.get('leisure') or tags.get('historic')
-        if sub_type:
-            activity_signature = f"{primary_pref}_{sub_type}"
-            if activity_signature in added_activity_signatures:
-                score += constants.SIMILAR_ACTIVITY_PENALTY
-
-    # --- 4. Final Adjustments ---
-
-    # Penalize locations that are very far from the starting point
-    if distance_from_start > 5: # Penalize distances over 5 km
-        score -= int((distance_from_start - 5) * 50)
-
-    return score
-
-
 # <<< MODIFIED: This function no longer calls HERE API >>>
 async def enrich_candidate(
     element: Dict[str, Any], 
@@ -391,125 +421,66 @@ async def enrich_candidate(
 #             return None
 
 
-async def build_itinerary(
-    payload: itinerary_schemas.ItineraryRequest,
-    db: AsyncSession,
-    current_user: models.all_models.UserAccount,
-    http_client: httpx.AsyncClient,
-    gemini_model: genai.GenerativeModel
-) -> itinerary_schemas.ItineraryResponse:
-    start_overall_time = time.time()
-    start_dt_utc = datetime.fromisoformat(payload.start_datetime.replace('Z', '+00:00')).astimezone(dt_timezone.utc)
-    end_dt_utc = datetime.fromisoformat(payload.end_datetime.replace('Z', '+00:00')).astimezone(dt_timezone.utc)
-    
-    start_coords = None
-    if payload.start_lat and payload.start_lon:
-        start_coords = (payload.start_lat, payload.start_lon)
-    elif payload.location:
-        try:
-            geo_result = await location_service.geocode_location_text(payload.location, http_client)
-            start_coords = (float(geo_result['lat']), float(geo_result['lon']))
-        except LocationServiceError as e:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
-    
-    if not start_coords:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Could not determine start coordinates.")
-
-    location_display_name = payload.location
-    if payload.start_lat and payload.start_lon and (not payload.location or payload.location.startswith("[Lat:")):
-        try:
-            rev_geo_result = await location_service.reverse_geocode_coords(payload.start_lat, payload.start_lon, http_client)
-            if rev_geo_result and rev_geo_result.get('address'):
-                address = rev_geo_result['address']
-                city_name = address.get('city') or address.get('town') or address.get('state_district') or address.get('state')
-                if city_name:
-                    location_display_name = city_name
-                else:
-                    location_display_name = rev_geo_result.get('display_name', 'your current location')
-            else:
-                location_display_name = "your current location"
-        except LocationServiceError as e:
-            logger.warning(f"Reverse geocoding failed, using default name. Error: {e}")
-            location_display_name = "your current location"
-    else:
-        location_display_name = payload.location or "your selected area"
-
-
-    target_city_normalized = _normalize_city_name(location_display_name)
-    user_prefs = set(p.lower() for p in (payload.selected_preferences or []))
-    all_keywords = []
-
-    if payload.surprise_me and not user_prefs:
-        user_prefs = constants.SURPRISE_ME_PREFERENCES
-    
-    if payload.custom_trip_description:
-        analysis_result = await ai_service.analyze_description_for_keywords_and_prefs(
-            gemini_model, payload.custom_trip_description, list(constants.PROMPT_EXAMPLES_FOR_PREFERENCES.keys())
-        )
-        all_keywords.extend(analysis_result.get("keywords", []))
-        user_prefs.update(analysis_result.get("mapped_preferences", []))
-        logger.info(f"AI mapped description to preferences: {analysis_result.get('mapped_preferences', [])}")
+def _candidate_to_activity_item(
+    candidate: Dict[str, Any],
+    arrival_dt: Optional[datetime],
+    departure_dt: Optional[datetime],
+    activity_duration_hrs: float,
+    matched_prefs: List[str]
+) -> itinerary_schemas.ItineraryItem:
+    return itinerary_schemas.ItineraryItem(
+        leg_type='ACTIVITY',
+        activity=candidate['name'],
+        osm_id=candidate['osm_id'],
+        description=candidate['description'],
+        estimated_duration_hrs=round(activity_duration_hrs, 2),
+        estimated_cost_inr=candidate['estimated_cost_inr'],
+        lat=candidate['lat'],
+        lon=candidate['lon'],
+        estimated_arrival=arrival_dt,
+        estimated_departure=departure_dt,
+        matched_preferences=matched_prefs,
+        food_type=candidate.get('_food_type'),
+        specific_amenity=candidate.get('tags', {}).get('amenity') or candidate.get('tags', {}).get('shop'),
+        opening_hours=candidate.get('opening_hours')
+    )
 
-    if user_prefs:
-        keywords_from_prefs = await ai_service.get_dynamic_local_keywords_for_multiple_preferences(
-            gemini_model, target_city_normalized, list(user_prefs)
-        )
-        all_keywords.extend(keywords_from_prefs)
 
-    all_keywords = list(set(all_keywords))
-    logger.info(f"Using final keywords for search: {all_keywords}")
-    
-    query_radius_m = int(max((end_dt_utc - start_dt_utc).total_seconds() / 3600.0 / 2.0 * constants.SEARCH_RADIUS_SPEED_KMPH, constants.MIN_SEARCH_RADIUS_KM) * 1000)
-    
-    logger.info("Executing broad search for candidates...")
-    osm_elements = []
+async def _search_osm_elements(
+    http_client: httpx.AsyncClient,
+    preferences: Set[str],
+    start_coords: Tuple[float, float],
+    query_radius_m: int
+) -> List[Dict[str, Any]]:
     try:
-        selectors_map = {pk: v for pk, v in constants.PREFERENCE_TO_OSM_SELECTOR.items() if pk in user_prefs}
-        unique_selectors = list(set(s for sel_list in selectors_map.values() for s in sel_list if s))
-        if unique_selectors:
-            query_parts = [f"node[name]{sel}(around:{query_radius_m},{start_coords[0]},{start_coords[1]});way[name]{sel}(around:{query_radius_m},{start_coords[0]},{start_coords[1]});relation[name]{sel}(around:{query_radius_m},{start_coords[0]},{start_coords[1]});" for sel in unique_selectors]
-            overpass_query = f"[out:json][timeout:{constants.OVERPASS_TIMEOUT}];({ ''.join(query_parts) });out center;"
-            response = await http_client.post(constants.OVERPASS_API_URL, data=overpass_query)
-            response.raise_for_status()
-            osm_elements = response.json().get('elements', [])
-            logger.info(f"Broad search found {len(osm_elements)} elements.")
-        else:
-             logger.warning("No preferences provided for search.")
-
-    except Exception as e:
-        logger.error(f"Broad search failed: {e}", exc_info=True)
+        return await location_service.search_osm_elements(http_client, preferences, start_coords, query_radius_m)
+    except LocationServiceError:
         raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Could not fetch map data at this time.")
 
-    enrichment_semaphore = asyncio.Semaphore(20)
-    enrichment_tasks = [enrich_candidate(element, http_client, gemini_model, user_prefs, enrichment_semaphore) for element in osm_elements]
-    enriched_results = await asyncio.gather(*enrichment_tasks)
-    enriched_candidates = [result for result in enriched_results if result is not None]
-    
-    logger.info(f"De-duplicating {len(enriched_candidates)} candidates with fuzzy matching...")
-    processed_candidates = []
-    temp_enriched_candidates = enriched_candidates[:]
-    while temp_enriched_candidates:
-        base_candidate = temp_enriched_candidates.pop(0)
-        base_name = (base_candidate.get("name") or "").lower().strip()
-        
-        similar_group = [base_candidate]
-        remaining_candidates = []
 
-        for other_candidate in temp_enriched_candidates:
-            other_name = (other_candidate.get("name") or "").lower().strip()
-            if SequenceMatcher(None, base_name, other_name).ratio() > 0.85:
-                similar_group.append(other_candidate)
-            else:
-                remaining_candidates.append(other_candidate)
-        
-        best_in_group = max(similar_group, key=lambda x: len(x.get("description") or ""))
-        processed_candidates.append(best_in_group)
-        
-        temp_enriched_candidates = remaining_candidates
+async def _plan_greedy_itinerary(
+    payload: itinerary_schemas.ItineraryRequest,
+    enriched_candidates: List[Dict[str, Any]],
+    all_keywords: List[str],
+    start_coords: Tuple[float, float],
+    start_dt_utc: datetime,
+    end_dt_utc: datetime,
+    place_utc_offset_minutes: int,
+    http_client: httpx.AsyncClient,
+    on_event: Optional[EventCallback] = None
+) -> Tuple[List[itinerary_schemas.ItineraryItem], float, Dict[int, Dict[str, Any]]]:
+    """
+    Greedy route construction. Returns the items, their total cost and the unused candidates.
+    Each leg is emitted as a 'leg' event as soon as it is committed.
+    """
+    emitted_legs = 0
+
+    async def emit_new_legs() -> None:
+        nonlocal emitted_legs
+        for index in range(emitted_legs, len(itinerary_items_final)):
+            await _emit(on_event, "leg", {"index": index, "item": itinerary_items_final[index].model_dump(mode='json')})
+        emitted_legs = len(itinerary_items_final)
 
-    enriched_candidates = processed_candidates
-    logger.info(f"De-duplication complete. {len(enriched_candidates)} unique candidates remaining.")
-    
     itinerary_items_final: List[itinerary_schemas.ItineraryItem] = []
     total_cost_final = 0.0
     current_dt_pack, (current_lat_pack, current_lon_pack) = start_dt_utc, start_coords
@@ -518,58 +489,50 @@ async def build_itinerary(
     added_activity_signatures = set()
     added_meal_times = set()
 
+    route_fetcher = _RouteFetcher(http_client, payload.travel_mode)
+
     max_iters = len(remaining_candidates_dict) + 20
     for _ in range(max_iters):
         time_left_for_trip = (end_dt_utc - current_dt_pack).total_seconds() / 3600.0
         if time_left_for_trip < constants.MIN_VIABLE_ACTIVITY_HOURS or not remaining_candidates_dict: break
 
-        scored_candidates = []
-        for key, cand_data in remaining_candidates_dict.items():
-            distance_from_start = _haversine_distance(start_coords[0], start_coords[1], cand_data['lat'], cand_data['lon'])
-            matched_prefs_for_cand = _get_matched_preferences(cand_data['tags'], user_prefs)
-            score = _get_candidate_score(cand_data, all_keywords, matched_prefs_for_cand, distance_from_start, fulfilled_preferences, added_activity_signatures, current_dt_pack, added_meal_times)
-            scored_candidates.append((score, key))
-        
-        scored_candidates.sort(key=lambda x: x[0], reverse=True)
-        candidate_keys_to_route = [key for score, key in scored_candidates[:30]]
+        scored_candidates = await planning_service.run_cpu_bound(
+            planning_service.rank_candidates, list(remaining_candidates_dict.values()), all_keywords,
+            fulfilled_preferences, added_activity_signatures, current_dt_pack, added_meal_times, 30,
+            inline=len(remaining_candidates_dict) < constants.PLANNING_POOL_MIN_CANDIDATES
+        )
+        candidate_keys_to_route = [key for score, key in scored_candidates]
         
         if not candidate_keys_to_route: break
 
-        # --- BATCHED & RATE-LIMITED ROUTING CALLS ---
-        route_results = {}
-        return_journey_results = {}
-        chunk_size = 5  # Process 5 candidates at a time
-        for i in range(0, len(candidate_keys_to_route), chunk_size):
-            chunk_keys = candidate_keys_to_route[i:i+chunk_size]
-            
-            return_journey_tasks = [location_service.get_directions(http_client, (remaining_candidates_dict[key]['lat'], remaining_candidates_dict[key]['lon']), start_coords, payload.travel_mode) for key in chunk_keys]
-            routing_tasks = [location_service.get_directions(http_client, (current_lat_pack, current_lon_pack), (remaining_candidates_dict[key]['lat'], remaining_candidates_dict[key]['lon']), payload.travel_mode) for key in chunk_keys]
+        # --- RATE-LIMITED ROUTING CALLS (shared with speculative prefetches) ---
+        current_coords = (current_lat_pack, current_lon_pack)
+        candidate_coords = {key: (remaining_candidates_dict[key]['lat'], remaining_candidates_dict[key]['lon']) for key in candidate_keys_to_route}
+        route_tasks = {key: route_fetcher.request(current_coords, candidate_coords[key]) for key in candidate_keys_to_route}
+        return_journey_tasks = {key: route_fetcher.request(candidate_coords[key], start_coords) for key in candidate_keys_to_route}
 
-            all_directions_chunk = await asyncio.gather(*return_journey_tasks, *routing_tasks, return_exceptions=True)
-            
-            # Process results for the current chunk
-            return_journey_chunk = dict(zip(chunk_keys, all_directions_chunk[:len(chunk_keys)]))
-            route_chunk = dict(zip(chunk_keys, all_directions_chunk[len(chunk_keys):]))
-            
-            route_results.update(route_chunk)
-            return_journey_results.update(return_journey_chunk)
+        # While this iteration's legs are in flight, start routing from the likeliest next stops.
+        speculative_origins = set()
+        for contender_key in candidate_keys_to_route[:constants.ROUTE_PREFETCH_CONTENDERS]:
+            next_destinations = [candidate_coords[key] for key in candidate_keys_to_route if key != contender_key][:constants.ROUTE_PREFETCH_DESTINATIONS]
+            route_fetcher.prefetch(candidate_coords[contender_key], next_destinations)
+            speculative_origins.add(candidate_coords[contender_key])
 
-            # Wait before processing the next chunk to respect rate limits
-            if i + chunk_size < len(candidate_keys_to_route):
-                await asyncio.sleep(1) # 1-second delay between batches
+        route_results = dict(zip(route_tasks, await asyncio.gather(*route_tasks.values(), return_exceptions=True)))
+        return_journey_results = dict(zip(return_journey_tasks, await asyncio.gather(*return_journey_tasks.values(), return_exceptions=True)))
 
         best_candidate_key, best_score, best_details = None, -float('inf'), {}
         
         for key in candidate_keys_to_route:
             route_info = route_results.get(key); return_journey_info = return_journey_results.get(key)
-            if isinstance(route_info, Exception) or isinstance(return_journey_info, Exception): continue
+            if isinstance(route_info, BaseException) or isinstance(return_journey_info, BaseException): continue
 
             cand_data = remaining_candidates_dict[key]
             
             travel_hrs = route_info['duration_hrs']; return_journey_hrs = return_journey_info['duration_hrs']
             ideal_arrival_utc = current_dt_pack + timedelta(hours=travel_hrs)
             
-            viability = await _check_place_viability_and_timing(cand_data['name'], cand_data.get('opening_hours'), ideal_arrival_utc, cand_data['avg_visit_duration_hrs'], end_dt_utc, return_journey_hrs)
+            viability = await _check_place_viability_and_timing(cand_data['name'], cand_data.get('opening_hours'), place_utc_offset_minutes, ideal_arrival_utc, cand_data['avg_visit_duration_hrs'], end_dt_utc, return_journey_hrs)
             if not viability.is_viable: continue
             
             new_travel_cost = constants.COST_BASE_FARE_INR_DRIVING + (route_info['distance_km'] * constants.COST_PER_KM_INR_DRIVING) if payload.travel_mode == "driving" else 0.0
@@ -581,8 +544,10 @@ async def build_itinerary(
 
             if score > best_score:
                 best_score = score; best_candidate_key = key
-                best_details = {'arrival_dt': viability.adjusted_arrival_utc, 'departure_dt': viability.adjusted_departure_utc, 'travel_hrs': travel_hrs, 'distance_km': route_info['distance_km'], 'activity_duration_hrs': viability.adjusted_activity_duration_hrs, '_matched_prefs': _get_matched_preferences(cand_data['tags'], user_prefs)}
+                best_details = {'arrival_dt': viability.adjusted_arrival_utc, 'departure_dt': viability.adjusted_departure_utc, 'travel_hrs': travel_hrs, 'distance_km': route_info['distance_km'], 'activity_duration_hrs': viability.adjusted_activity_duration_hrs, '_matched_prefs': cand_data['_matched_prefs']}
 
+        chosen_coords = candidate_coords.get(best_candidate_key)
+        route_fetcher.cancel_speculative(speculative_origins - {chosen_coords})
         if not best_candidate_key: break
         
         selected_candidate = remaining_candidates_dict.pop(best_candidate_key); final_details = best_details
@@ -611,23 +576,10 @@ async def build_itinerary(
         ))
         total_cost_final += travel_cost
 
-        itinerary_items_final.append(
-            itinerary_schemas.ItineraryItem(
-                leg_type='ACTIVITY',
-                activity=selected_candidate['name'],
-                osm_id=selected_candidate['osm_id'],
-                description=selected_candidate['description'],
-                estimated_duration_hrs=round(final_details['activity_duration_hrs'], 2),
-                estimated_cost_inr=selected_candidate['estimated_cost_inr'],
-                lat=selected_candidate['lat'],
-                lon=selected_candidate['lon'],
-                estimated_arrival=final_details['arrival_dt'],
-                estimated_departure=final_details['departure_dt'],
-                matched_preferences=final_details['_matched_prefs'],
-                food_type=selected_candidate.get('_food_type'),
-                specific_amenity=selected_candidate.get('tags', {}).get('amenity') or selected_candidate.get('tags', {}).get('shop')
-            )
-        )
+        itinerary_items_final.append(_candidate_to_activity_item(
+            selected_candidate, final_details['arrival_dt'], final_details['departure_dt'],
+            final_details['activity_duration_hrs'], final_details['_matched_prefs']
+        ))
         if isinstance(selected_candidate['estimated_cost_inr'], (int, float)): total_cost_final += selected_candidate['estimated_cost_inr']
 
         current_dt_pack = final_details['departure_dt']; current_lat_pack, current_lon_pack = selected_candidate['lat'], selected_candidate['lon']
@@ -636,11 +588,12 @@ async def build_itinerary(
         activity_signature = f"{final_details['_matched_prefs'][0]}_{selected_candidate['tags'].get('amenity') or selected_candidate['tags'].get('shop') or selected_candidate['tags'].get('leisure')}" if final_details['_matched_prefs'] else None
         if activity_signature:
             added_activity_signatures.add(activity_signature)
+        await emit_new_legs()
 
     if itinerary_items_final and itinerary_items_final[-1].leg_type == "ACTIVITY":
         try:
             last_activity = itinerary_items_final[-1]
-            final_return_directions = await location_service.get_directions(http_client, (last_activity.lat, last_activity.lon), start_coords, payload.travel_mode)
+            final_return_directions = await route_fetcher.request((last_activity.lat, last_activity.lon), start_coords)
             if final_return_directions:
                 final_travel_cost = constants.COST_BASE_FARE_INR_DRIVING + (final_return_directions['distance_km'] * constants.COST_PER_KM_INR_DRIVING) if payload.travel_mode == "driving" else 0.0
                 total_cost_final += final_travel_cost
@@ -654,54 +607,208 @@ async def build_itinerary(
                 ))
         except LocationServiceError as e:
             logger.error(f"Could not calculate final return journey: {e}. Itinerary may be incomplete.")
+    route_fetcher.cancel_pending()
+    await emit_new_legs()
+    return itinerary_items_final, total_cost_final, remaining_candidates_dict
 
 
-    if itinerary_items_final:
-        logger.info(f"Fetching AI insights for {len([i for i in itinerary_items_final if i.leg_type == 'ACTIVITY'])} final activities...")
-        insight_tasks = []
-        for item in itinerary_items_final:
-            if item.leg_type == 'ACTIVITY':
-                task = ai_service.generate_ai_insight(
-                    gemini_model, item.activity, item.description, item.matched_preferences
-                )
-                insight_tasks.append(task)
-        
-        insight_results = await asyncio.gather(*insight_tasks, return_exceptions=True)
-        
-        activity_index = 0
-        for i, item in enumerate(itinerary_items_final):
-            if item.leg_type == 'ACTIVITY':
-                if activity_index < len(insight_results) and isinstance(insight_results[activity_index], str):
-                    itinerary_items_final[i].ai_insight = insight_results[activity_index]
-                activity_index += 1
-
-    final_activities = [item for item in itinerary_items_final if item.leg_type == 'ACTIVITY']
-    if len(final_activities) > 2:
-        logger.info(f"Itinerary has {len(final_activities)} activities. Running final AI validation check.")
-        rejected_activity_names = await ai_service.validate_itinerary_with_ai(
-            gemini_model, itinerary_items_final, target_city_normalized, list(user_prefs)
+async def build_itinerary(
+    payload: itinerary_schemas.ItineraryRequest,
+    db: AsyncSession,
+    current_user: models.all_models.UserAccount,
+    http_client: httpx.AsyncClient,
+    gemini_model: genai.GenerativeModel,
+    on_event: Optional[EventCallback] = None
+) -> itinerary_schemas.ItineraryResponse:
+    """
+    Builds and saves a new itinerary. When `on_event` is given, progress is reported as
+    it happens: 'stage' events, each committed 'leg', then 'insight', 'weather' and
+    'title' patches for the slower AI stages.
+    """
+    start_overall_time = time.time()
+    start_dt_utc = datetime.fromisoformat(payload.start_datetime.replace('Z', '+00:00')).astimezone(dt_timezone.utc)
+    end_dt_utc = datetime.fromisoformat(payload.end_datetime.replace('Z', '+00:00')).astimezone(dt_timezone.utc)
+    query_radius_m = int(max((end_dt_utc - start_dt_utc).total_seconds() / 3600.0 / 2.0 * constants.SEARCH_RADIUS_SPEED_KMPH, constants.MIN_SEARCH_RADIUS_KM) * 1000)
+
+    # With deferred enrichment the AI decoration runs after the trip is saved.
+    decoration_model = None if payload.defer_enrichment else gemini_model
+    # Every AI call below (and in the background enrichment) is charged to this budget.
+    await ai_bulkhead.begin_request(current_user.id)
+
+    selected_prefs = set(p.lower() for p in (payload.selected_preferences or []))
+    if payload.surprise_me and not selected_prefs:
+        selected_prefs = set(constants.SURPRISE_ME_PREFERENCES)
+
+    def preference_order(preferences: Set[str]) -> List[str]:
+        # The user's own order picks a stop's primary preference; added ones follow sorted.
+        picked = [p for p in dict.fromkeys(p.lower() for p in payload.selected_preferences or []) if p in preferences]
+        return picked + sorted(preferences - set(picked))
+
+    # The stages below form a dependency graph: each one starts as soon as its inputs
+    # are ready, so e.g. the Overpass search for the chosen preferences and the weather
+    # forecast run while the AI calls for keywords are still in flight, and the AI
+    # insights overlap the trip title.
+
+    async def resolve_start() -> Tuple[Tuple[float, float], int]:
+        start_coords = None
+        if payload.start_lat and payload.start_lon:
+            start_coords = (payload.start_lat, payload.start_lon)
+        elif payload.location:
+            try:
+                geo_result = await location_service.geocode_location_text(payload.location, http_client)
+                start_coords = (float(geo_result['lat']), float(geo_result['lon']))
+            except LocationServiceError as e:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+
+        if not start_coords:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Could not determine start coordinates.")
+        return start_coords, _resolve_place_utc_offset_minutes(payload.start_datetime, start_coords)
+
+    async def resolve_display_name() -> str:
+        if payload.start_lat and payload.start_lon and (not payload.location or payload.location.startswith("[Lat:")):
+            settlement = gazetteer_service.nearest_settlement(payload.start_lat, payload.start_lon)
+            if settlement:
+                return settlement.name
+            try:
+                rev_geo_result = await location_service.reverse_geocode_coords(payload.start_lat, payload.start_lon, http_client)
+                if rev_geo_result and rev_geo_result.get('address'):
+                    address = rev_geo_result['address']
+                    city_name = address.get('city') or address.get('town') or address.get('state_district') or address.get('state')
+                    if city_name:
+                        return city_name
+                    return rev_geo_result.get('display_name', 'your current location')
+                return "your current location"
+            except LocationServiceError as e:
+                logger.warning(f"Reverse geocoding failed, using default name. Error: {e}")
+                return "your current location"
+        return payload.location or "your selected area"
+
+    async def analyze_description() -> Dict[str, List[str]]:
+        if not payload.custom_trip_description:
+            return {"keywords": [], "mapped_preferences": []}
+        analysis_result = await ai_service.analyze_description_for_keywords_and_prefs(
+            gemini_model, payload.custom_trip_description, list(constants.PROMPT_EXAMPLES_FOR_PREFERENCES.keys())
+        )
+        logger.info(f"AI mapped description to preferences: {analysis_result.get('mapped_preferences', [])}")
+        return analysis_result
+
+    async def resolve_preferences(analysis: Dict[str, List[str]]) -> Set[str]:
+        return selected_prefs | set(analysis.get("mapped_preferences", []))
+
+    async def resolve_city(start: Tuple[Tuple[float, float], int], display_name: str) -> str:
+        # Keyed by the settlement the start point is in, so "Hazratganj, Lucknow" and a
+        # GPS fix in Lucknow share the AI keyword and suitability caches.
+        return _city_key(start[0], display_name)
+
+    async def fetch_keywords(city: str, analysis: Dict[str, List[str]], preferences: Set[str]) -> List[str]:
+        all_keywords = list(analysis.get("keywords", []))
+        if preferences:
+            all_keywords.extend(await keyword_service.get_local_keywords(gemini_model, city, sorted(preferences)))
+        all_keywords = list(set(all_keywords))
+        logger.info(f"Using final keywords for search: {all_keywords}")
+        return all_keywords
+
+    async def search_selected(start: Tuple[Tuple[float, float], int]) -> List[Dict[str, Any]]:
+        return await _search_osm_elements(http_client, selected_prefs, start[0], query_radius_m)
+
+    async def search_extra(start: Tuple[Tuple[float, float], int], preferences: Set[str]) -> List[Dict[str, Any]]:
+        # Only preferences the description analysis added that the first search did not cover.
+        covered = {sel for pk in selected_prefs for sel in constants.PREFERENCE_TO_OSM_SELECTOR.get(pk, [])}
+        extra_prefs = {pk for pk in preferences - selected_prefs if set(constants.PREFERENCE_TO_OSM_SELECTOR.get(pk, [])) - covered}
+        return await _search_osm_elements(http_client, extra_prefs, start[0], query_radius_m)
+
+    async def enrich_candidates(
+        start: Tuple[Tuple[float, float], int], preferences: Set[str],
+        search_selected: List[Dict[str, Any]], search_extra: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        osm_elements = list({(el.get('type'), el.get('id')): el for el in search_selected + search_extra}.values())
+        if not preferences:
+            logger.warning("No preferences provided for search.")
+
+        enrichment_semaphore = asyncio.Semaphore(20)
+        enrichment_tasks = [enrich_candidate(element, http_client, gemini_model, preferences, enrichment_semaphore) for element in osm_elements]
+        enriched_results = await asyncio.gather(*enrichment_tasks)
+        enriched_candidates = [result for result in enriched_results if result is not None]
+
+        # Fuzzy de-duplication and scoring are pure CPU work; they run in the planning process pool
+        # so a large city does not stall every other request on this worker.
+        logger.info(f"De-duplicating {len(enriched_candidates)} candidates with fuzzy matching...")
+        enriched_candidates = await planning_service.run_cpu_bound(planning_service.prepare_candidates, enriched_candidates, preference_order(preferences), start[0])
+        logger.info(f"De-duplication complete. {len(enriched_candidates)} unique candidates remaining.")
+        return enriched_candidates
+
+    async def screen_candidates(enrich_candidates: List[Dict[str, Any]], city: str) -> List[Dict[str, Any]]:
+        # Places judged unsuitable are dropped before planning so they never take a slot.
+        return await suitability_service.filter_suitable_candidates(db, gemini_model, enrich_candidates, city)
+
+    async def plan(start: Tuple[Tuple[float, float], int], screen_candidates: List[Dict[str, Any]], fetch_keywords: List[str]):
+        return await _plan_greedy_itinerary(
+            payload, screen_candidates, fetch_keywords, start[0], start_dt_utc, end_dt_utc, start[1], http_client, on_event
         )
-        if rejected_activity_names:
-            rejected_set = set(rejected_activity_names)
-            indices_to_remove = set()
-            for i, item in enumerate(itinerary_items_final):
-                if item.leg_type == 'ACTIVITY' and item.activity in rejected_set:
-                    indices_to_remove.add(i)
-                    if i > 0 and itinerary_items_final[i-1].leg_type == 'TRAVEL':
-                        indices_to_remove.add(i-1)
-            
-            if indices_to_remove:
-                itinerary_items_final = [
-                    item for i, item in enumerate(itinerary_items_final)
-                    if i not in indices_to_remove
-                ]
-                logger.info(f"Removed {len(rejected_activity_names)} activities and their travel legs after AI validation.")
-    else:
-        logger.info(f"Itinerary has {len(final_activities)} or fewer activities. Skipping final AI validation to ensure results are returned.")
-
-    weather_task = weather_service.get_weather_forecast(start_coords[0], start_coords[1], start_dt_utc, http_client, gemini_model)
-    title_task = ai_service.generate_creative_trip_title(gemini_model, target_city_normalized, list(user_prefs), itinerary_items_final)
-    weather_info, final_custom_heading = await asyncio.gather(weather_task, title_task)
+
+    async def fetch_weather(start: Tuple[Tuple[float, float], int]):
+        # One cached hourly series covers the whole trip; the legs are looked up in it after planning.
+        (lat, lon), utc_offset_minutes = start
+        try:
+            series = await weather_service.get_hourly_series(lat, lon, start_dt_utc, end_dt_utc, http_client)
+        except Exception as e:
+            logger.error(f"Weather forecast unavailable: {e}")
+            series = None
+        weather_info = weather_service.forecasts_at(series, [start_dt_utc], utc_offset_minutes)[0]
+        # When enrichment is deferred the sentence is left empty for the background job to write.
+        if weather_info and decoration_model:
+            weather_info.ai_weather_sentence = await weather_service.weather_sentence(decoration_model, weather_info)
+        await _emit(on_event, "weather", {"weather_info": weather_info.model_dump(mode='json') if weather_info else None})
+        return weather_info, series
+
+    async def add_leg_weather(start: Tuple[Tuple[float, float], int], plan, weather) -> None:
+        activities = [item for item in plan[0] if item.leg_type == 'ACTIVITY']
+        forecasts = weather_service.forecasts_at(weather[1], [item.estimated_arrival for item in activities], start[1])
+        for item, forecast in zip(activities, forecasts):
+            item.weather_forecast = forecast
+
+    async def add_insights(plan) -> None:
+        activity_indexes = [index for index, item in enumerate(plan[0]) if item.leg_type == 'ACTIVITY']
+        if not activity_indexes or payload.defer_enrichment:
+            return
+        logger.info(f"Fetching AI insights for {len(activity_indexes)} final activities...")
+        insight_results = await insight_service.get_insights(db, gemini_model, [plan[0][index] for index in activity_indexes])
+        for index, insight in zip(activity_indexes, insight_results):
+            if insight:
+                plan[0][index].ai_insight = insight
+                await _emit(on_event, "insight", {"index": index, "ai_insight": insight})
+
+    async def create_title(plan, display_name: str, preferences: Set[str]) -> str:
+        title = await ai_service.generate_creative_trip_title(decoration_model, _normalize_city_name(display_name), list(preferences), plan[0])
+        await _emit(on_event, "title", {"custom_heading": title})
+        return title
+
+    async def report_stage(stage: str, stage_status: str, elapsed_seconds: float) -> None:
+        await _emit(on_event, "stage", {"stage": stage, "status": stage_status, "elapsed_seconds": round(elapsed_seconds, 3)})
+
+    pipeline = Pipeline("build_itinerary", on_stage=report_stage if on_event else None)
+    pipeline.stage("start", resolve_start)
+    pipeline.stage("display_name", resolve_display_name)
+    pipeline.stage("analysis", analyze_description)
+    pipeline.stage("preferences", resolve_preferences, ["analysis"])
+    pipeline.stage("city", resolve_city, ["start", "display_name"])
+    pipeline.stage("fetch_keywords", fetch_keywords, ["city", "analysis", "preferences"])
+    pipeline.stage("search_selected", search_selected, ["start"])
+    pipeline.stage("search_extra", search_extra, ["start", "preferences"])
+    pipeline.stage("enrich_candidates", enrich_candidates, ["start", "preferences", "search_selected", "search_extra"])
+    pipeline.stage("screen_candidates", screen_candidates, ["enrich_candidates", "city"])
+    pipeline.stage("plan", plan, ["start", "screen_candidates", "fetch_keywords"])
+    pipeline.stage("weather", fetch_weather, ["start"])
+    pipeline.stage("leg_weather", add_leg_weather, ["start", "plan", "weather"])
+    pipeline.stage("insights", add_insights, ["plan"])
+    pipeline.stage("title", create_title, ["plan", "display_name", "preferences"])
+    results = await pipeline.run()
+
+    start_coords = results["start"][0]
+    location_display_name = results["display_name"]
+    all_keywords = results["fetch_keywords"]
+    itinerary_items_final, total_cost_final, remaining_candidates_dict = results["plan"]
+    weather_info, final_custom_heading = results["weather"][0], results["title"]
 
     trip_uuid_val = str(uuid.uuid4())
     itinerary_response = itinerary_schemas.ItineraryResponse(
@@ -712,15 +819,102 @@ async def build_itinerary(
         total_estimated_cost=round(total_cost_final, 2), 
         custom_heading=final_custom_heading, 
         notes="Itinerary generated successfully!", 
-        weather_info=weather_info
+        weather_info=weather_info,
+        enrichment_status="pending" if payload.defer_enrichment else None
     )
     
     new_trip = models.all_models.UserTrip(trip_uuid=trip_uuid_val, user_id=current_user.id, original_request_details=payload.model_dump(mode='json'), generated_itinerary_response=itinerary_response.model_dump(mode='json'), trip_title=final_custom_heading, location_display_name=location_display_name, trip_start_datetime_utc=start_dt_utc, trip_end_datetime_utc=end_dt_utc, status="generated")
     db.add(new_trip); await db.commit()
+
+    _spawn_background(_store_replan_candidates(trip_uuid_val, list(remaining_candidates_dict.values()), all_keywords, end_dt_utc))
+    if payload.defer_enrichment:
+        _start_enrichment_job(trip_uuid_val, gemini_model)
     
     logger.info(f"--- Itinerary build time: {time.time() - start_overall_time:.2f} seconds ---")
     return itinerary_response
 
+
+# --- Deferred Enrichment ---
+
+# trip_uuid -> running enrichment job in this worker
+_enrichment_jobs: Dict[str, asyncio.Task] = {}
+
+
+def _start_enrichment_job(trip_uuid: str, gemini_model: genai.GenerativeModel) -> None:
+    if trip_uuid in _enrichment_jobs:
+        return
+    task = _spawn_background(_enrich_trip_itinerary(trip_uuid, gemini_model))
+    _enrichment_jobs[trip_uuid] = task
+    task.add_done_callback(lambda _: _enrichment_jobs.pop(trip_uuid, None))
+
+
+async def _generate_weather_sentence(gemini_model: genai.GenerativeModel, weather_info: Optional[itinerary_schemas.WeatherForecast]) -> Optional[str]:
+    if weather_info is None or weather_info.ai_weather_sentence:
+        return None
+    return await weather_service.weather_sentence(gemini_model, weather_info)
+
+
+async def _enrich_trip_itinerary(trip_uuid: str, gemini_model: genai.GenerativeModel) -> None:
+    """
+    Adds AI insights, the creative title and the weather sentence to a trip saved with
+    deferred enrichment, then marks it 'complete' (or 'failed'). Patches are applied to
+    the trip as stored when the AI calls return, so edits made meanwhile are kept.
+    """
+    async with AsyncSessionLocal() as db:
+        stmt = select(models.all_models.UserTrip).where(models.all_models.UserTrip.trip_uuid == trip_uuid)
+        trip = (await db.execute(stmt)).scalars().first()
+        if not trip:
+            logger.warning(f"Enrichment skipped: trip {trip_uuid} no longer exists.")
+            return
+        try:
+            response = itinerary_schemas.ItineraryResponse(**trip.generated_itinerary_response)
+            activities = [item for item in response.itinerary if item.leg_type == 'ACTIVITY']
+            preferences = sorted({pref for item in activities for pref in item.matched_preferences or []})
+            city = _normalize_city_name(trip.location_display_name or "")
+            insights, title, weather_sentence = await asyncio.gather(
+                insight_service.get_insights(db, gemini_model, activities),
+                ai_service.generate_creative_trip_title(gemini_model, city, preferences, response.itinerary),
+                _generate_weather_sentence(gemini_model, response.weather_info)
+            )
+            insight_by_osm_id = {item.osm_id: insight for item, insight in zip(activities, insights) if insight and item.osm_id is not None}
+
+            await db.refresh(trip)
+            response = itinerary_schemas.ItineraryResponse(**trip.generated_itinerary_response)
+            for item in response.itinerary:
+                if item.leg_type == 'ACTIVITY' and not item.ai_insight and item.osm_id in insight_by_osm_id:
+                    item.ai_insight = insight_by_osm_id[item.osm_id]
+            response.custom_heading = title
+            if weather_sentence and response.weather_info:
+                response.weather_info.ai_weather_sentence = weather_sentence
+            response.enrichment_status = "complete"
+            trip.trip_title = title
+            logger.info(f"Enriched trip {trip_uuid} with {len(insight_by_osm_id)} insights.")
+        except Exception as e:
+            logger.error(f"Enrichment failed for trip {trip_uuid}: {e}", exc_info=True)
+            await db.rollback()
+            await db.refresh(trip)
+            response = itinerary_schemas.ItineraryResponse(**trip.generated_itinerary_response)
+            response.enrichment_status = "failed"
+        trip.generated_itinerary_response = response.model_dump(mode='json')
+        db.add(trip)
+        await db.commit()
+
+
+def get_trip_itinerary(trip: models.all_models.UserTrip, gemini_model: genai.GenerativeModel) -> itinerary_schemas.ItineraryResponse:
+    """
+    The trip's current itinerary. A trip whose enrichment has been pending for too long
+    (e.g. the worker restarted mid-job) gets its enrichment job started again.
+    """
+    response = itinerary_schemas.ItineraryResponse(**trip.generated_itinerary_response)
+    if response.enrichment_status == "pending":
+        updated_at = trip.updated_at
+        if updated_at.tzinfo is None:
+            updated_at = updated_at.replace(tzinfo=dt_timezone.utc)
+        if (datetime.now(dt_timezone.utc) - updated_at).total_seconds() > constants.ENRICHMENT_STALE_AFTER_SECONDS:
+            logger.info(f"Restarting stale enrichment for trip {trip.trip_uuid}.")
+            _start_enrichment_job(trip.trip_uuid, gemini_model)
+    return response
+
 async def get_serendipity_suggestion(
     payload: itinerary_schemas.SerendipityRequest,
     current_user: models.all_models.UserAccount,
@@ -729,6 +923,7 @@ async def get_serendipity_suggestion(
 ) -> Optional[itinerary_schemas.SerendipityResponse]:
     try:
         logger.info("--- Starting Intelligent Serendipity Suggestion ---")
+        await ai_bulkhead.begin_request(current_user.id)
         original_req = payload.original_request_details
         if not (original_req.start_lat and original_req.start_lon):
             return None
@@ -743,9 +938,7 @@ async def get_serendipity_suggestion(
         query_parts = [f"node[name]{sel}(around:{radius_m},{start_coords[0]},{start_coords[1]});way[name]{sel}(around:{radius_m},{start_coords[0]},{start_coords[1]});" for sel in selectors]
         overpass_query = f"[out:json][timeout:{constants.OVERPASS_TIMEOUT}];({ ''.join(query_parts) });out center {constants.MAX_SERENDIPITY_CANDIDATES_FROM_OVERPASS * 2};"
         
-        response = await http_client.post(constants.OVERPASS_API_URL, data=overpass_query)
-        response.raise_for_status()
-        elements = response.json().get('elements', [])
+        elements = (await location_service.run_overpass_query(overpass_query, http_client)).get('elements', [])
 
         existing_osm_ids = {str(item.osm_id) for item in payload.current_itinerary if item.osm_id}
         excluded_osm_ids = set(payload.excluded_serendipity_ids or [])
@@ -769,7 +962,7 @@ async def get_serendipity_suggestion(
             logger.warning("Serendipity: No candidates survived the enrichment process.")
             return None
 
-        best_candidate = max(enriched_candidates, key=lambda c: _get_candidate_score(c, [], list(user_prefs), 0, set(), set(), datetime.now(dt_timezone.utc), set()))
+        best_candidate = max(enriched_candidates, key=lambda c: planning_service.get_candidate_score(c, [], list(user_prefs), 0, set(), set(), datetime.now(dt_timezone.utc), set()))
 
         logger.info(f"Serendipity selected best candidate: '{best_candidate['name']}' (OSM ID: {best_candidate['osm_id']})")
         
@@ -812,7 +1005,7 @@ async def get_serendipity_suggestion(
 
         actionable_text = await ai_service.generate_serendipity_suggestion_text(
             gemini_model=gemini_model, place_to_suggest=suggested_item.model_dump(),
-            user_preferences=list(user_prefs), target_city=_normalize_city_name(original_req.location or "")
+            user_preferences=list(user_prefs), target_city=_city_key(start_coords, original_req.location or "")
         )
         
         logger.info("--- Intelligent Serendipity Suggestion Successfully Generated ---")
@@ -828,6 +1021,84 @@ async def get_serendipity_suggestion(
         logger.error(f"Unexpected error in get_serendipity_suggestion: {e}", exc_info=True)
         return None
 
+def _calculate_travel_cost(distance_km: float, travel_mode: str) -> float:
+    return constants.COST_BASE_FARE_INR_DRIVING + (distance_km * constants.COST_PER_KM_INR_DRIVING) if travel_mode == "driving" else 0.0
+
+def _build_travel_leg(title: str, directions: Dict[str, Any], departure_time: datetime, travel_mode: str) -> itinerary_schemas.ItineraryItem:
+    return itinerary_schemas.ItineraryItem(
+        leg_type='TRAVEL', activity=title,
+        estimated_duration_hrs=directions['duration_hrs'], estimated_cost_inr=_calculate_travel_cost(directions['distance_km'], travel_mode),
+        distance_km=directions['distance_km'], estimated_arrival=departure_time + timedelta(hours=directions['duration_hrs']),
+        estimated_departure=departure_time, overview_polyline=directions.get('overview_polyline')
+    )
+
+def _index_stored_travel_legs(items: List[itinerary_schemas.ItineraryItem]) -> Dict[int, itinerary_schemas.ItineraryItem]:
+    """
+    Maps segment index -> stored TRAVEL leg. Segment i ends at the i-th located activity;
+    the segment after the last activity is the journey back to the start.
+    """
+    legs: Dict[int, itinerary_schemas.ItineraryItem] = {}
+    pending_travel, activity_index = None, 0
+    for item in items:
+        if item.leg_type == 'TRAVEL':
+            pending_travel = item
+        elif item.leg_type == 'ACTIVITY' and item.lat is not None and item.lon is not None:
+            if pending_travel is not None:
+                legs[activity_index] = pending_travel
+            pending_travel, activity_index = None, activity_index + 1
+    if pending_travel is not None:
+        legs[activity_index] = pending_travel
+    return legs
+
+def _locate_segment_items(
+    items: List[itinerary_schemas.ItineraryItem],
+    activity_nodes: List[itinerary_schemas.ItineraryItem],
+    segment_index: int
+) -> Tuple[int, int]:
+    """Returns the [start, end) slice of `items` holding the BREAK/TRAVEL legs of a segment."""
+    start = 0
+    if segment_index > 0:
+        previous_activity = activity_nodes[segment_index - 1]
+        start = next(i for i, item in enumerate(items) if item is previous_activity) + 1
+    end = start
+    while end < len(items) and items[end].leg_type in ('TRAVEL', 'BREAK'):
+        end += 1
+    return start, end
+
+def _shift_itinerary_items(items: List[itinerary_schemas.ItineraryItem], shift: timedelta) -> List[itinerary_schemas.ItineraryItem]:
+    if not shift:
+        return list(items)
+    return [
+        item.model_copy(update={
+            'estimated_arrival': item.estimated_arrival + shift if item.estimated_arrival else None,
+            'estimated_departure': item.estimated_departure + shift if item.estimated_departure else None,
+        })
+        for item in items
+    ]
+
+async def _persist_trip_itinerary(
+    db: AsyncSession,
+    current_user: models.all_models.UserAccount,
+    trip_uuid: Optional[str],
+    itinerary_response: itinerary_schemas.ItineraryResponse
+) -> bool:
+    """Saves an edited itinerary over the stored trip in a single write. Returns False if there is no trip to update."""
+    if not trip_uuid:
+        logger.warning("Could not find a trip UUID to update after insertion.")
+        return False
+    stmt = select(models.all_models.UserTrip).where(models.all_models.UserTrip.trip_uuid == trip_uuid, models.all_models.UserTrip.user_id == current_user.id)
+    result = await db.execute(stmt)
+    trip_to_update = result.scalars().first()
+    if not trip_to_update:
+        return False
+    logger.info(f"Updating trip {trip_uuid} in DB with new itinerary.")
+    itinerary_response.trip_uuid = trip_uuid
+    trip_to_update.generated_itinerary_response = itinerary_response.model_dump(mode='json')
+    trip_to_update.updated_at = datetime.now(dt_timezone.utc)
+    db.add(trip_to_update)
+    await db.commit()
+    return True
+
 async def insert_activity_into_itinerary(
     payload: itinerary_schemas.ItineraryInsertionRequest,
     db: AsyncSession,
@@ -839,18 +1110,20 @@ async def insert_activity_into_itinerary(
     try:
         original_req = payload.original_request
         
-        activity_nodes = [item for item in payload.current_itinerary if item.leg_type == 'ACTIVITY']
+        activity_nodes = [item for item in payload.current_itinerary if item.leg_type == 'ACTIVITY' and item.lat is not None and item.lon is not None]
         start_coords = (original_req.start_lat, original_req.start_lon)
         new_activity_coords = (payload.new_activity.lat, payload.new_activity.lon)
         travel_mode = original_req.travel_mode
 
-        path_coords = [start_coords] + [(act.lat, act.lon) for act in activity_nodes if act.lat and act.lon] + [start_coords]
-        
+        path_coords = [start_coords] + [(act.lat, act.lon) for act in activity_nodes] + [start_coords]
+        stored_legs = _index_stored_travel_legs(payload.current_itinerary)
+
+        # Legs that already exist in the stored itinerary are not routed again; only the detour legs are.
         detour_tasks = []
         for i in range(len(path_coords) - 1):
             from_coords, to_coords = path_coords[i], path_coords[i+1]
-            
-            original_leg_task = location_service.get_directions(http_client, from_coords, to_coords, travel_mode)
+            stored_leg = stored_legs.get(i)
+            original_leg_task = asyncio.sleep(0, result={'duration_hrs': stored_leg.estimated_duration_hrs}) if stored_leg else location_service.get_directions(http_client, from_coords, to_coords, travel_mode)
             leg1_task = location_service.get_directions(http_client, from_coords, new_activity_coords, travel_mode)
             leg2_task = location_service.get_directions(http_client, new_activity_coords, to_coords, travel_mode)
             detour_tasks.extend([original_leg_task, leg1_task, leg2_task])
@@ -873,54 +1146,56 @@ async def insert_activity_into_itinerary(
             raise HTTPException(status_code=400, detail="Could not find a valid insertion point for the new activity.")
 
         logger.info(f"Best insertion point found at index {best_insert_index} with {min_extra_travel_hours:.2f} extra travel hours.")
-        new_activity_sequence = activity_nodes[:]
-        new_activity_sequence.insert(best_insert_index, payload.new_activity)
-
-        new_itinerary_items = []
-        total_cost = 0.0
-        current_time = datetime.fromisoformat(original_req.start_datetime.replace('Z', '+00:00'))
-        current_coords = start_coords
-
-        for activity in new_activity_sequence:
-            travel_directions = await location_service.get_directions(http_client, current_coords, (activity.lat, activity.lon), travel_mode)
-            travel_leg_cost = constants.COST_BASE_FARE_INR_DRIVING + (travel_directions['distance_km'] * constants.COST_PER_KM_INR_DRIVING) if travel_mode == "driving" else 0.0
-            travel_arrival_time = current_time + timedelta(hours=travel_directions['duration_hrs'])
-            new_itinerary_items.append(itinerary_schemas.ItineraryItem(
-                leg_type='TRAVEL', activity=f"Travel to {activity.activity}",
-                estimated_duration_hrs=travel_directions['duration_hrs'], estimated_cost_inr=travel_leg_cost,
-                distance_km=travel_directions['distance_km'], estimated_arrival=travel_arrival_time,
-                estimated_departure=current_time, overview_polyline=travel_directions.get('overview_polyline')
-            ))
-            total_cost += travel_leg_cost
-            current_time = travel_arrival_time
-
-            activity_duration_hrs = activity.estimated_duration_hrs or constants.DEFAULT_ACTIVITY_TIME_HOURS
-            activity_departure_time = current_time + timedelta(hours=activity_duration_hrs)
-            activity.estimated_arrival = current_time
-            activity.estimated_departure = activity_departure_time
-            new_itinerary_items.append(activity)
-            
-            if activity.estimated_cost_inr is not None: total_cost += activity.estimated_cost_inr
-            current_time = activity_departure_time
-            current_coords = (activity.lat, activity.lon)
+        leg_to_new = all_directions[best_insert_index*3+1]
+        leg_from_new = all_directions[best_insert_index*3+2]
+
+        # --- Incremental re-timing: keep everything upstream, splice in two legs, shift the rest ---
+        segment_start_idx, segment_end_idx = _locate_segment_items(payload.current_itinerary, activity_nodes, best_insert_index)
+        upstream_items = payload.current_itinerary[:segment_start_idx]
+        downstream_items = payload.current_itinerary[segment_end_idx:]
+
+        if best_insert_index > 0:
+            departure_time = activity_nodes[best_insert_index - 1].estimated_departure
+        else:
+            departure_time = datetime.fromisoformat(original_req.start_datetime.replace('Z', '+00:00'))
+        is_return_segment = best_insert_index == len(activity_nodes)
+
+        new_itinerary_items = list(upstream_items)
+        arrival_at_new = departure_time + timedelta(hours=leg_to_new['duration_hrs'])
+        new_itinerary_items.append(_build_travel_leg(f"Travel to {payload.new_activity.activity}", leg_to_new, departure_time, travel_mode))
+
+        activity_duration_hrs = payload.new_activity.estimated_duration_hrs or constants.DEFAULT_ACTIVITY_TIME_HOURS
+        departure_from_new = arrival_at_new + timedelta(hours=activity_duration_hrs)
+        new_itinerary_items.append(payload.new_activity.model_copy(update={'estimated_arrival': arrival_at_new, 'estimated_departure': departure_from_new}))
+
+        next_activity_name = "start location" if is_return_segment else activity_nodes[best_insert_index].activity
+        next_leg_title = "Travel back to start location" if is_return_segment else f"Travel to {next_activity_name}"
+        new_itinerary_items.append(_build_travel_leg(next_leg_title, leg_from_new, departure_from_new, travel_mode))
+        new_arrival_at_next = departure_from_new + timedelta(hours=leg_from_new['duration_hrs'])
+
+        stored_segment_leg = stored_legs.get(best_insert_index)
+        old_arrival_at_next = stored_segment_leg.estimated_arrival if stored_segment_leg else None
+        if old_arrival_at_next is None and not is_return_segment:
+            old_arrival_at_next = activity_nodes[best_insert_index].estimated_arrival
+        shift = (new_arrival_at_next - old_arrival_at_next) if old_arrival_at_next else timedelta(0)
+        if shift < timedelta(0):
+            # Arriving early must not pull later stops before their planned (possibly opening-hour bound) times.
+            if -shift > timedelta(hours=0.25):
+                new_itinerary_items.append(itinerary_schemas.ItineraryItem(
+                    leg_type='BREAK', activity="Free Time / Break",
+                    estimated_duration_hrs=round(-shift.total_seconds() / 3600, 2),
+                    estimated_arrival=new_arrival_at_next, estimated_departure=old_arrival_at_next
+                ))
+            shift = timedelta(0)
+        new_itinerary_items.extend(_shift_itinerary_items(downstream_items, shift))
+
+        total_cost = sum(item.estimated_cost_inr for item in new_itinerary_items if isinstance(item.estimated_cost_inr, (int, float)))
 
         original_end_time = datetime.fromisoformat(original_req.end_datetime.replace('Z', '+00:00'))
-        allowed_end_time = original_end_time + timedelta(hours=1)
-        
-        final_return_directions = await location_service.get_directions(http_client, current_coords, start_coords, travel_mode)
-        final_arrival_time = current_time + timedelta(hours=final_return_directions['duration_hrs'])
+        allowed_end_time = original_end_time + timedelta(hours=constants.TRIP_END_GRACE_HOURS)
+        final_arrival_time = max((item.estimated_arrival for item in new_itinerary_items if item.estimated_arrival), default=new_arrival_at_next)
         if final_arrival_time > allowed_end_time:
             raise HTTPException(status_code=400, detail="Adding this activity exceeds the trip time window by more than 1 hour.")
-            
-        final_travel_cost = constants.COST_BASE_FARE_INR_DRIVING + (final_return_directions['distance_km'] * constants.COST_PER_KM_INR_DRIVING) if travel_mode == "driving" else 0.0
-        new_itinerary_items.append(itinerary_schemas.ItineraryItem(
-            leg_type='TRAVEL', activity="Travel back to start location",
-            estimated_duration_hrs=final_return_directions['duration_hrs'],
-            estimated_cost_inr=final_travel_cost, distance_km=final_return_directions['distance_km'],
-            estimated_arrival=final_arrival_time, estimated_departure=current_time,
-            overview_polyline=final_return_directions.get('overview_polyline')
-        ))
-        total_cost += final_travel_cost
 
         final_response = itinerary_schemas.ItineraryResponse(
             itinerary=new_itinerary_items,
@@ -932,25 +1207,566 @@ async def insert_activity_into_itinerary(
             notes="Your itinerary has been updated with the new activity."
         )
         
-        trip_uuid_to_update = payload.current_itinerary[0].trip_uuid if payload.current_itinerary and hasattr(payload.current_itinerary[0], 'trip_uuid') else None
-        if trip_uuid_to_update:
-            stmt = select(models.all_models.UserTrip).where(models.all_models.UserTrip.trip_uuid == trip_uuid_to_update, models.all_models.UserTrip.user_id == current_user.id)
-            result = await db.execute(stmt)
-            trip_to_update = result.scalars().first()
-            if trip_to_update:
-                logger.info(f"Updating trip {trip_uuid_to_update} in DB with new itinerary.")
-                final_response.trip_uuid = trip_uuid_to_update
-                trip_to_update.generated_itinerary_response = final_response.model_dump(mode='json')
-                trip_to_update.updated_at = datetime.now(dt_timezone.utc)
-                db.add(trip_to_update)
-                await db.commit()
-        else:
-            logger.warning("Could not find a trip UUID to update after insertion.")
-
+        await _persist_trip_itinerary(db, current_user, payload.trip_uuid, final_response)
         return final_response
+    except HTTPException:
+        raise
     except LocationServiceError as e:
         logger.error(f"Failed to insert activity due to a critical routing error: {e}", exc_info=True)
         raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=f"Could not calculate route to new activity: routing service unavailable.")
     except Exception as e:
         logger.error(f"Unexpected error in insert_activity_into_itinerary: {e}", exc_info=True)
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="An unexpected error occurred while updating your itinerary.")
\ No newline at end of file
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="An unexpected error occurred while updating your itinerary.")
+
+# --- Matrix-based Itinerary Editing ---
+
+async def _resolve_request_start_coords(original_req: itinerary_schemas.ItineraryRequest, http_client: httpx.AsyncClient) -> Tuple[float, float]:
+    if original_req.start_lat is not None and original_req.start_lon is not None:
+        return (original_req.start_lat, original_req.start_lon)
+    try:
+        geo_result = await location_service.geocode_location_text(original_req.location, http_client)
+        return (float(geo_result['lat']), float(geo_result['lon']))
+    except LocationServiceError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+
+def _opening_windows_hrs(opening_hours: Optional[str], trip_start_utc: datetime, horizon_hrs: float, utc_offset_minutes: int) -> route_optimizer.TimeWindows:
+    """Open intervals of a place as hours since the trip start, or None when the hours are unknown/unrestricted."""
+    schedule = opening_hours_service.compile_opening_hours(opening_hours)
+    if schedule is None or schedule.is_always_open:
+        return None
+    intervals = schedule.open_intervals(trip_start_utc, trip_start_utc + timedelta(hours=horizon_hrs), utc_offset_minutes)
+    return [((opened - trip_start_utc).total_seconds() / 3600.0, (closed - trip_start_utc).total_seconds() / 3600.0) for opened, closed in intervals]
+
+def _located_activities(items: List[itinerary_schemas.ItineraryItem]) -> List[itinerary_schemas.ItineraryItem]:
+    return [item for item in items if item.leg_type == 'ACTIVITY' and item.lat is not None and item.lon is not None]
+
+def _stored_pair_legs(items: List[itinerary_schemas.ItineraryItem], activity_nodes: List[itinerary_schemas.ItineraryItem]) -> Dict[Tuple[int, int], itinerary_schemas.ItineraryItem]:
+    """Maps (from node, to node) -> stored TRAVEL leg, where node 0 is the start and node i the i-th activity."""
+    return {
+        (segment, segment + 1 if segment < len(activity_nodes) else 0): leg
+        for segment, leg in _index_stored_travel_legs(items).items()
+    }
+
+def _prepare_stop_matrix(
+    matrix: Dict[str, List[List[Optional[float]]]],
+    stored_pair_legs: Dict[Tuple[int, int], itinerary_schemas.ItineraryItem],
+    travel_mode: str
+) -> Tuple[List[List[float]], List[List[float]], List[List[float]]]:
+    """Returns duration, distance and cost matrices. Stored legs win over the matrix so unchanged legs keep their times."""
+    durations = [[value if value is not None else math.inf for value in row] for row in matrix['durations_hrs']]
+    distances = [[value if value is not None else math.inf for value in row] for row in matrix['distances_km']]
+    leg_costs = [[_calculate_travel_cost(distance, travel_mode) for distance in row] for row in distances]
+    for (a, b), leg in stored_pair_legs.items():
+        durations[a][b] = leg.estimated_duration_hrs
+        if leg.distance_km is not None:
+            distances[a][b] = leg.distance_km
+        if isinstance(leg.estimated_cost_inr, (int, float)):
+            leg_costs[a][b] = leg.estimated_cost_inr
+    return durations, distances, leg_costs
+
+async def _build_route_items(
+    route: List[int],
+    visits: List[route_optimizer.Visit],
+    stops: List[Optional[itinerary_schemas.ItineraryItem]],
+    coords: List[Tuple[float, float]],
+    durations: List[List[float]],
+    distances: List[List[float]],
+    stored_pair_legs: Dict[Tuple[int, int], itinerary_schemas.ItineraryItem],
+    route_start_utc: datetime,
+    http_client: httpx.AsyncClient,
+    travel_mode: str,
+    geometry_timeout: Optional[float] = None
+) -> List[itinerary_schemas.ItineraryItem]:
+    """
+    Turns a timed route back into itinerary items, reusing stored legs and routing only
+    the new ones for map geometry. `stops[node]` is None for the start and end points.
+    """
+    new_pairs = [(a, b) for a, b in zip(route, route[1:]) if (a, b) not in stored_pair_legs]
+    # Timing already comes from the matrix, so geometry is best-effort (and optionally time-boxed).
+    geometry_tasks = {pair: asyncio.create_task(location_service.get_directions(http_client, coords[pair[0]], coords[pair[1]], travel_mode)) for pair in new_pairs}
+    if geometry_tasks:
+        _, still_pending = await asyncio.wait(geometry_tasks.values(), timeout=geometry_timeout)
+        for task in still_pending:
+            task.cancel()
+    geometry_by_pair: Dict[Tuple[int, int], Any] = {}
+    for pair, task in geometry_tasks.items():
+        if task.done() and not task.cancelled():
+            geometry_by_pair[pair] = task.exception() or task.result()
+
+    def at(hours: float) -> datetime:
+        return route_start_utc + timedelta(hours=hours)
+
+    items: List[itinerary_schemas.ItineraryItem] = []
+    for position in range(1, len(route)):
+        a, b = route[position - 1], route[position]
+        previous_departure_hr = visits[position - 1][2]
+        _, service_start_hr, departure_hr = visits[position]
+        travel_hrs = durations[a][b]
+
+        travel_start_hr = previous_departure_hr
+        is_stop = stops[b] is not None
+        wait_hrs = (service_start_hr - travel_hrs) - previous_departure_hr if is_stop else 0.0
+        if wait_hrs > 0.25:
+            travel_start_hr = service_start_hr - travel_hrs
+            items.append(itinerary_schemas.ItineraryItem(
+                leg_type='BREAK', activity="Free Time / Break",
+                estimated_duration_hrs=round(wait_hrs, 2),
+                estimated_arrival=at(previous_departure_hr), estimated_departure=at(travel_start_hr)
+            ))
+
+        stored_leg = stored_pair_legs.get((a, b))
+        if stored_leg:
+            items.append(stored_leg.model_copy(update={
+                'estimated_departure': at(travel_start_hr),
+                'estimated_arrival': at(travel_start_hr + travel_hrs),
+            }))
+        else:
+            directions = {'duration_hrs': round(travel_hrs, 2), 'distance_km': round(distances[a][b], 1)}
+            geometry = geometry_by_pair.get((a, b))
+            if isinstance(geometry, dict):
+                directions['overview_polyline'] = geometry.get('overview_polyline')
+            else:
+                logger.warning(f"Could not fetch route geometry for new leg {a}->{b}: {geometry or 'timed out'}")
+            title = f"Travel to {stops[b].activity}" if is_stop else "Travel back to start location"
+            items.append(_build_travel_leg(title, directions, at(travel_start_hr), travel_mode))
+
+        if is_stop:
+            items.append(stops[b].model_copy(update={
+                'estimated_arrival': at(service_start_hr),
+                'estimated_departure': at(departure_hr),
+            }))
+    return items
+
+class _StopPlan:
+    """
+    The located stops of an itinerary as a routing problem. Node 0 is the start,
+    nodes 1..n are the current activities in their stored order, followed by any
+    new activities. Times are hours since the trip start.
+    """
+
+    def __init__(
+        self,
+        original_req: itinerary_schemas.ItineraryRequest,
+        start_coords: Tuple[float, float],
+        current_itinerary: List[itinerary_schemas.ItineraryItem],
+        new_activities: Optional[List[itinerary_schemas.ItineraryItem]] = None
+    ):
+        self.travel_mode = original_req.travel_mode
+        self.trip_start_utc = datetime.fromisoformat(original_req.start_datetime.replace('Z', '+00:00')).astimezone(dt_timezone.utc)
+        trip_end_utc = datetime.fromisoformat(original_req.end_datetime.replace('Z', '+00:00')).astimezone(dt_timezone.utc)
+        self.horizon_hrs = (trip_end_utc - self.trip_start_utc).total_seconds() / 3600.0 + constants.TRIP_END_GRACE_HOURS
+        utc_offset_minutes = _resolve_place_utc_offset_minutes(original_req.start_datetime, start_coords)
+
+        self.activity_nodes = _located_activities(current_itinerary)
+        self.stops: List[Optional[itinerary_schemas.ItineraryItem]] = [None] + self.activity_nodes + list(new_activities or [])
+        self.coords = [start_coords] + [(stop.lat, stop.lon) for stop in self.stops[1:]]
+        self.stored_pair_legs = _stored_pair_legs(current_itinerary, self.activity_nodes)
+        self.base_route = list(range(len(self.activity_nodes) + 1)) + [0]
+
+        self.service_hrs = [0.0] + [stop.estimated_duration_hrs or constants.DEFAULT_ACTIVITY_TIME_HOURS for stop in self.stops[1:]]
+        self.node_costs = [0.0] + [stop.estimated_cost_inr if isinstance(stop.estimated_cost_inr, (int, float)) else 0.0 for stop in self.stops[1:]]
+        self.windows: List[route_optimizer.TimeWindows] = [None] + [
+            _opening_windows_hrs(stop.opening_hours, self.trip_start_utc, self.horizon_hrs, utc_offset_minutes) for stop in self.stops[1:]
+        ]
+        self.durations: List[List[float]] = []
+        self.distances: List[List[float]] = []
+        self.leg_costs: List[List[float]] = []
+
+    async def load_matrix(self, http_client: httpx.AsyncClient) -> None:
+        matrix = await location_service.get_distance_matrix(http_client, self.coords, self.travel_mode)
+        self.durations, self.distances, self.leg_costs = _prepare_stop_matrix(matrix, self.stored_pair_legs, self.travel_mode)
+        if self.schedule(self.base_route) is None:
+            # Stored stops were already accepted by the user; don't let approximate hours reject every change.
+            logger.info("Existing stops do not fit their opening hours as re-timed; relaxing their windows.")
+            for node in range(1, len(self.activity_nodes) + 1):
+                self.windows[node] = None
+
+    def schedule(self, route: List[int]) -> Optional[List[route_optimizer.Visit]]:
+        return route_optimizer.schedule_route(route, self.durations, self.service_hrs, self.windows, constants.MAX_WAIT_TIME_HOURS)
+
+    async def build_items(self, route: List[int], http_client: httpx.AsyncClient) -> List[itinerary_schemas.ItineraryItem]:
+        return await _build_route_items(
+            route, self.schedule(route), self.stops, self.coords, self.durations, self.distances,
+            self.stored_pair_legs, self.trip_start_utc, http_client, self.travel_mode
+        )
+
+async def insert_activities_into_itinerary(
+    payload: itinerary_schemas.ItineraryBatchInsertionRequest,
+    db: AsyncSession,
+    http_client: httpx.AsyncClient,
+    current_user: models.all_models.UserAccount,
+) -> itinerary_schemas.ItineraryResponse:
+    """
+    Places several new activities at once. One matrix call covers every stop, a
+    cheapest-insertion heuristic places the activities within the trip window and
+    budget, and the trip is saved once.
+    """
+    logger.info(f"Starting batch insertion of {len(payload.new_activities)} activities into itinerary.")
+    try:
+        original_req = payload.original_request
+        start_coords = await _resolve_request_start_coords(original_req, http_client)
+
+        seen_osm_ids = {item.osm_id for item in _located_activities(payload.current_itinerary) if item.osm_id is not None}
+        new_activities = []
+        for activity in payload.new_activities:
+            if activity.osm_id is not None:
+                if activity.osm_id in seen_osm_ids:
+                    continue
+                seen_osm_ids.add(activity.osm_id)
+            new_activities.append(activity)
+        if not new_activities:
+            raise HTTPException(status_code=400, detail="All of the new activities are already in the itinerary.")
+
+        plan = _StopPlan(original_req, start_coords, payload.current_itinerary, new_activities)
+        await plan.load_matrix(http_client)
+        budget = max(original_req.budget, route_optimizer.route_cost(plan.base_route, plan.leg_costs, plan.node_costs))
+
+        new_nodes = list(range(len(plan.activity_nodes) + 1, len(plan.stops)))
+        route, unplaced_nodes = await planning_service.run_cpu_bound(
+            route_optimizer.cheapest_insertion, plan.base_route, new_nodes, plan.durations, plan.service_hrs, plan.horizon_hrs,
+            plan.windows, constants.MAX_WAIT_TIME_HOURS, plan.leg_costs, plan.node_costs, budget
+        )
+        if len(unplaced_nodes) == len(new_nodes):
+            raise HTTPException(status_code=400, detail="None of the new activities fit within the trip time window and budget.")
+        logger.info(f"Placed {len(new_nodes) - len(unplaced_nodes)} of {len(new_nodes)} new activities with cheapest insertion.")
+
+        new_itinerary_items = await plan.build_items(route, http_client)
+        total_cost = sum(item.estimated_cost_inr for item in new_itinerary_items if isinstance(item.estimated_cost_inr, (int, float)))
+
+        notes = "Your itinerary has been updated with the new activities."
+        if unplaced_nodes:
+            notes += f" Could not fit: {', '.join(plan.stops[node].activity for node in unplaced_nodes)}."
+
+        final_response = itinerary_schemas.ItineraryResponse(
+            itinerary=new_itinerary_items,
+            total_estimated_cost=round(total_cost, 2),
+            start_lat=start_coords[0],
+            start_lon=start_coords[1],
+            custom_heading=payload.current_heading or "Your Updated Trip",
+            weather_info=payload.current_weather,
+            notes=notes
+        )
+        await _persist_trip_itinerary(db, current_user, payload.trip_uuid, final_response)
+        return final_response
+    except HTTPException:
+        raise
+    except LocationServiceError as e:
+        logger.error(f"Failed to insert activities due to a critical routing error: {e}", exc_info=True)
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Could not calculate routes for the new activities: routing service unavailable.")
+    except Exception as e:
+        logger.error(f"Unexpected error in insert_activities_into_itinerary: {e}", exc_info=True)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="An unexpected error occurred while updating your itinerary.")
+
+async def optimize_trip_itinerary(
+    trip: models.all_models.UserTrip,
+    db: AsyncSession,
+    http_client: httpx.AsyncClient,
+) -> itinerary_schemas.ItineraryResponse:
+    """
+    Reorders a stored trip's stops to minimise travel time while keeping opening hours
+    and the trip window, then re-times the legs and saves the result. One matrix call
+    covers all the routing; only legs that did not exist before are fetched for geometry.
+    """
+    logger.info(f"Optimizing stop order for trip {trip.trip_uuid}.")
+    try:
+        stored_response = itinerary_schemas.ItineraryResponse.model_validate(trip.generated_itinerary_response)
+        original_req = itinerary_schemas.ItineraryRequest.model_validate(trip.original_request_details)
+        if stored_response.start_lat is not None and stored_response.start_lon is not None:
+            start_coords = (stored_response.start_lat, stored_response.start_lon)
+        else:
+            start_coords = await _resolve_request_start_coords(original_req, http_client)
+
+        plan = _StopPlan(original_req, start_coords, stored_response.itinerary)
+        if len(plan.activity_nodes) < 2:
+            stored_response.notes = "This trip has too few stops to reorder."
+            return stored_response
+
+        await plan.load_matrix(http_client)
+        # The stored order must stay acceptable even if it already overran the window.
+        horizon_hrs = max(plan.horizon_hrs, route_optimizer.route_finish_hrs(plan.base_route, plan.durations, plan.service_hrs, plan.windows, constants.MAX_WAIT_TIME_HOURS))
+        route = await planning_service.run_cpu_bound(
+            route_optimizer.optimize_route, plan.base_route, plan.durations, plan.service_hrs, horizon_hrs,
+            plan.windows, constants.MAX_WAIT_TIME_HOURS, constants.ROUTE_EXACT_MAX_STOPS
+        )
+        if route == plan.base_route:
+            stored_response.notes = "Your stops are already in the best order we could find."
+            return stored_response
+
+        saved_hrs = route_optimizer.route_travel_hrs(plan.base_route, plan.durations) - route_optimizer.route_travel_hrs(route, plan.durations)
+        logger.info(f"Reordered trip {trip.trip_uuid}: {plan.base_route} -> {route}, saving {saved_hrs:.2f} travel hours.")
+        new_itinerary_items = await plan.build_items(route, http_client)
+        total_cost = sum(item.estimated_cost_inr for item in new_itinerary_items if isinstance(item.estimated_cost_inr, (int, float)))
+
+        optimized_response = stored_response.model_copy(update={
+            'itinerary': new_itinerary_items,
+            'total_estimated_cost': round(total_cost, 2),
+            'start_lat': start_coords[0],
+            'start_lon': start_coords[1],
+            'notes': f"Your stops have been reordered to save about {round(saved_hrs * 60)} minutes of travel."
+        })
+        trip.generated_itinerary_response = optimized_response.model_dump(mode='json')
+        trip.updated_at = datetime.now(dt_timezone.utc)
+        db.add(trip)
+        await db.commit()
+        return optimized_response
+    except HTTPException:
+        raise
+    except LocationServiceError as e:
+        logger.error(f"Failed to optimize trip due to a critical routing error: {e}", exc_info=True)
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Could not optimize the trip: routing service unavailable.")
+    except Exception as e:
+        logger.error(f"Unexpected error in optimize_trip_itinerary: {e}", exc_info=True)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="An unexpected error occurred while optimizing your trip.")
+
+
+# --- Mid-trip Replanning ---
+
+def _replan_pool_key(trip_uuid: str) -> str:
+    return f"replan-pool:{trip_uuid}"
+
+def _replan_candidates_key(trip_uuid: str) -> str:
+    return f"replan-candidates:{trip_uuid}"
+
+def _coords_key(lat: float, lon: float) -> Tuple[float, float]:
+    return (round(lat, 6), round(lon, 6))
+
+def _replan_ttl_seconds(trip_end_utc: datetime) -> int:
+    """Replan data is kept until the trip is over."""
+    remaining_seconds = (trip_end_utc - datetime.now(dt_timezone.utc)).total_seconds() + constants.TRIP_END_GRACE_HOURS * 3600
+    return max(int(remaining_seconds), constants.REPLAN_POOL_MIN_TTL_SECONDS)
+
+async def _store_replan_candidates(trip_uuid: str, unused_candidates: List[Dict[str, Any]], all_keywords: List[str], trip_end_utc: datetime) -> None:
+    """Saves a build's unused candidates; the replan pool is only ranked and routed if the trip is replanned."""
+    try:
+        await cache.set_json(_replan_candidates_key(trip_uuid), {
+            "all_keywords": all_keywords,
+            "candidates": unused_candidates,
+        }, _replan_ttl_seconds(trip_end_utc), local=False)
+    except Exception as e:
+        logger.warning(f"Could not save replan candidates for trip {trip_uuid}: {e}")
+
+async def _build_replan_pool(
+    trip_uuid: str,
+    start_coords: Tuple[float, float],
+    now_utc: datetime,
+    trip_end_utc: datetime,
+    itinerary_items: List[itinerary_schemas.ItineraryItem],
+    travel_mode: str,
+    http_client: httpx.AsyncClient
+) -> Optional[Dict[str, Any]]:
+    """
+    Ranks the candidates saved at build time and fetches one matrix over them, the start
+    and the planned stops, so this and later replans need no search, enrichment or routing.
+    """
+    saved = await cache.get_json(_replan_candidates_key(trip_uuid), local=False)
+    if not saved:
+        return None
+    unused_candidates, all_keywords = saved['candidates'], saved['all_keywords']
+    ranked = await planning_service.run_cpu_bound(
+        planning_service.rank_candidates, unused_candidates, all_keywords, set(), set(), now_utc, set(), constants.REPLAN_POOL_SIZE,
+        inline=len(unused_candidates) < constants.PLANNING_POOL_MIN_CANDIDATES
+    )
+    candidates_by_id = {cand['osm_id']: cand for cand in unused_candidates}
+    pool = [candidates_by_id[osm_id] for _, osm_id in ranked]
+    coords = [start_coords] + [(item.lat, item.lon) for item in _located_activities(itinerary_items)] + [(cand['lat'], cand['lon']) for cand in pool]
+    matrix = await location_service.get_distance_matrix(http_client, coords, travel_mode)
+    pool_entry = {
+        "all_keywords": all_keywords,
+        "candidates": pool,
+        "coords": [list(point) for point in coords],
+        "durations_hrs": matrix['durations_hrs'],
+        "distances_km": matrix['distances_km'],
+    }
+    await cache.set_json(_replan_pool_key(trip_uuid), pool_entry, _replan_ttl_seconds(trip_end_utc), local=False)
+    await cache.delete(_replan_candidates_key(trip_uuid))
+    logger.info(f"Built replan pool of {len(pool)} candidates for trip {trip_uuid}.")
+    return pool_entry
+
+async def _get_replan_pool(
+    trip_uuid: str,
+    start_coords: Tuple[float, float],
+    now_utc: datetime,
+    trip_end_utc: datetime,
+    itinerary_items: List[itinerary_schemas.ItineraryItem],
+    travel_mode: str,
+    http_client: httpx.AsyncClient
+) -> Optional[Dict[str, Any]]:
+    """The trip's replan pool, built on its first replan. None if there is nothing to refill from."""
+    pool_entry = await cache.get_json(_replan_pool_key(trip_uuid), local=False)
+    if pool_entry is not None:
+        return pool_entry
+    try:
+        # Replans of one trip arriving together build the pool once.
+        return await singleflight.run(
+            _replan_pool_key(trip_uuid),
+            lambda: _build_replan_pool(trip_uuid, start_coords, now_utc, trip_end_utc, itinerary_items, travel_mode, http_client)
+        )
+    except Exception as e:
+        logger.warning(f"Could not build the replan pool for trip {trip_uuid}: {e}")
+        return None
+
+def _completed_items(items: List[itinerary_schemas.ItineraryItem], completed: List[itinerary_schemas.ItineraryItem]) -> List[itinerary_schemas.ItineraryItem]:
+    """Completed activities together with the travel/break legs that led to them, in stored order."""
+    kept, pending_legs = [], []
+    for item in items:
+        if item.leg_type == 'ACTIVITY':
+            if any(item is done for done in completed):
+                kept.extend(pending_legs)
+                kept.append(item)
+            pending_legs = []
+        else:
+            pending_legs.append(item)
+    return kept
+
+async def replan_trip_itinerary(
+    payload: itinerary_schemas.ReplanRequest,
+    db: AsyncSession,
+    http_client: httpx.AsyncClient,
+    current_user: models.all_models.UserAccount,
+) -> itinerary_schemas.ItineraryResponse:
+    """
+    Replans the rest of a trip from the user's current position and time. Completed
+    stops are kept, planned stops that no longer fit are dropped, and the remaining
+    window is refilled from the build's unused candidates (ranked and routed once, on
+    the trip's first replan).
+    """
+    started = time.perf_counter()
+    stmt = select(models.all_models.UserTrip).where(models.all_models.UserTrip.trip_uuid == payload.trip_uuid, models.all_models.UserTrip.user_id == current_user.id)
+    trip = (await db.execute(stmt)).scalars().first()
+    if not trip:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Trip not found or access denied.")
+
+    try:
+        stored_response = itinerary_schemas.ItineraryResponse.model_validate(trip.generated_itinerary_response)
+        original_req = itinerary_schemas.ItineraryRequest.model_validate(trip.original_request_details)
+        if stored_response.start_lat is not None and stored_response.start_lon is not None:
+            start_coords = (stored_response.start_lat, stored_response.start_lon)
+        else:
+            start_coords = await _resolve_request_start_coords(original_req, http_client)
+        now_utc = datetime.fromisoformat(payload.current_datetime.replace('Z', '+00:00')).astimezone(dt_timezone.utc) if payload.current_datetime else datetime.now(dt_timezone.utc)
+        trip_end_utc = datetime.fromisoformat(original_req.end_datetime.replace('Z', '+00:00')).astimezone(dt_timezone.utc)
+        horizon_hrs = (trip_end_utc - now_utc).total_seconds() / 3600.0 + constants.TRIP_END_GRACE_HOURS
+        if horizon_hrs < constants.MIN_VIABLE_ACTIVITY_HOURS:
+            raise HTTPException(status_code=400, detail="This trip has already ended.")
+        utc_offset_minutes = _resolve_place_utc_offset_minutes(original_req.start_datetime, start_coords)
+
+        # --- Split the stored plan into completed and remaining stops ---
+        items = stored_response.itinerary
+        activities = _located_activities(items)
+        if payload.completed_osm_ids is not None:
+            completed_ids = set(payload.completed_osm_ids)
+            completed = [item for item in activities if item.osm_id in completed_ids]
+        else:
+            completed = [item for item in activities if item.estimated_departure and item.estimated_departure <= now_utc]
+        remaining = [item for item in activities if not any(item is done for done in completed)]
+        completed_items = _completed_items(items, completed)
+        spent = sum(item.estimated_cost_inr for item in completed_items if isinstance(item.estimated_cost_inr, (int, float)))
+
+        pool_entry = await _get_replan_pool(trip.trip_uuid, start_coords, now_utc, trip_end_utc, items, original_req.travel_mode, http_client)
+        if pool_entry is None:
+            logger.info(f"No cached replan pool for trip {trip.trip_uuid}; replanning the stored stops only.")
+        used_ids = {item.osm_id for item in activities if item.osm_id is not None}
+        pool_candidates = [cand for cand in (pool_entry or {}).get('candidates', []) if cand['osm_id'] not in used_ids]
+
+        # Node 0 is the current position, node 1 the trip's start (where the day ends).
+        stops: List[Optional[itinerary_schemas.ItineraryItem]] = [None, None] + remaining + [
+            _candidate_to_activity_item(cand, None, None, cand['avg_visit_duration_hrs'], cand.get('_matched_prefs') or []) for cand in pool_candidates
+        ]
+        current_coords = (payload.current_lat, payload.current_lon)
+        coords = [current_coords, start_coords] + [(stop.lat, stop.lon) for stop in stops[2:]]
+        node_count = len(coords)
+
+        # --- Matrix: cached rows for known places, at most one row fetched for the current position ---
+        cached_index = {_coords_key(lat, lon): idx for idx, (lat, lon) in enumerate(pool_entry['coords'])} if pool_entry else {}
+        lookup = [cached_index.get(_coords_key(*point)) for point in coords[1:]]
+        if pool_entry and all(idx is not None for idx in lookup):
+            sub_durations = [[pool_entry['durations_hrs'][i][j] for j in lookup] for i in lookup]
+            sub_distances = [[pool_entry['distances_km'][i][j] for j in lookup] for i in lookup]
+        else:
+            fresh = await location_service.get_distance_matrix(http_client, coords[1:], original_req.travel_mode)
+            sub_durations, sub_distances = fresh['durations_hrs'], fresh['distances_km']
+
+        # Users usually replan at a stop they just finished; a known place's row stands in for the current position.
+        if pool_entry and all(idx is not None for idx in lookup):
+            known_points, known_durations, known_distances = pool_entry['coords'], pool_entry['durations_hrs'], pool_entry['distances_km']
+            columns = lookup
+        else:
+            known_points, known_durations, known_distances = coords[1:], sub_durations, sub_distances
+            columns = list(range(node_count - 1))
+        distance_to_known = [planning_service.haversine_distance(current_coords[0], current_coords[1], lat, lon) for lat, lon in known_points]
+        nearest = min(range(len(known_points)), key=distance_to_known.__getitem__)
+        if distance_to_known[nearest] <= constants.REPLAN_SNAP_RADIUS_KM:
+            position_durations = [0.0] + [known_durations[nearest][j] for j in columns]
+            position_distances = [0.0] + [known_distances[nearest][j] for j in columns]
+        else:
+            position_row = await location_service.get_distance_matrix(http_client, coords, original_req.travel_mode, sources=[0])
+            position_durations, position_distances = position_row['durations_hrs'][0], position_row['distances_km'][0]
+
+        matrix = {
+            'durations_hrs': [position_durations] + [[None] + row for row in sub_durations],
+            'distances_km': [position_distances] + [[None] + row for row in sub_distances],
+        }
+        node_of = {id(stop): node for node, stop in enumerate(stops) if stop is not None}
+        stored_legs = _index_stored_travel_legs(items)
+        stored_pair_legs = {}
+        for segment, leg in stored_legs.items():
+            if segment == 0:
+                continue
+            from_node = node_of.get(id(activities[segment - 1]))
+            to_node = node_of.get(id(activities[segment])) if segment < len(activities) else 1
+            if from_node is not None and to_node is not None:
+                stored_pair_legs[(from_node, to_node)] = leg
+        durations, distances, leg_costs = _prepare_stop_matrix(matrix, stored_pair_legs, original_req.travel_mode)
+
+        service_hrs = [0.0, 0.0] + [stop.estimated_duration_hrs or constants.DEFAULT_ACTIVITY_TIME_HOURS for stop in stops[2:]]
+        node_costs = [0.0, 0.0] + [stop.estimated_cost_inr if isinstance(stop.estimated_cost_inr, (int, float)) else 0.0 for stop in stops[2:]]
+        windows = [None, None] + [_opening_windows_hrs(stop.opening_hours, now_utc, horizon_hrs, utc_offset_minutes) for stop in stops[2:]]
+
+        # --- Solve: keep what still fits, then refill in preference order ---
+        fulfilled_preferences = {pref for item in completed for pref in (item.matched_preferences or [])}
+        ranked = await planning_service.run_cpu_bound(
+            planning_service.rank_candidates, pool_candidates, (pool_entry or {}).get('all_keywords', []),
+            fulfilled_preferences, set(), now_utc, set(), len(pool_candidates),
+            inline=len(pool_candidates) < constants.PLANNING_POOL_MIN_CANDIDATES
+        ) if pool_candidates else []
+        candidate_node_by_id = {cand['osm_id']: node for node, cand in enumerate(pool_candidates, start=2 + len(remaining))}
+        planned_nodes = list(range(2, 2 + len(remaining)))
+        route, dropped_nodes = await planning_service.run_cpu_bound(
+            route_optimizer.replan_route, 0, 1, planned_nodes, [candidate_node_by_id[osm_id] for _, osm_id in ranked],
+            durations, service_hrs, horizon_hrs, windows, constants.MAX_WAIT_TIME_HOURS,
+            leg_costs, node_costs, max(original_req.budget - spent, 0.0), constants.ROUTE_EXACT_MAX_STOPS
+        )
+
+        visits = route_optimizer.schedule_route(route, durations, service_hrs, windows, constants.MAX_WAIT_TIME_HOURS)
+        new_items = await _build_route_items(
+            route, visits, stops, coords, durations, distances, stored_pair_legs, now_utc, http_client,
+            original_req.travel_mode, geometry_timeout=constants.REPLAN_GEOMETRY_TIMEOUT_SECONDS
+        )
+        new_itinerary_items = completed_items + new_items
+        total_cost = sum(item.estimated_cost_inr for item in new_itinerary_items if isinstance(item.estimated_cost_inr, (int, float)))
+
+        added_count = sum(1 for node in route if node >= 2 + len(remaining))
+        kept_count = len(remaining) - len(dropped_nodes)
+        notes = f"Replanned from your current location: kept {kept_count} planned stops, dropped {len(dropped_nodes)}, added {added_count}."
+        replanned_response = stored_response.model_copy(update={
+            'itinerary': new_itinerary_items,
+            'total_estimated_cost': round(total_cost, 2),
+            'start_lat': start_coords[0],
+            'start_lon': start_coords[1],
+            'notes': notes
+        })
+        trip.generated_itinerary_response = replanned_response.model_dump(mode='json')
+        trip.updated_at = datetime.now(dt_timezone.utc)
+        db.add(trip)
+        await db.commit()
+
+        logger.info(f"Replanned trip {trip.trip_uuid} in {time.perf_counter() - started:.3f}s ({notes})")
+        return replanned_response
+    except HTTPException:
+        raise
+    except LocationServiceError as e:
+        logger.error(f"Failed to replan trip due to a critical routing error: {e}", exc_info=True)
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Could not replan the trip: routing service unavailable.")
+    except Exception as e:
+        logger.error(f"Unexpected error in replan_trip_itinerary: {e}", exc_info=True)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="An unexpected error occurred while replanning your trip.")
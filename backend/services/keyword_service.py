@@ -0,0 +1,97 @@
+# /backend/services/keyword_service.py
+
+import asyncio
+import logging
+import time
+from typing import Coroutine, Dict, List, Optional, Set
+
+import google.generativeai as genai
+
+from core import cache, constants, singleflight
+from services import ai_service
+
+logger = logging.getLogger(__name__)
+
+# Local search keywords depend only on the city and the preference, so they are cached
+# per (city, preference) and any preference combination is assembled from those parts.
+# Entries live for a long time; once older than the refresh age they are still served
+# while a background call fetches a fresh answer.
+
+# Strong references to refresh tasks, plus the keys they cover so refreshes are not doubled up.
+_refresh_tasks: Set[asyncio.Task] = set()
+_refreshing_keys: Set[str] = set()
+
+
+def _keywords_key(city: str, preference: str) -> str:
+    return f"local_keywords:{city.strip().lower()}:{preference.strip().lower()}"
+
+
+async def _fetch_and_store(gemini_model: genai.GenerativeModel, city: str, preferences: List[str]) -> Optional[Dict[str, List[str]]]:
+    # This cache owns the keywords' lifecycle, so the AI call is not prompt-cached; concurrent
+    # misses for the same city and preferences still share one call.
+    keywords_by_pref = await singleflight.run(
+        f"local_keywords:{city.strip().lower()}:{','.join(preferences)}",
+        lambda: ai_service.get_dynamic_local_keywords_by_preference(gemini_model, city, preferences),
+        share_across_processes=True,
+    )
+    if keywords_by_pref is None:
+        return None
+    fetched_at = time.time()
+    for pref, keywords in keywords_by_pref.items():
+        await cache.set_json(
+            _keywords_key(city, pref), {"keywords": keywords, "fetched_at": fetched_at}, constants.KEYWORD_CACHE_TTL_SECONDS
+        )
+    return keywords_by_pref
+
+
+async def _refresh(gemini_model: genai.GenerativeModel, city: str, preferences: List[str], keys: List[str]) -> None:
+    try:
+        await _fetch_and_store(gemini_model, city, preferences)
+    finally:
+        _refreshing_keys.difference_update(keys)
+
+
+def _spawn_refresh(coro: Coroutine) -> None:
+    task = asyncio.create_task(coro)
+    _refresh_tasks.add(task)
+    task.add_done_callback(_refresh_tasks.discard)
+
+
+async def get_local_keywords(
+    gemini_model: genai.GenerativeModel,
+    city: str,
+    preferences: List[str]
+) -> List[str]:
+    """
+    Hyper-local keywords for `preferences` in `city`. Cached preferences are served
+    directly; only the missing ones go to the AI, in a single call.
+    """
+    if not all([gemini_model, city, preferences]):
+        return []
+
+    keywords: List[str] = []
+    missing: List[str] = []
+    stale: List[str] = []
+    now = time.time()
+    for pref in dict.fromkeys(preferences):
+        entry = await cache.get_json(_keywords_key(city, pref))
+        if entry is None:
+            missing.append(pref)
+            continue
+        keywords.extend(entry.get("keywords", []))
+        if now - entry.get("fetched_at", 0) > constants.KEYWORD_CACHE_REFRESH_AFTER_SECONDS:
+            stale.append(pref)
+
+    stale = [pref for pref in stale if _keywords_key(city, pref) not in _refreshing_keys]
+    if stale:
+        stale_keys = [_keywords_key(city, pref) for pref in stale]
+        _refreshing_keys.update(stale_keys)
+        logger.info(f"Refreshing cached keywords for {city} {stale} in the background.")
+        _spawn_refresh(_refresh(gemini_model, city, stale, stale_keys))
+
+    if missing:
+        logger.info(f"Keyword cache miss for {city} {missing}; {len(preferences) - len(missing)} preference(s) served from cache.")
+        fetched = await _fetch_and_store(gemini_model, city, missing)
+        for pref in missing:
+            keywords.extend((fetched or {}).get(pref, []))
+    return keywords
@@ -2,8 +2,11 @@
 
 import asyncio
 import functools
+import hashlib
 import logging
-from typing import Any, Dict, Optional, Tuple, List
+import math
+import re
+from typing import Any, Dict, Optional, Set, Tuple, List
 from urllib.parse import quote_plus
 
 import googlemaps # KEPT FOR COMMENTED OUT LOGIC
@@ -12,8 +15,11 @@ import polyline
 import wikipedia
 from wikipedia.exceptions import DisambiguationError, PageError
 
+from core import cache, constants, singleflight
 from core.config import settings
-from core.constants import OVERPASS_API_URL, OVERPASS_TIMEOUT, WIKI_LOOKUP_TIMEOUT
+from core.constants import OVERPASS_API_URL, OVERPASS_TIMEOUT, PREFERENCE_TO_OSM_SELECTOR, WIKI_LOOKUP_TIMEOUT
+from core.rate_gate import RateGate, RateGateBusy
+from services import autocomplete_service
 
 logger = logging.getLogger(__name__)
 
@@ -23,35 +29,123 @@ class LocationServiceError(Exception):
 
 APP_VERSION = "5.0.0"
 
+# Map our modes to OpenRouteService profiles
+ORS_TRANSPORT_PROFILES = {
+    "driving": "driving-car",
+    "walking": "foot-walking",
+    "bicycling": "cycling-road"
+}
 
-# --- Geocoding/Reverse Geocoding (Nominatim, Unchanged) ---
-async def geocode_location_text(location_text: str, http_client: httpx.AsyncClient) -> Dict[str, Any]:
+
+# --- Shared upstream fetches ---
+# Identical Nominatim and Overpass requests in flight at the same time (e.g. many users
+# planning the same trending city) share one upstream call, across workers too.
+
+async def _fetch_json(http_client: httpx.AsyncClient, method: str, url: str, **kwargs: Any) -> Any:
+    send = http_client.post if method == "POST" else http_client.get
+    response = await send(url, **kwargs)
+    response.raise_for_status()
+    return response.json()
+
+
+# Every Nominatim request from any worker passes through this gate.
+_nominatim_gate = RateGate("nominatim", constants.NOMINATIM_MIN_INTERVAL_SECONDS, constants.NOMINATIM_MAX_QUEUE_WAIT_SECONDS)
+
+
+async def _nominatim_get(url: str, http_client: httpx.AsyncClient) -> Any:
+    async def fetch() -> Any:
+        await _nominatim_gate.wait_turn()
+        return await _fetch_json(http_client, "GET", url, headers={'User-Agent': f'CabitoApp/{APP_VERSION}'})
+
+    return await singleflight.run(f"nominatim:{url}", fetch, share_across_processes=True)
+
+
+def _overpass_lock_ttl_seconds() -> int:
+    # Outlives the slowest call the Overpass client allows, so no second worker starts the same query.
+    config = settings.HTTP_UPSTREAMS.get("overpass") or settings.HTTP_UPSTREAMS["default"]
+    slowest_call = config.pool_timeout_seconds + config.connect_timeout_seconds + max(config.read_timeout_seconds, OVERPASS_TIMEOUT)
+    return math.ceil(slowest_call) + constants.OVERPASS_LOCK_MARGIN_SECONDS
+
+
+async def run_overpass_query(query: str, http_client: httpx.AsyncClient) -> Dict[str, Any]:
+    """Posts an Overpass QL query; raises httpx errors like a direct call would."""
+    cache_key = f"overpass:{hashlib.sha256(query.encode('utf-8')).hexdigest()}"
+
+    async def fetch() -> Dict[str, Any]:
+        cached = await cache.get_json(cache_key, local=False)
+        if cached is not None:
+            return cached
+        data = await _fetch_json(http_client, "POST", OVERPASS_API_URL, data=query, headers={'User-Agent': f'CabitoApp/{APP_VERSION}'})
+        await cache.set_json(cache_key, data, constants.OVERPASS_RESULT_TTL_SECONDS, local=False)
+        return data
+
+    # Responses can be several MB, so workers waiting on another's call read its answer
+    # from the cache entry instead of a second published copy.
+    return await singleflight.run(
+        f"overpass:{query}",
+        fetch,
+        share_across_processes=True,
+        lock_ttl_seconds=_overpass_lock_ttl_seconds(),
+        publish_result=False,
+    )
+
+
+# --- Geocoding/Reverse Geocoding (Nominatim, cached) ---
+# Forward lookups are cached by normalized query text, reverse lookups by rounded
+# coordinates. "Not found" answers are cached too, for a shorter time.
+
+def normalize_geocode_query(location_text: str) -> str:
+    """'  Hazratganj ,Lucknow ' -> 'hazratganj, lucknow'"""
+    return re.sub(r"\s*,\s*", ", ", " ".join(location_text.lower().split())).strip(" ,")
+
+
+async def _cached_nominatim_lookup(cache_key: str, url: str, http_client: httpx.AsyncClient) -> Any:
+    """Returns Nominatim's JSON for `url`, or None when it has nothing, caching either way."""
+    entry = await cache.get_json(cache_key)
+    if isinstance(entry, dict):
+        return entry.get("result")
     if not http_client:
         raise LocationServiceError("HTTP client is not available.")
+    result = await _nominatim_get(url, http_client)
+    if not result or (isinstance(result, dict) and result.get("error")):
+        await cache.set_json(cache_key, {"result": None}, constants.GEOCODE_NOT_FOUND_TTL_SECONDS)
+        return None
+    await cache.set_json(cache_key, {"result": result}, constants.GEOCODE_CACHE_TTL_SECONDS)
+    return result
+
+
+async def geocode_location_text(location_text: str, http_client: httpx.AsyncClient) -> Dict[str, Any]:
+    query = normalize_geocode_query(location_text)
     try:
-        nominatim_url = f"https://nominatim.openstreetmap.org/search?q={quote_plus(location_text)}&format=json&limit=1&addressdetails=1"
-        response = await http_client.get(nominatim_url, headers={'User-Agent': f'CabitoApp/{APP_VERSION}'})
-        response.raise_for_status()
-        results = response.json()
-        if results:
-            return results[0]
-        else:
-            raise LocationServiceError(f"Location '{location_text}' could not be found.")
+        nominatim_url = f"https://nominatim.openstreetmap.org/search?q={quote_plus(query)}&format=json&limit=1&addressdetails=1"
+        results = await _cached_nominatim_lookup(f"geocode:{query}", nominatim_url, http_client)
+    except LocationServiceError:
+        raise
+    except RateGateBusy as e:
+        logger.warning(f"Nominatim queue full, rejecting geocode for '{location_text}'.")
+        raise LocationServiceError("Location service is busy. Please try again in a moment.") from e
     except httpx.HTTPStatusError as e:
         logger.error(f"Nominatim HTTP error for '{location_text}': {e.response.status_code}")
         raise LocationServiceError("External location service is currently unavailable.") from e
     except Exception as e:
         logger.error(f"An unexpected geocoding error occurred for '{location_text}': {e}", exc_info=True)
         raise LocationServiceError("An unexpected error occurred during geocoding.") from e
+    if not results:
+        raise LocationServiceError(f"Location '{location_text}' could not be found.")
+    autocomplete_service.remember_geocoded_place(query, results[0])
+    return results[0]
 
 async def reverse_geocode_coords(lat: float, lon: float, http_client: httpx.AsyncClient) -> Dict[str, Any]:
-    if not http_client:
-        raise LocationServiceError("HTTP client is not available.")
+    lat_q, lon_q = round(lat, constants.REVERSE_GEOCODE_PRECISION), round(lon, constants.REVERSE_GEOCODE_PRECISION)
     try:
-        rev_geo_url = f"https://nominatim.openstreetmap.org/reverse?lat={lat}&lon={lon}&format=json&addressdetails=1"
-        response = await http_client.get(rev_geo_url, headers={'User-Agent': f'CabitoApp/{APP_VERSION}'})
-        response.raise_for_status()
-        return response.json()
+        rev_geo_url = f"https://nominatim.openstreetmap.org/reverse?lat={lat_q}&lon={lon_q}&format=json&addressdetails=1"
+        result = await _cached_nominatim_lookup(f"reverse_geocode:{lat_q}:{lon_q}", rev_geo_url, http_client)
+        return result or {"error": "Unable to geocode"}
+    except LocationServiceError:
+        raise
+    except RateGateBusy as e:
+        logger.warning(f"Nominatim queue full, rejecting reverse geocode for ({lat},{lon}).")
+        raise LocationServiceError("Location service is busy. Please try again in a moment.") from e
     except httpx.HTTPStatusError as e:
         logger.error(f"Reverse geocoding HTTP error for ({lat},{lon}): {e.response.status_code}")
         raise LocationServiceError("External reverse geocoding service is unavailable.") from e
@@ -75,13 +169,7 @@ async def get_directions(
     if not settings.OPENROUTESERVICE_API_KEY:
         raise LocationServiceError("OPENROUTESERVICE_API_KEY not configured.")
 
-    # Map our modes to OpenRouteService profiles
-    transport_mode_map = {
-        "driving": "driving-car",
-        "walking": "foot-walking",
-        "bicycling": "cycling-road"
-    }
-    ors_profile = transport_mode_map.get(mode, "driving-car")
+    ors_profile = ORS_TRANSPORT_PROFILES.get(mode, "driving-car")
 
     # Note: ORS uses lon,lat order for coordinates
     coordinates = [
@@ -122,6 +210,52 @@ async def get_directions(
         logger.error(f"OpenRouteService Directions API error: {e}", exc_info=True)
         raise LocationServiceError("An unexpected error occurred while calculating directions.") from e
 
+async def get_distance_matrix(
+    http_client: httpx.AsyncClient,
+    coords: List[Tuple[float, float]],
+    mode: str = "driving",
+    sources: Optional[List[int]] = None
+) -> Dict[str, List[List[Optional[float]]]]:
+    """
+    Fetches a travel-time/distance matrix between `coords` in one ORS request.
+    With `sources`, only those rows are computed. Unroutable pairs are None.
+    """
+    if not http_client:
+        raise LocationServiceError("HTTP client is not available for the distance matrix.")
+    if not settings.OPENROUTESERVICE_API_KEY:
+        raise LocationServiceError("OPENROUTESERVICE_API_KEY not configured.")
+
+    ors_profile = ORS_TRANSPORT_PROFILES.get(mode, "driving-car")
+    ors_url = f"https://api.openrouteservice.org/v2/matrix/{ors_profile}"
+    headers = {
+        'Authorization': settings.OPENROUTESERVICE_API_KEY,
+        'Content-Type': 'application/json'
+    }
+    body = {
+        "locations": [[lon, lat] for lat, lon in coords],
+        "metrics": ["duration", "distance"],
+        "units": "km"
+    }
+    if sources is not None:
+        body["sources"] = sources
+
+    try:
+        response = await http_client.post(ors_url, headers=headers, json=body)
+        response.raise_for_status()
+        data = response.json()
+        durations, distances = data.get("durations"), data.get("distances")
+        if not durations or not distances:
+            raise LocationServiceError("ORS matrix response is missing durations or distances.")
+        return {
+            "durations_hrs": [[d / 3600.0 if d is not None else None for d in row] for row in durations],
+            "distances_km": distances,
+        }
+    except LocationServiceError:
+        raise
+    except Exception as e:
+        logger.error(f"OpenRouteService Matrix API error: {e}", exc_info=True)
+        raise LocationServiceError("An unexpected error occurred while calculating the distance matrix.") from e
+
 # --- WIKIPEDIA & OSM HELPERS (UNCHANGED) ---
 async def fetch_wikipedia_summary(place_name: str, wiki_title: Optional[str]) -> Optional[str]:
     if not wiki_title:
@@ -149,9 +283,7 @@ async def fetch_osm_element_details(osm_type: str, osm_id: int, http_client: htt
         return None
     query = f"[out:json][timeout:{OVERPASS_TIMEOUT}];({osm_type}({osm_id}););out center;"
     try:
-        response = await http_client.post(OVERPASS_API_URL, data=query, headers={'User-Agent': f'CabitoApp/{APP_VERSION}'})
-        response.raise_for_status()
-        data = response.json()
+        data = await run_overpass_query(query, http_client)
         if data.get("elements"):
             element = data["elements"][0]
             if element.get('type') == 'node':
@@ -164,6 +296,27 @@ async def fetch_osm_element_details(osm_type: str, osm_id: int, http_client: htt
         logger.error(f"OSM element fetch error for {osm_type}/{osm_id}: {e}")
         raise LocationServiceError("OSM data service is currently unavailable.") from e
 
+async def search_osm_elements(
+    http_client: httpx.AsyncClient,
+    preferences: Set[str],
+    start_coords: Tuple[float, float],
+    query_radius_m: int
+) -> List[Dict[str, Any]]:
+    """Broad Overpass search for every OSM selector mapped to `preferences`."""
+    selectors_map = {pk: v for pk, v in PREFERENCE_TO_OSM_SELECTOR.items() if pk in preferences}
+    unique_selectors = sorted(set(s for sel_list in selectors_map.values() for s in sel_list if s))
+    if not unique_selectors:
+        return []
+    query_parts = [f"node[name]{sel}(around:{query_radius_m},{start_coords[0]},{start_coords[1]});way[name]{sel}(around:{query_radius_m},{start_coords[0]},{start_coords[1]});relation[name]{sel}(around:{query_radius_m},{start_coords[0]},{start_coords[1]});" for sel in unique_selectors]
+    overpass_query = f"[out:json][timeout:{OVERPASS_TIMEOUT}];({ ''.join(query_parts) });out center;"
+    try:
+        osm_elements = (await run_overpass_query(overpass_query, http_client)).get('elements', [])
+    except Exception as e:
+        logger.error(f"Broad search failed: {e}", exc_info=True)
+        raise LocationServiceError("OSM data service is currently unavailable.") from e
+    logger.info(f"Broad search for {sorted(preferences)} found {len(osm_elements)} elements.")
+    return osm_elements
+
 # --- OLD GOOGLE MAPS PLATFORM FUNCTIONS (COMMENTED OUT FOR REFERENCE) ---
 #
 # async def get_google_directions(
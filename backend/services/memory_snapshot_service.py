@@ -0,0 +1,141 @@
+# /backend/services/memory_snapshot_service.py
+
+import asyncio
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Optional, Tuple
+
+import google.generativeai as genai
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core import cache, constants
+from database import AsyncSessionLocal
+from models.all_models import UserTrip
+from services import ai_service
+
+logger = logging.getLogger(__name__)
+
+# A memory snapshot only depends on the trip fields its prompt uses, so the hash of
+# those fields is stored next to the text and the AI is only called again when they
+# change (or the caller forces it).
+
+# Bump when the snapshot prompt changes so stored snapshots are regenerated.
+SNAPSHOT_PROMPT_VERSION = 1
+_PREGENERATION_LOCK_KEY = "memory_snapshot_pregeneration_lock"
+
+
+def snapshot_content_hash(trip: UserTrip) -> str:
+    itinerary_data = trip.generated_itinerary_response if isinstance(trip.generated_itinerary_response, dict) else {}
+    content = {
+        "version": SNAPSHOT_PROMPT_VERSION,
+        "title": trip.trip_title,
+        "location": trip.location_display_name,
+        "start_date": trip.trip_start_datetime_utc.date().isoformat() if trip.trip_start_datetime_utc else None,
+        "activities": [item.get("activity") for item in itinerary_data.get("itinerary", []) if item.get("leg_type") == "ACTIVITY"],
+    }
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+async def get_or_generate_snapshot(
+    db: AsyncSession,
+    gemini_model: genai.GenerativeModel,
+    trip: UserTrip,
+    force: bool = False
+) -> Tuple[Optional[str], bool]:
+    """
+    Returns (snapshot text, whether it was generated now). The stored snapshot is
+    reused while the trip's content hash matches. A newly generated snapshot is saved
+    and committed; if generation fails, the previous snapshot (if any) is returned.
+    """
+    content_hash = snapshot_content_hash(trip)
+    if not force and trip.memory_snapshot_text and trip.memory_snapshot_hash == content_hash:
+        return trip.memory_snapshot_text, False
+
+    snapshot_text = await ai_service.generate_ai_memory_snapshot_text(gemini_model=gemini_model, trip=trip)
+    if not snapshot_text or snapshot_text in ai_service.MEMORY_SNAPSHOT_UNAVAILABLE_TEXTS:
+        return trip.memory_snapshot_text, False
+
+    trip.memory_snapshot_text = snapshot_text
+    trip.memory_snapshot_hash = content_hash
+    db.add(trip)
+    await db.commit()
+    return snapshot_text, True
+
+
+def _pregeneration_query(now: datetime):
+    """
+    Completed trips without a snapshot: never-attempted ones first (newest completion
+    first), then ones whose last failed attempt is older than the retry interval.
+    """
+    retry_before = now - timedelta(seconds=constants.MEMORY_SNAPSHOT_PREGENERATION_RETRY_SECONDS)
+    return (
+        select(UserTrip)
+        .where(
+            UserTrip.status == "completed",
+            UserTrip.memory_snapshot_hash.is_(None),
+            or_(UserTrip.memory_snapshot_attempted_at.is_(None), UserTrip.memory_snapshot_attempted_at < retry_before),
+        )
+        .order_by(UserTrip.memory_snapshot_attempted_at.asc().nulls_first(), UserTrip.marked_completed_at.desc())
+        .limit(constants.MEMORY_SNAPSHOT_PREGENERATION_BATCH_SIZE)
+    )
+
+
+async def pregenerate_completed_snapshots(gemini_model: genai.GenerativeModel) -> int:
+    """Generates snapshots for completed trips that do not have one yet."""
+    async with AsyncSessionLocal() as db:
+        now = datetime.now(dt_timezone.utc)
+        trips = (await db.execute(_pregeneration_query(now))).scalars().all()
+        # Recorded up front, so trips that keep failing back off instead of taking the
+        # batch's slots every round and starving older trips.
+        for trip in trips:
+            trip.memory_snapshot_attempted_at = now
+        await db.commit()
+        generated = 0
+        rolled_back = False
+        for trip in trips:
+            # A rollback expires every loaded trip; reading an expired attribute here would
+            # need a lazy load, which the async session cannot do implicitly.
+            if rolled_back:
+                await db.refresh(trip)
+            trip_uuid = trip.trip_uuid
+            try:
+                _, was_generated = await get_or_generate_snapshot(db, gemini_model, trip)
+                generated += was_generated
+            except Exception as e:
+                await db.rollback()
+                rolled_back = True
+                logger.error(f"Snapshot pregeneration failed for trip {trip_uuid}: {e}")
+        if trips:
+            logger.info(f"Pregenerated {generated}/{len(trips)} memory snapshots for completed trips.")
+        return generated
+
+
+async def _acquire_pregeneration_slot() -> bool:
+    """With several workers, only the one holding the Redis lock runs a given round."""
+    redis = cache.get_redis()
+    if redis is None:
+        return True
+    try:
+        return bool(await redis.set(
+            _PREGENERATION_LOCK_KEY, "1", nx=True, ex=constants.MEMORY_SNAPSHOT_PREGENERATION_INTERVAL_SECONDS
+        ))
+    except Exception as e:
+        logger.warning(f"Could not take the snapshot pregeneration lock, running anyway: {e}")
+        return True
+
+
+async def run_pregeneration_loop(gemini_model: genai.GenerativeModel) -> None:
+    """Periodically pregenerates snapshots until cancelled at shutdown."""
+    if not gemini_model:
+        logger.info("Memory snapshot pregeneration disabled: no Gemini model configured.")
+        return
+    while True:
+        await asyncio.sleep(constants.MEMORY_SNAPSHOT_PREGENERATION_INTERVAL_SECONDS)
+        try:
+            if await _acquire_pregeneration_slot():
+                await pregenerate_completed_snapshots(gemini_model)
+        except Exception as e:
+            logger.error(f"Memory snapshot pregeneration round failed: {e}", exc_info=True)
@@ -0,0 +1,238 @@
+# /backend/services/opening_hours_service.py
+
+import bisect
+import functools
+import logging
+import re
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+_DAY_INDEX = {"Mo": 0, "Tu": 1, "We": 2, "Th": 3, "Fr": 4, "Sa": 5, "Su": 6}
+_HOLIDAY_SELECTORS = {"PH", "SH"}
+# Solar events are approximated with a fixed civil day; good enough for planning.
+_EVENT_MINUTES = {"sunrise": 6 * 60, "sunset": 18 * 60, "dawn": 5 * 60 + 30, "dusk": 18 * 60 + 30}
+_OPEN_ENDED_MINUTES = 4 * 60
+
+_TIME_RE = r"(?:\d{1,2}:\d{2}|sunrise|sunset|dawn|dusk)"
+_SPAN_RE = re.compile(rf"^({_TIME_RE})(?:-({_TIME_RE})|(\+))?\+?$")
+_DAY_TOKEN_RE = re.compile(r"^(Mo|Tu|We|Th|Fr|Sa|Su)(?:-(Mo|Tu|We|Th|Fr|Sa|Su))?$")
+
+
+class OpeningHoursParseError(ValueError):
+    """Raised when an OSM opening_hours string uses syntax the engine does not support."""
+    pass
+
+
+class WeeklySchedule:
+    """
+    A compiled OSM `opening_hours` value.
+    Open minutes of the week are stored in a bitmap (O(1) `is_open`) and the
+    minutes where the state flips are kept sorted (O(log n) `next_change`).
+    Minute 0 is Monday 00:00 in the place's local time.
+    """
+    __slots__ = ("_bitmap", "_changes")
+
+    def __init__(self, open_intervals: List[Tuple[int, int]]):
+        bitmap = bytearray(MINUTES_PER_WEEK // 8)
+        for start, end in open_intervals:
+            for minute in range(start, end):
+                minute %= MINUTES_PER_WEEK
+                bitmap[minute >> 3] |= 1 << (minute & 7)
+        self._bitmap = bytes(bitmap)
+        self._changes = [
+            minute for minute in range(MINUTES_PER_WEEK)
+            if self._is_open_at(minute) != self._is_open_at(minute - 1)
+        ]
+
+    def _is_open_at(self, minute_of_week: int) -> bool:
+        minute_of_week %= MINUTES_PER_WEEK
+        return bool(self._bitmap[minute_of_week >> 3] & (1 << (minute_of_week & 7)))
+
+    @property
+    def is_always_open(self) -> bool:
+        return not self._changes and self._is_open_at(0)
+
+    @property
+    def is_always_closed(self) -> bool:
+        return not self._changes and not self._is_open_at(0)
+
+    def is_open(self, moment: datetime, utc_offset_minutes: int = 0) -> bool:
+        """Whether the place is open at `moment` (aware datetimes are shifted by the place's offset)."""
+        return self._is_open_at(_minute_of_week(_to_local_naive(moment, utc_offset_minutes)))
+
+    def next_change(self, moment: datetime, utc_offset_minutes: int = 0) -> Optional[datetime]:
+        """
+        Returns the next time strictly after `moment` at which the open/closed state flips,
+        or None if the state never changes. The result is in UTC for aware inputs.
+        """
+        if not self._changes:
+            return None
+        local_naive = _to_local_naive(moment, utc_offset_minutes)
+        minute = _minute_of_week(local_naive)
+        idx = bisect.bisect_right(self._changes, minute)
+        if idx < len(self._changes):
+            delta_minutes = self._changes[idx] - minute
+        else:
+            delta_minutes = MINUTES_PER_WEEK - minute + self._changes[0]
+        change_local = local_naive.replace(second=0, microsecond=0) + timedelta(minutes=delta_minutes)
+        if moment.tzinfo is None:
+            return change_local
+        return (change_local - timedelta(minutes=utc_offset_minutes)).replace(tzinfo=dt_timezone.utc)
+
+    def open_intervals(self, start: datetime, end: datetime, utc_offset_minutes: int = 0) -> List[Tuple[datetime, datetime]]:
+        """Open [from, to) intervals overlapping `start`..`end`, clipped to that range."""
+        intervals: List[Tuple[datetime, datetime]] = []
+        cursor, is_open = start, self.is_open(start, utc_offset_minutes)
+        while cursor < end:
+            change = self.next_change(cursor, utc_offset_minutes)
+            segment_end = min(change, end) if change else end
+            if is_open:
+                intervals.append((cursor, segment_end))
+            cursor, is_open = segment_end, not is_open
+        return intervals
+
+
+def _to_local_naive(moment: datetime, utc_offset_minutes: int) -> datetime:
+    if moment.tzinfo is None:
+        return moment
+    return (moment.astimezone(dt_timezone.utc) + timedelta(minutes=utc_offset_minutes)).replace(tzinfo=None)
+
+
+def _minute_of_week(local_naive: datetime) -> int:
+    return local_naive.weekday() * MINUTES_PER_DAY + local_naive.hour * 60 + local_naive.minute
+
+
+def _parse_time(token: str) -> int:
+    if token in _EVENT_MINUTES:
+        return _EVENT_MINUTES[token]
+    hours, minutes = token.split(":")
+    value = int(hours) * 60 + int(minutes)
+    if int(minutes) >= 60 or value > 48 * 60:
+        raise OpeningHoursParseError(f"Invalid time '{token}'.")
+    return value
+
+
+def _parse_days(selector: str) -> Optional[List[int]]:
+    """Returns weekday indexes, or None when the selector only names holidays."""
+    days: List[int] = []
+    has_weekdays = False
+    for token in selector.split(","):
+        token = token.strip()
+        if token in _HOLIDAY_SELECTORS:
+            continue
+        match = _DAY_TOKEN_RE.match(token)
+        if not match:
+            raise OpeningHoursParseError(f"Unsupported day selector '{token}'.")
+        has_weekdays = True
+        first = _DAY_INDEX[match.group(1)]
+        last = _DAY_INDEX[match.group(2)] if match.group(2) else first
+        span = (last - first) % 7
+        days.extend((first + offset) % 7 for offset in range(span + 1))
+    return sorted(set(days)) if has_weekdays else None
+
+
+def _parse_spans(spec: str) -> Optional[List[Tuple[int, int]]]:
+    """Returns (start, end) minute spans within a day; an empty list means closed."""
+    spec = spec.strip()
+    if spec in {"off", "closed"}:
+        return []
+    if spec in {"", "open"}:
+        return [(0, MINUTES_PER_DAY)]
+    spans = []
+    for token in spec.split(","):
+        match = _SPAN_RE.match(token.strip())
+        if not match:
+            raise OpeningHoursParseError(f"Unsupported time span '{token}'.")
+        start = _parse_time(match.group(1))
+        if match.group(2):
+            end = _parse_time(match.group(2))
+            if end <= start:
+                end += MINUTES_PER_DAY
+        else:
+            end = start + _OPEN_ENDED_MINUTES
+        spans.append((start, end))
+    return spans
+
+
+def _split_rule(rule: str) -> Tuple[Optional[str], str]:
+    """Splits '<days> <times>' into its parts; the day selector is optional."""
+    first, _, rest = rule.partition(" ")
+    candidate = first.rstrip(":")
+    if candidate and all(
+        token.strip() in _HOLIDAY_SELECTORS or _DAY_TOKEN_RE.match(token.strip())
+        for token in candidate.split(",")
+    ):
+        return candidate, rest
+    return None, rule
+
+
+@functools.lru_cache(maxsize=4096)
+def compile_opening_hours(opening_hours: Optional[str]) -> Optional[WeeklySchedule]:
+    """
+    Parses an OSM `opening_hours` string once and caches the compiled weekly schedule.
+    Supports the common weekly subset (day ranges, time spans, overnight spans, off,
+    24/7, holiday selectors). Returns None when the value is missing or uses syntax
+    outside that subset, so callers can treat the hours as unknown.
+    """
+    if not opening_hours or not opening_hours.strip():
+        return None
+    value = re.sub(r'"[^"]*"', "", opening_hours).strip()
+    try:
+        if value == "24/7":
+            return WeeklySchedule([(0, MINUTES_PER_WEEK)])
+
+        daily_spans: List[Optional[List[Tuple[int, int]]]] = [None] * 7
+        for rule_group in value.split(";"):
+            rule_group = rule_group.strip()
+            if not rule_group:
+                continue
+            # A ';' rule replaces earlier rules for its days; ',' continues the previous rule.
+            rule_days_seen: set = set()
+            for rule in _split_additional_rules(rule_group):
+                day_selector, time_spec = _split_rule(rule.strip())
+                if time_spec.strip() == "24/7":
+                    time_spec = "00:00-24:00"
+                days = _parse_days(day_selector) if day_selector else list(range(7))
+                if days is None:
+                    continue
+                spans = _parse_spans(time_spec)
+                for day in days:
+                    if day not in rule_days_seen or daily_spans[day] is None:
+                        daily_spans[day] = []
+                        rule_days_seen.add(day)
+                    daily_spans[day].extend(spans)
+
+        open_intervals = [
+            (day * MINUTES_PER_DAY + start, day * MINUTES_PER_DAY + end)
+            for day, spans in enumerate(daily_spans) if spans
+            for start, end in spans
+        ]
+        return WeeklySchedule(open_intervals)
+    except (OpeningHoursParseError, ValueError) as e:
+        logger.debug(f"Unsupported opening_hours value '{opening_hours}': {e}")
+        return None
+
+
+def _split_additional_rules(rule_group: str) -> List[str]:
+    """
+    Splits a rule group on ', ' only where the next part starts a new day selector,
+    so time lists like '10:00-14:00,16:00-20:00' stay intact.
+    """
+    parts = [part for part in re.split(r",\s+", rule_group)]
+    rules: List[str] = []
+    for part in parts:
+        if rules and _split_rule(part)[0] is None:
+            rules[-1] = f"{rules[-1]},{part}"
+        else:
+            rules.append(part)
+    return rules
+
+
+def estimate_utc_offset_minutes(lon: float) -> int:
+    """Rough solar offset from longitude, rounded to the nearest half hour."""
+    return int(round(lon / 15.0 * 2) / 2 * 60)
@@ -0,0 +1,256 @@
+# /backend/services/planning_service.py
+
+import asyncio
+import functools
+import logging
+import math
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from difflib import SequenceMatcher
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from core import constants
+
+logger = logging.getLogger(__name__)
+
+# NOTE: Everything in this module must stay pure and picklable. Functions here run
+# inside worker processes, so they may only depend on `core.constants`.
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+# --- Process Pool Management ---
+
+def init_process_pool(max_workers: Optional[int]) -> None:
+    """Creates the shared planning pool. A size of 0 keeps planning on the event loop."""
+    global _process_pool
+    if max_workers == 0:
+        logger.info("Planning process pool disabled; CPU-bound planning will run inline.")
+        return
+    # 'spawn' avoids forking a process that is running an event loop and open sockets.
+    _process_pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+    logger.info(f"Planning process pool started with {max_workers or os.cpu_count()} workers.")
+
+
+def shutdown_process_pool() -> None:
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+
+async def run_cpu_bound(func: Callable[..., Any], *args: Any, inline: bool = False) -> Any:
+    """
+    Runs a pure planning function in the process pool, or inline when no pool is
+    configured or the caller passes `inline` for inputs too small to be worth pickling.
+    """
+    if _process_pool is None or inline:
+        return func(*args)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_process_pool, functools.partial(func, *args))
+
+
+# --- Scoring Helpers ---
+
+def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    R = 6371
+    dLat = math.radians(lat2 - lat1)
+    dLon = math.radians(lon2 - lon1)
+    a = (math.sin(dLat / 2) * math.sin(dLat / 2) +
+         math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) *
+         math.sin(dLon / 2) * math.sin(dLon / 2))
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    distance = R * c
+    return distance
+
+
+def get_matched_preferences(tags: Dict[str, Any], user_prefs: List[str]) -> List[str]:
+    """
+    Determines which user preferences match a given set of OSM tags, in the order the
+    preferences are given (the first match is the candidate's primary preference).
+    """
+    matched = []
+    for pref in user_prefs:
+        if pref in constants.PREFERENCE_TO_OSM_SELECTOR:
+            selectors = constants.PREFERENCE_TO_OSM_SELECTOR[pref]
+            for selector in selectors:
+                # Basic parsing of Overpass-style selectors like '[key="value"]' or '[key]'
+                match = re.match(r'\[(\w+)(?:~"([^"]+)")?\]', selector)
+                if match:
+                    key, values_str = match.groups()
+                    if key in tags:
+                        if values_str:
+                            # Handles key~"value1|value2"
+                            possible_values = set(values_str.split('|'))
+                            if tags.get(key) in possible_values:
+                                if pref not in matched:
+                                    matched.append(pref)
+                                break  # Move to the next preference once one selector matches
+                        else:
+                            # Handles [key]
+                            if pref not in matched:
+                                matched.append(pref)
+                            break
+            if pref in matched:
+                continue # Skip other selectors for this pref if already matched
+    return matched
+
+# --- REVISED SCORING FUNCTION ---
+def get_candidate_score(
+    candidate: Dict[str, Any],
+    all_keywords: List[str],
+    matched_prefs: List[str],
+    distance_from_start: float,
+    fulfilled_preferences: Set[str],
+    added_activity_signatures: Set[str],
+    ideal_arrival_utc: datetime, # Kept for potential future use with timing scores
+    added_meal_times: Set[str] # Kept for meal diversity logic
+) -> int:
+    """
+    Calculates a candidate's score based on available OSM data, keywords, and user preferences.
+    This version is lightweight and does NOT rely on external API calls (like Google ratings).
+    """
+    score = 0
+    name_lower = (candidate.get('name') or '').lower()
+    tags = candidate.get('tags', {})
+    description = (candidate.get('description') or '').lower()
+    is_foodie = 'foodie' in matched_prefs
+    is_shopping = 'shopping' in matched_prefs
+    is_sightseeing_or_history = any(p in matched_prefs for p in ["sights", "history", "religious"])
+    is_park = 'park' in matched_prefs
+
+    # --- 1. Preference & Keyword Matching ---
+
+    # Big bonus if a user's specific keyword is in the place name (high relevance)
+    if any(re.search(re.escape(kw), name_lower, re.IGNORECASE) for kw in all_keywords):
+        score += constants.KEYWORD_DISCOVERY_BONUS
+
+    # Bonus for fulfilling a preference category for the first time
+    newly_fulfilled_prefs = set(matched_prefs) - fulfilled_preferences
+    if newly_fulfilled_prefs:
+        score += constants.PREFERENCE_COVERAGE_BONUS * len(newly_fulfilled_prefs)
+
+    # Smaller bonus for simply diversifying the plan
+    if matched_prefs and not fulfilled_preferences.intersection(matched_prefs):
+        score += constants.DIVERSIFICATION_BONUS
+
+    # --- 2. Notability & Quality Proxies (from OSM data) ---
+
+    # Having a Wikipedia tag is a strong indicator of notability
+    if 'wikipedia' in tags or 'wikidata' in tags:
+        if is_foodie: score += constants.WIKIPEDIA_NOTABILITY_BOOST_FOOD
+        elif is_shopping: score += constants.WIKIPEDIA_NOTABILITY_BOOST_SHOP
+        elif is_sightseeing_or_history: score += constants.SIGNIFICANCE_BONUS_SIGHTS
+        elif is_park: score += constants.SIGNIFICANCE_BONUS_PARK
+        else: score += 50 # Generic notability bonus
+
+    # Check for authenticity keywords in the description
+    if description:
+        if is_foodie and any(kw in description for kw in constants.AUTHENTICITY_KEYWORDS):
+            score += constants.AUTHENTICITY_KEYWORD_BOOST_FOOD
+        if is_shopping and any(kw in description for kw in constants.SHOPPING_AUTHENTICITY_KEYWORDS):
+            score += constants.SHOPPING_AUTHENTICITY_KEYWORD_BOOST
+
+    # --- 3. Preference-Specific Heuristics & Penalties ---
+
+    if is_foodie:
+        # Penalize generic international fast-food chains
+        if any(chain in name_lower for chain in constants.INTERNATIONAL_FOOD_CHAINS_EXCLUDE):
+            return -9999  # Disqualify immediately
+        # Penalize generic fast food tags
+        if tags.get('amenity') == 'fast_food':
+            score += constants.GENERIC_FAST_FOOD_PENALTY
+
+    if is_shopping:
+        # Heavily penalize common, non-touristy generic stores by name
+        if any(term in name_lower.split() for term in constants.GENERIC_STORE_MATCH_TERMS):
+            score += constants.GENERIC_STORE_KEYWORDS_PENALTY
+        # Boost specific, desirable shop types
+        shop_type = tags.get('shop')
+        if shop_type == 'mall': score += constants.SHOPPING_MALL_BOOST
+        elif shop_type in {'souvenir', 'gift', 'crafts', 'art'}: score += constants.SOUVENIR_GIFT_CRAFT_ART_BOOST
+        # Penalize generic shop tags that passed the name check
+        elif shop_type in {'general', 'department_store'}: score += constants.GENERAL_SHOP_PENALTY
+
+    # Penalize adding too many activities of the same specific type (e.g., two museums)
+    activity_signature = None
+    if matched_prefs:
+        # Create a signature like "history_museum" or "foodie_restaurant"
+        primary_pref = matched_prefs[0]
+        sub_type = tags.get('amenity') or tags.get('shop') or tags.get('leisure') or tags.get('historic')
+        if sub_type:
+            activity_signature = f"{primary_pref}_{sub_type}"
+            if activity_signature in added_activity_signatures:
+                score += constants.SIMILAR_ACTIVITY_PENALTY
+
+    # --- 4. Final Adjustments ---
+
+    # Penalize locations that are very far from the starting point
+    if distance_from_start > 5: # Penalize distances over 5 km
+        score -= int((distance_from_start - 5) * 50)
+
+    return score
+
+
+# --- Pool Entry Points ---
+
+def deduplicate_candidates(candidates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Groups candidates with near-identical names and keeps the one with the richest description."""
+    processed_candidates = []
+    temp_enriched_candidates = candidates[:]
+    while temp_enriched_candidates:
+        base_candidate = temp_enriched_candidates.pop(0)
+        base_name = (base_candidate.get("name") or "").lower().strip()
+
+        similar_group = [base_candidate]
+        remaining_candidates = []
+
+        for other_candidate in temp_enriched_candidates:
+            other_name = (other_candidate.get("name") or "").lower().strip()
+            if SequenceMatcher(None, base_name, other_name).ratio() > 0.85:
+                similar_group.append(other_candidate)
+            else:
+                remaining_candidates.append(other_candidate)
+
+        best_in_group = max(similar_group, key=lambda x: len(x.get("description") or ""))
+        processed_candidates.append(best_in_group)
+
+        temp_enriched_candidates = remaining_candidates
+    return processed_candidates
+
+
+def prepare_candidates(
+    candidates: List[Dict[str, Any]],
+    user_prefs: List[str],
+    start_coords: Tuple[float, float]
+) -> List[Dict[str, Any]]:
+    """
+    De-duplicates candidates and precomputes the per-candidate values that do not change
+    between greedy iterations (matched preferences and distance from the start).
+    """
+    prepared = deduplicate_candidates(candidates)
+    for cand in prepared:
+        cand["_matched_prefs"] = get_matched_preferences(cand.get("tags", {}), user_prefs)
+        cand["_distance_from_start"] = haversine_distance(start_coords[0], start_coords[1], cand["lat"], cand["lon"])
+    return prepared
+
+
+def rank_candidates(
+    candidates: List[Dict[str, Any]],
+    all_keywords: List[str],
+    fulfilled_preferences: Set[str],
+    added_activity_signatures: Set[str],
+    current_dt: datetime,
+    added_meal_times: Set[str],
+    limit: int
+) -> List[Tuple[int, Any]]:
+    """Scores prepared candidates and returns the best `limit` as (score, osm_id), highest first."""
+    scored_candidates = [
+        (get_candidate_score(cand, all_keywords, cand["_matched_prefs"], cand["_distance_from_start"], fulfilled_preferences, added_activity_signatures, current_dt, added_meal_times), cand["osm_id"])
+        for cand in candidates
+    ]
+    scored_candidates.sort(key=lambda x: x[0], reverse=True)
+    return scored_candidates[:limit]
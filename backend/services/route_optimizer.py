@@ -0,0 +1,281 @@
+# /backend/services/route_optimizer.py
+
+import math
+from typing import List, Optional, Sequence, Tuple
+
+# NOTE: Like planning_service, this module is pure so it can run in the planning
+# process pool. Routes are lists of matrix indexes whose first and last entries are
+# fixed, usually the trip's start (node 0) at both ends, e.g. [0, 3, 1, 2, 0].
+# Times are hours relative to when the route starts.
+
+TimeWindows = Optional[List[Tuple[float, float]]]
+Visit = Tuple[float, float, float]  # (arrival, service start, departure)
+
+
+# --- Route Evaluation ---
+
+def _service_start(arrival_hr: float, service_hrs: float, windows: TimeWindows, max_wait_hrs: Optional[float]) -> Optional[float]:
+    """Earliest time the full visit fits in an open window, or None if it never does."""
+    if windows is None:
+        return arrival_hr
+    for open_hr, close_hr in windows:
+        start_hr = max(arrival_hr, open_hr)
+        if max_wait_hrs is not None and start_hr - arrival_hr > max_wait_hrs:
+            return None
+        if start_hr + service_hrs <= close_hr + 1e-9:
+            return start_hr
+    return None
+
+
+def schedule_route(
+    route: Sequence[int],
+    durations: Sequence[Sequence[float]],
+    service_hrs: Sequence[float],
+    windows: Optional[Sequence[TimeWindows]] = None,
+    max_wait_hrs: Optional[float] = None,
+    start_hr: float = 0.0,
+) -> Optional[List[Visit]]:
+    """
+    Times every stop of a route. Waiting for a place to open is allowed up to
+    `max_wait_hrs`. Returns None when a time window cannot be met.
+    """
+    visits: List[Visit] = [(start_hr, start_hr, start_hr)]
+    clock = start_hr
+    for previous, node in zip(route, route[1:]):
+        arrival = clock + durations[previous][node]
+        if math.isinf(arrival):
+            return None
+        start = _service_start(arrival, service_hrs[node], windows[node] if windows else None, max_wait_hrs)
+        if start is None:
+            return None
+        clock = start + service_hrs[node]
+        visits.append((arrival, start, clock))
+    return visits
+
+
+def route_finish_hrs(
+    route: Sequence[int],
+    durations: Sequence[Sequence[float]],
+    service_hrs: Sequence[float],
+    windows: Optional[Sequence[TimeWindows]] = None,
+    max_wait_hrs: Optional[float] = None,
+) -> float:
+    """Arrival time at the route's end, or infinity if the route is infeasible."""
+    visits = schedule_route(route, durations, service_hrs, windows, max_wait_hrs)
+    return visits[-1][0] if visits else math.inf
+
+
+def route_cost(route: Sequence[int], leg_costs: Sequence[Sequence[float]], node_costs: Sequence[float]) -> float:
+    return sum(leg_costs[a][b] for a, b in zip(route, route[1:])) + sum(node_costs[node] for node in route[1:-1])
+
+
+# --- Insertion ---
+
+def cheapest_insertion(
+    route: List[int],
+    new_nodes: Sequence[int],
+    durations: Sequence[Sequence[float]],
+    service_hrs: Sequence[float],
+    horizon_hrs: float,
+    windows: Optional[Sequence[TimeWindows]] = None,
+    max_wait_hrs: Optional[float] = None,
+    leg_costs: Optional[Sequence[Sequence[float]]] = None,
+    node_costs: Optional[Sequence[float]] = None,
+    budget: Optional[float] = None,
+) -> Tuple[List[int], List[int]]:
+    """
+    Repeatedly places the (node, position) pair that delays the return to the start
+    the least, keeping the route within `horizon_hrs` and `budget`.
+    Returns the new route and the nodes that could not be placed.
+    """
+    route = list(route)
+    pending = list(new_nodes)
+    check_budget = budget is not None and leg_costs is not None and node_costs is not None
+    current_cost = route_cost(route, leg_costs, node_costs) if check_budget else 0.0
+
+    while pending:
+        best: Optional[Tuple[float, int, int, float]] = None  # (finish, node, position, cost)
+        for node in pending:
+            for position in range(1, len(route)):
+                if check_budget:
+                    a, b = route[position - 1], route[position]
+                    cost = current_cost - leg_costs[a][b] + leg_costs[a][node] + leg_costs[node][b] + node_costs[node]
+                    if cost > budget + 1e-9:
+                        continue
+                else:
+                    cost = 0.0
+                candidate = route[:position] + [node] + route[position:]
+                finish = route_finish_hrs(candidate, durations, service_hrs, windows, max_wait_hrs)
+                if finish > horizon_hrs + 1e-9:
+                    continue
+                if best is None or finish < best[0]:
+                    best = (finish, node, position, cost)
+        if best is None:
+            break
+        _, node, position, current_cost = best
+        route.insert(position, node)
+        pending.remove(node)
+
+    return route, pending
+
+
+# --- Reordering ---
+
+def route_travel_hrs(route: Sequence[int], durations: Sequence[Sequence[float]]) -> float:
+    return sum(durations[a][b] for a, b in zip(route, route[1:]))
+
+
+def _held_karp(
+    start_node: int,
+    nodes: Sequence[int],
+    end_node: int,
+    durations: Sequence[Sequence[float]],
+    service_hrs: Sequence[float],
+    horizon_hrs: float,
+    windows: Optional[Sequence[TimeWindows]],
+    max_wait_hrs: Optional[float],
+) -> Optional[List[int]]:
+    """
+    Exact DP over subsets. With time windows a state keeps every label that is not
+    dominated on both travel time and clock, so the optimum is never pruned.
+    """
+    # labels[(mask, last)] -> [(travel, clock, path)]
+    labels = {(0, start_node): [(0.0, 0.0, (start_node,))]}
+    for _ in range(len(nodes)):
+        next_labels = {}
+        for (mask, last), entries in labels.items():
+            for bit, node in enumerate(nodes):
+                if mask & (1 << bit):
+                    continue
+                for travel, clock, path in entries:
+                    arrival = clock + durations[last][node]
+                    start = _service_start(arrival, service_hrs[node], windows[node] if windows else None, max_wait_hrs)
+                    if start is None:
+                        continue
+                    new_clock = start + service_hrs[node]
+                    if new_clock + durations[node][end_node] > horizon_hrs + 1e-9:
+                        continue
+                    _add_label(next_labels.setdefault((mask | (1 << bit), node), []), (travel + durations[last][node], new_clock, path + (node,)))
+        labels = next_labels
+
+    best: Optional[Tuple[float, float, Tuple[int, ...]]] = None
+    for (_, last), entries in labels.items():
+        for travel, clock, path in entries:
+            total, finish = travel + durations[last][end_node], clock + durations[last][end_node]
+            if finish <= horizon_hrs + 1e-9 and (best is None or (total, finish) < best[:2]):
+                best = (total, finish, path)
+    return list(best[2]) + [end_node] if best else None
+
+
+def _add_label(entries: List[Tuple[float, float, Tuple[int, ...]]], label: Tuple[float, float, Tuple[int, ...]]) -> None:
+    travel, clock, _ = label
+    if any(t <= travel + 1e-9 and c <= clock + 1e-9 for t, c, _ in entries):
+        return
+    entries[:] = [entry for entry in entries if not (travel <= entry[0] and clock <= entry[1])]
+    entries.append(label)
+
+
+def _local_search(
+    route: List[int],
+    durations: Sequence[Sequence[float]],
+    service_hrs: Sequence[float],
+    horizon_hrs: float,
+    windows: Optional[Sequence[TimeWindows]],
+    max_wait_hrs: Optional[float],
+    max_rounds: int = 50,
+) -> List[int]:
+    """2-opt and or-opt moves (segments of 1-3 stops), accepted while they shorten travel and stay feasible."""
+    def feasible(candidate: List[int]) -> bool:
+        return route_finish_hrs(candidate, durations, service_hrs, windows, max_wait_hrs) <= horizon_hrs + 1e-9
+
+    best_travel = route_travel_hrs(route, durations)
+    for _ in range(max_rounds):
+        improved = False
+        inner = len(route) - 1
+        # 2-opt: reverse route[i..j]
+        for i in range(1, inner - 1):
+            for j in range(i + 1, inner):
+                candidate = route[:i] + route[i:j + 1][::-1] + route[j + 1:]
+                travel = route_travel_hrs(candidate, durations)
+                if travel < best_travel - 1e-9 and feasible(candidate):
+                    route, best_travel, improved = candidate, travel, True
+        # or-opt: move a short segment elsewhere
+        for length in (1, 2, 3):
+            for i in range(1, inner - length + 1):
+                segment = route[i:i + length]
+                remainder = route[:i] + route[i + length:]
+                for position in range(1, len(remainder)):
+                    if position == i:
+                        continue
+                    candidate = remainder[:position] + segment + remainder[position:]
+                    travel = route_travel_hrs(candidate, durations)
+                    if travel < best_travel - 1e-9 and feasible(candidate):
+                        route, best_travel, improved = candidate, travel, True
+                        break
+        if not improved:
+            break
+    return route
+
+
+def optimize_route(
+    route: List[int],
+    durations: Sequence[Sequence[float]],
+    service_hrs: Sequence[float],
+    horizon_hrs: float,
+    windows: Optional[Sequence[TimeWindows]] = None,
+    max_wait_hrs: Optional[float] = None,
+    exact_max_stops: int = 9,
+) -> List[int]:
+    """
+    Reorders the stops of `route` to minimise travel time while keeping every time
+    window and the horizon. Small routes are solved exactly, larger ones improved
+    locally from the given order. Never returns a route with more travel than `route`.
+    """
+    nodes = route[1:-1]
+    if len(nodes) < 2:
+        return list(route)
+    if len(nodes) <= exact_max_stops:
+        candidate = _held_karp(route[0], nodes, route[-1], durations, service_hrs, horizon_hrs, windows, max_wait_hrs)
+    else:
+        candidate = _local_search(list(route), durations, service_hrs, horizon_hrs, windows, max_wait_hrs)
+    if candidate is None or route_travel_hrs(candidate, durations) >= route_travel_hrs(route, durations) - 1e-9:
+        return list(route)
+    return candidate
+
+
+# --- Replanning ---
+
+def replan_route(
+    start_node: int,
+    end_node: int,
+    planned_nodes: Sequence[int],
+    candidate_nodes: Sequence[int],
+    durations: Sequence[Sequence[float]],
+    service_hrs: Sequence[float],
+    horizon_hrs: float,
+    windows: Optional[Sequence[TimeWindows]] = None,
+    max_wait_hrs: Optional[float] = None,
+    leg_costs: Optional[Sequence[Sequence[float]]] = None,
+    node_costs: Optional[Sequence[float]] = None,
+    budget: Optional[float] = None,
+    exact_max_stops: int = 9,
+) -> Tuple[List[int], List[int]]:
+    """
+    Keeps the planned stops that still fit (in their planned order), reorders them,
+    then tops the route up with candidates taken in the given priority order.
+    Returns the route and the planned stops that had to be dropped.
+    """
+    route, dropped = [start_node, end_node], []
+    for node in planned_nodes:
+        candidate = route[:-1] + [node] + route[-1:]
+        if route_finish_hrs(candidate, durations, service_hrs, windows, max_wait_hrs) <= horizon_hrs + 1e-9:
+            route = candidate
+        else:
+            dropped.append(node)
+    route = optimize_route(route, durations, service_hrs, horizon_hrs, windows, max_wait_hrs, exact_max_stops)
+
+    if budget is not None and leg_costs is not None and node_costs is not None:
+        budget = max(budget, route_cost(route, leg_costs, node_costs))
+    for node in candidate_nodes:
+        route, _ = cheapest_insertion(route, [node], durations, service_hrs, horizon_hrs, windows, max_wait_hrs, leg_costs, node_costs, budget)
+    return route, dropped
@@ -0,0 +1,97 @@
+# /backend/services/suitability_service.py
+
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Any, Dict, List
+
+import google.generativeai as genai
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core import constants
+from models.all_models import PlaceSuitabilityVerdict
+from services import ai_service
+
+logger = logging.getLogger(__name__)
+
+# Whether a place is worth a tourist's visit does not depend on who is asking, so the
+# AI's verdict is stored per osm_id and applied to candidates before planning. Only
+# places without a stored verdict are sent to the AI, in batches.
+
+_KIND_TAGS = ("tourism", "historic", "amenity", "shop", "leisure")
+
+
+def _place_kind(candidate: Dict[str, Any]) -> str:
+    tags = candidate.get("tags") or {}
+    return next((f"{tag}={tags[tag]}" for tag in _KIND_TAGS if tags.get(tag)), "place")
+
+
+async def _load_verdicts(db: AsyncSession, osm_ids: List[int]) -> Dict[int, bool]:
+    if not osm_ids:
+        return {}
+    stmt = select(PlaceSuitabilityVerdict.osm_id, PlaceSuitabilityVerdict.is_suitable).where(
+        PlaceSuitabilityVerdict.osm_id.in_(osm_ids),
+        PlaceSuitabilityVerdict.expires_at > datetime.now(dt_timezone.utc),
+    )
+    return {osm_id: is_suitable for osm_id, is_suitable in (await db.execute(stmt)).all()}
+
+
+async def _store_verdicts(db: AsyncSession, verdicts: Dict[int, bool], names: Dict[int, str]) -> None:
+    """Upserts the verdicts inside a savepoint; the caller's commit makes them durable."""
+    if not verdicts:
+        return
+    now = datetime.now(dt_timezone.utc)
+    expires_at = now + timedelta(days=constants.SUITABILITY_VERDICT_TTL_DAYS)
+    values = [
+        {"osm_id": osm_id, "name": names.get(osm_id), "is_suitable": is_suitable, "judged_at": now, "expires_at": expires_at}
+        for osm_id, is_suitable in verdicts.items()
+    ]
+    stmt = pg_insert(PlaceSuitabilityVerdict).values(values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[PlaceSuitabilityVerdict.osm_id],
+        set_={"name": stmt.excluded.name, "is_suitable": stmt.excluded.is_suitable, "judged_at": stmt.excluded.judged_at, "expires_at": stmt.excluded.expires_at},
+    )
+    try:
+        async with db.begin_nested():
+            await db.execute(stmt)
+    except Exception as e:
+        logger.warning(f"Could not store {len(values)} suitability verdict(s): {e}")
+
+
+async def filter_suitable_candidates(
+    db: AsyncSession,
+    gemini_model: genai.GenerativeModel,
+    candidates: List[Dict[str, Any]],
+    city: str
+) -> List[Dict[str, Any]]:
+    """
+    Drops candidates judged unsuitable for tourists. Places the AI has never judged are
+    sent in batches of `SUITABILITY_BATCH_SIZE`; if that fails they are kept.
+    """
+    osm_ids = [cand["osm_id"] for cand in candidates if cand.get("osm_id") is not None]
+    try:
+        verdicts = await _load_verdicts(db, osm_ids)
+    except Exception as e:
+        logger.warning(f"Suitability verdict lookup failed, judging every candidate: {e}")
+        verdicts = {}
+
+    unjudged = [
+        {"osm_id": cand["osm_id"], "name": cand["name"], "kind": _place_kind(cand)}
+        for cand in candidates if cand.get("osm_id") is not None and cand["osm_id"] not in verdicts
+    ]
+    logger.info(f"Suitability verdicts: {len(verdicts)} known, {len(unjudged)} to judge.")
+    if unjudged and gemini_model:
+        batch_size = constants.SUITABILITY_BATCH_SIZE
+        batches = [unjudged[i:i + batch_size] for i in range(0, len(unjudged), batch_size)]
+        new_verdicts: Dict[int, bool] = {}
+        for batch_verdicts in await asyncio.gather(*(ai_service.judge_places_suitability(gemini_model, city, batch) for batch in batches)):
+            new_verdicts.update(batch_verdicts or {})
+        await _store_verdicts(db, new_verdicts, {place["osm_id"]: place["name"] for place in unjudged})
+        verdicts.update(new_verdicts)
+
+    suitable = [cand for cand in candidates if verdicts.get(cand.get("osm_id"), True)]
+    if len(suitable) < len(candidates):
+        logger.info(f"Filtered out {len(candidates) - len(suitable)} candidates judged unsuitable for tourists.")
+    return suitable
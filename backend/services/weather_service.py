@@ -1,154 +1,234 @@
 # /backend/services/weather_service.py (Corrected for Time Accuracy)
 
+import asyncio
 import logging
-from datetime import datetime, timezone as dt_timezone, timedelta
+import math
+import time
+from datetime import datetime, timezone as dt_timezone, timedelta, date
 import httpx
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
 import google.generativeai as genai
 
 from schemas import itinerary_schemas
+from core import cache, constants, singleflight
+from core.ai_bulkhead import guarded_generation
+from core.ai_cache import cached_generation
 from core.constants import DEFAULT_WEATHER_CONDITION_OBJ, WMO_CODE_DESCRIPTIONS_DICT
 
 logger = logging.getLogger(__name__)
 
+# Forecasts are fetched for a rounded grid cell and cached one UTC day per entry, so
+# nearby trips share them and a trip's whole time span comes from a single series.
+# Weather sentences are written for a coarse bucket (condition, temperature band,
+# rain, wind, time of day) rather than exact readings, so the AI cache can reuse them;
+# a template covers cache misses the AI cannot answer.
 
+HOURLY_FIELDS = ("temperature_2m", "apparent_temperature", "precipitation_probability", "weathercode", "wind_speed_10m", "is_day")
+AI_SENTENCE_TIMEOUT_SECONDS = 10.0
+
+
+def _grid_cell(latitude: float, longitude: float) -> Tuple[float, float]:
+    step = constants.WEATHER_GRID_DEGREES
+    return round(round(latitude / step) * step, 4), round(round(longitude / step) * step, 4)
+
+
+def _forecast_ttl_seconds(now: Optional[float] = None) -> int:
+    """Seconds until the next forecast run is expected to be published."""
+    now = time.time() if now is None else now
+    cycle = constants.WEATHER_FORECAST_UPDATE_HOURS * 3600
+    next_update = (math.floor(now / cycle) + 1) * cycle + constants.WEATHER_FORECAST_PUBLISH_DELAY_MINUTES * 60
+    return max(int(next_update - now), constants.WEATHER_FORECAST_MIN_TTL_SECONDS)
+
+
+def _day_key(cell: Tuple[float, float], day: date) -> str:
+    return f"weather_grid:{cell[0]}:{cell[1]}:{day.isoformat()}"
+
+
+def _day_start_epoch(day: date) -> int:
+    return int(datetime(day.year, day.month, day.day, tzinfo=dt_timezone.utc).timestamp())
+
+
+async def _fetch_days(cell: Tuple[float, float], days: List[date], http_client: httpx.AsyncClient) -> Dict[str, Dict[str, list]]:
+    """One Open-Meteo request covering `days`, split into 24-hour UTC slices keyed by ISO date."""
+    params = {
+        "latitude": cell[0],
+        "longitude": cell[1],
+        "hourly": ",".join(HOURLY_FIELDS),
+        "start_date": min(days).isoformat(),
+        "end_date": max(days).isoformat(),
+        "timezone": "GMT",
+        "timeformat": "unixtime",
+    }
+    response = await http_client.get(constants.OPEN_METEO_FORECAST_URL, params=params)
+    response.raise_for_status()
+    hourly_data = response.json().get("hourly", {})
+    times = hourly_data.get("time", [])
+    if not times:
+        logger.warning("Weather API response missing hourly data.")
+        return {}
+
+    fetched = {}
+    for day in days:
+        first = (_day_start_epoch(day) - times[0]) // 3600
+        if first < 0 or first + 24 > len(times):
+            continue
+        fetched[day.isoformat()] = {field: (hourly_data.get(field) or [None] * len(times))[first:first + 24] for field in HOURLY_FIELDS}
+    return fetched
+
+
+async def get_hourly_series(
+    latitude: float,
+    longitude: float,
+    start_dt_utc: datetime,
+    end_dt_utc: datetime,
+    http_client: httpx.AsyncClient
+) -> Optional[Dict[str, Any]]:
+    """
+    Returns {"start": epoch seconds of the first hour, "hourly": {field: values}} for
+    every hour of the UTC days spanned by the trip. Cached days are reused; the
+    missing ones are fetched together.
+    """
+    cell = _grid_cell(latitude, longitude)
+    first_day, last_day = start_dt_utc.astimezone(dt_timezone.utc).date(), end_dt_utc.astimezone(dt_timezone.utc).date()
+    days = [first_day + timedelta(days=offset) for offset in range((last_day - first_day).days + 1)]
+    cached = dict(zip(days, await asyncio.gather(*(cache.get_json(_day_key(cell, day)) for day in days))))
+
+    missing = [day for day in days if cached[day] is None]
+    if missing:
+        if not http_client:
+            logger.warning("Weather forecast: HTTP client not available.")
+            return None
+        # Concurrent trips in the same cell and days share one upstream call.
+        fetched = await singleflight.run(
+            f"open_meteo:{cell}:{','.join(day.isoformat() for day in missing)}",
+            lambda: _fetch_days(cell, missing, http_client),
+            share_across_processes=True,
+        )
+        ttl_seconds = _forecast_ttl_seconds()
+        for day in missing:
+            if day.isoformat() in fetched:
+                cached[day] = fetched[day.isoformat()]
+                await cache.set_json(_day_key(cell, day), cached[day], ttl_seconds)
+        logger.info(f"Weather: fetched {len(fetched)}/{len(missing)} day(s) for grid cell {cell}; {len(days) - len(missing)} cached.")
+
+    if any(cached[day] is None for day in days):
+        return None
+    return {
+        "start": _day_start_epoch(first_day),
+        "hourly": {field: [value for day in days for value in cached[day][field]] for field in HOURLY_FIELDS},
+    }
+
+
+def _time_of_day(local_hour: int) -> str:
+    return "Morning" if 5 <= local_hour < 12 else "Afternoon" if 12 <= local_hour < 17 else "Evening" if 17 <= local_hour < 21 else "Night"
+
+
+def forecasts_at(
+    series: Optional[Dict[str, Any]],
+    times_utc: List[Optional[datetime]],
+    utc_offset_minutes: int
+) -> List[Optional[itinerary_schemas.WeatherForecast]]:
+    """
+    The forecast for the hour nearest to each time. The series is evenly spaced, so each
+    lookup is an index computation rather than a search; times outside it give None.
+    """
+    if not series:
+        return [None] * len(times_utc)
+    hourly = series["hourly"]
+    hours = len(hourly["temperature_2m"])
+    forecasts: List[Optional[itinerary_schemas.WeatherForecast]] = []
+    for when in times_utc:
+        idx = round((when.timestamp() - series["start"]) / 3600) if when else -1
+        if not (0 <= idx < hours) or hourly["temperature_2m"][idx] is None:
+            forecasts.append(None)
+            continue
+        raw_code = hourly["weathercode"][idx]
+        condition = WMO_CODE_DESCRIPTIONS_DICT.get(raw_code, DEFAULT_WEATHER_CONDITION_OBJ)
+        local_hour = (datetime.fromtimestamp(series["start"] + idx * 3600, dt_timezone.utc) + timedelta(minutes=utc_offset_minutes)).hour
+        forecasts.append(itinerary_schemas.WeatherForecast(
+            temperature_celsius=hourly["temperature_2m"][idx],
+            feels_like_celsius=hourly["apparent_temperature"][idx] if hourly["apparent_temperature"][idx] is not None else hourly["temperature_2m"][idx],
+            precipitation_probability_percent=hourly["precipitation_probability"][idx] or 0,
+            wind_speed_kmh=hourly["wind_speed_10m"][idx] or 0.0,
+            condition=itinerary_schemas.WeatherCondition(description=condition.description, icon_char=condition.icon_char),
+            raw_code=raw_code if raw_code is not None else -1,
+            is_day=hourly["is_day"][idx],
+            time_of_day_descriptor=_time_of_day(local_hour),
+        ))
+    return forecasts
+
+
+# --- Weather Sentences ---
+
+def _temperature_band(temp_c: float) -> str:
+    return next((label for upper, label in constants.WEATHER_TEMPERATURE_BANDS if temp_c < upper), "hot")
+
+
+def weather_bucket(forecast: itinerary_schemas.WeatherForecast) -> Dict[str, Any]:
+    """The coarse description a weather sentence is written for."""
+    day_night = "daytime" if forecast.is_day == 1 else "nighttime" if forecast.is_day == 0 else ""
+    return {
+        "condition": forecast.condition.description.lower(),
+        "temperature": _temperature_band(forecast.temperature_celsius),
+        "rainy": forecast.precipitation_probability_percent > constants.WEATHER_RAIN_PROBABILITY_THRESHOLD,
+        "windy": forecast.wind_speed_kmh > constants.WEATHER_WINDY_KMH,
+        "time_of_day": (forecast.time_of_day_descriptor or day_night).lower(),
+    }
+
+
+def template_weather_sentence(bucket: Dict[str, Any]) -> str:
+    if bucket["rainy"]:
+        advice = "so pack an umbrella"
+    elif bucket["windy"]:
+        advice = "so hold on to your hat"
+    elif bucket["temperature"] == "hot":
+        advice = "so stay hydrated and seek some shade"
+    elif bucket["temperature"] in ("cold", "cool"):
+        advice = "so bring a warm layer"
+    else:
+        advice = "perfect for exploring"
+    when = f" this {bucket['time_of_day']}" if bucket["time_of_day"] else ""
+    return f"Expect {bucket['condition']} and {bucket['temperature']} weather{when}, {advice}!"
+
+
+@guarded_generation("weather_sentence")
+@cached_generation("weather_sentence")
 async def generate_weather_ai_sentence(
     gemini_model: genai.GenerativeModel,
-    condition_desc: str,
-    temp_c: float,
-    is_day: Optional[int],
-    time_of_day: Optional[str],
-    precip_prob: int,
-    wind_kmh: float
+    bucket: Dict[str, Any]
 ) -> Optional[str]:
-    """Generates a friendly weather summary sentence using the AI model."""
+    """Generates a friendly weather summary sentence for a weather bucket using the AI model."""
     if not gemini_model:
-        logger.warning("Gemini client not provided for weather sentence generation.")
         return None
 
-    day_night_info = "daytime" if is_day == 1 else "nighttime" if is_day == 0 else ""
     prompt_parts = [
         "You are 'Cabito', an AI travel assistant providing a very short, friendly weather update.",
-        f"The current weather is: {condition_desc.lower()}. Temperature: around {temp_c:.0f}°C.",
-        f"It's currently {time_of_day.lower() if time_of_day else day_night_info}."
+        f"The current weather is: {bucket['condition']}. Temperature: {bucket['temperature']}.",
     ]
-    if precip_prob > 40:
-        prompt_parts.append(f"There's a {precip_prob}% chance of rain.")
-    if wind_kmh > 15:
-        prompt_parts.append(f"It's a bit windy ({wind_kmh:.0f} km/h).")
-    prompt_parts.append("Generate a single, concise, friendly, and slightly witty sentence (max 20-25 words) advising the user.")
+    if bucket["time_of_day"]:
+        prompt_parts.append(f"It's currently {bucket['time_of_day']}.")
+    if bucket["rainy"]:
+        prompt_parts.append("There's a good chance of rain.")
+    if bucket["windy"]:
+        prompt_parts.append("It's a bit windy.")
+    prompt_parts.append("Generate a single, concise, friendly, and slightly witty sentence (max 20-25 words) advising the user. Do not mention exact numbers.")
 
     weather_prompt = "\n".join(prompt_parts)
 
     try:
         gen_config = genai.types.GenerationConfig(candidate_count=1, max_output_tokens=60, temperature=0.7)
-        response = await gemini_model.generate_content_async(weather_prompt, generation_config=gen_config)
+        coro = gemini_model.generate_content_async(weather_prompt, generation_config=gen_config)
+        response = await asyncio.wait_for(coro, timeout=AI_SENTENCE_TIMEOUT_SECONDS)
         return response.text.strip() if response.text else None
+    except asyncio.TimeoutError:
+        logger.warning("Gemini weather sentence timed out.")
     except Exception as e:
         logger.error(f"Gemini weather sentence error: {e}")
-        return None
-
-
-async def get_weather_forecast(
-    latitude: float,
-    longitude: float,
-    itinerary_start_dt_utc: datetime,
-    http_client: httpx.AsyncClient,
-    gemini_model: genai.GenerativeModel
-) -> Optional[itinerary_schemas.WeatherForecast]:
-    """Fetches and processes weather forecast data from the Open-Meteo API."""
-    if not http_client:
-        logger.warning("Weather forecast: HTTP client not available.")
-        return None
-
-    date_str = itinerary_start_dt_utc.strftime("%Y-%m-%d")
-    base_url = "https://api.open-meteo.com/v1/forecast"
-    params = {
-        "latitude": latitude,
-        "longitude": longitude,
-        "hourly": "temperature_2m,apparent_temperature,precipitation_probability,weathercode,wind_speed_10m,is_day",
-        "start_date": date_str,
-        "end_date": date_str,
-        "timezone": "auto"
-    }
-
-    try:
-        response = await http_client.get(base_url, params=params)
-        response.raise_for_status()
-        data = response.json()
+    return None
 
-        hourly_data = data.get("hourly", {})
-        times = hourly_data.get("time", [])
-        utc_offset_seconds = data.get("utc_offset_seconds", 0)
 
-        if not times:
-            logger.warning("Weather API response missing hourly data.")
-            return None
-
-        # --- REFINED LOGIC for finding the correct forecast hour ---
-        local_tz = dt_timezone(timedelta(seconds=utc_offset_seconds))
-        start_time_local = itinerary_start_dt_utc.astimezone(local_tz)
-        
-        # Round the user's start time to the nearest hour to match the API's hourly forecast
-        target_hour_dt = start_time_local.replace(minute=0, second=0, microsecond=0)
-        if start_time_local.minute >= 30:
-            target_hour_dt += timedelta(hours=1)
-        
-        target_time_str = target_hour_dt.strftime('%Y-%m-%dT%H:%M')
-        
-        try:
-            relevant_idx = times.index(target_time_str)
-        except ValueError:
-            logger.warning(f"Could not find exact weather match for {target_time_str}, falling back to closest time.")
-            hourly_datetimes_local = [datetime.fromisoformat(t).replace(tzinfo=local_tz) for t in times]
-            time_diffs = [abs(itinerary_start_dt_utc - dt) for dt in hourly_datetimes_local]
-            relevant_idx = time_diffs.index(min(time_diffs))
-        # --- END REFINED LOGIC ---
-
-        if not (0 <= relevant_idx < len(times)):
-             logger.error("Weather data processing failed: relevant_idx is out of bounds.")
-             return None
-
-        local_hour_dt = datetime.fromisoformat(times[relevant_idx])
-        local_hour = local_hour_dt.hour
-        time_of_day_descriptor = "Morning" if 5 <= local_hour < 12 else "Afternoon" if 12 <= local_hour < 17 else "Evening" if 17 <= local_hour < 21 else "Night"
-
-        temp_c_val = hourly_data.get("temperature_2m")[relevant_idx]
-        precip_prob_val = hourly_data.get("precipitation_probability")[relevant_idx]
-        wind_kmh_val = hourly_data.get("wind_speed_10m")[relevant_idx]
-        raw_code = hourly_data.get("weathercode")[relevant_idx]
-        current_is_day = hourly_data.get("is_day")[relevant_idx]
-        condition = WMO_CODE_DESCRIPTIONS_DICT.get(raw_code, DEFAULT_WEATHER_CONDITION_OBJ)
-
-        ai_sentence = await generate_weather_ai_sentence(
-            gemini_model=gemini_model,
-            condition_desc=condition.description,
-            temp_c=temp_c_val,
-            is_day=current_is_day,
-            time_of_day=time_of_day_descriptor,
-            precip_prob=precip_prob_val,
-            wind_kmh=wind_kmh_val
-        )
-
-        return itinerary_schemas.WeatherForecast(
-            temperature_celsius=temp_c_val,
-            feels_like_celsius=hourly_data.get("apparent_temperature")[relevant_idx],
-            precipitation_probability_percent=precip_prob_val,
-            wind_speed_kmh=wind_kmh_val,
-            condition=itinerary_schemas.WeatherCondition(
-                description=condition.description,
-                icon_char=condition.icon_char
-            ),
-            raw_code=raw_code,
-            is_day=current_is_day,
-            time_of_day_descriptor=time_of_day_descriptor,
-            ai_weather_sentence=ai_sentence,
-        )
-    except httpx.HTTPStatusError as e:
-        logger.error(f"HTTP error fetching weather: {e.response.status_code}", exc_info=True)
-    except (KeyError, IndexError) as e:
-        logger.error(f"Error processing weather data, likely missing key or index: {e}", exc_info=True)
-    except Exception as e:
-        logger.error(f"An unexpected error occurred while processing weather data: {e}", exc_info=True)
+async def weather_sentence(gemini_model: genai.GenerativeModel, forecast: itinerary_schemas.WeatherForecast) -> str:
+    """An AI sentence for the forecast's bucket (usually cached), or the template one."""
+    bucket = weather_bucket(forecast)
+    return await generate_weather_ai_sentence(gemini_model, bucket) or template_weather_sentence(bucket)
 
-    return None
\ No newline at end of file
@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+
+from ..core import ai_bulkhead
+from ..core.fake_gemini import FakeGenerativeModel
+
+
+@pytest.mark.asyncio
+async def test_bulkhead_admits_waiters_by_priority():
+    bulkhead = ai_bulkhead.PriorityBulkhead(limit=1)
+    await bulkhead.acquire(ai_bulkhead.PRIORITIES["normal"])
+    admitted = []
+
+    async def call(priority_name):
+        await bulkhead.acquire(ai_bulkhead.PRIORITIES[priority_name])
+        admitted.append(priority_name)
+        bulkhead.release()
+
+    waiters = [asyncio.create_task(call("decorative")), asyncio.create_task(call("critical"))]
+    await asyncio.sleep(0)
+    assert bulkhead.waiting == 2
+    bulkhead.release()
+    await asyncio.gather(*waiters)
+
+    assert admitted == ["critical", "decorative"]
+    assert bulkhead.active == 0
+
+
+@pytest.mark.asyncio
+async def test_spent_budget_refuses_non_critical_calls_only(monkeypatch):
+    monkeypatch.setattr(ai_bulkhead.constants, "AI_TOKEN_BUDGET_PER_REQUEST", 1)
+    model = FakeGenerativeModel(latency_ms=0)
+
+    async def run():
+        await ai_bulkhead.begin_request(None)
+        critical = ai_bulkhead._GuardedModel(model, "local_keywords")
+        decorative = ai_bulkhead._GuardedModel(model, "weather_sentence")
+        await critical.generate_content_async("first call spends the budget")
+        await critical.generate_content_async("critical calls still run")
+        with pytest.raises(ai_bulkhead.AiBudgetExhausted):
+            await decorative.generate_content_async("You are 'Cabito', a friendly weather update.")
+
+    await asyncio.create_task(run())
+    assert model.stats()["calls"] == 2
@@ -0,0 +1,83 @@
+import asyncio
+
+import google.generativeai as genai
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from ..core import ai_cache
+
+
+@ai_cache.cached_generation("test_fn")
+async def _ask(gemini_model, prompt, temperature):
+    config = genai.types.GenerationConfig(candidate_count=1, temperature=temperature)
+    response = await gemini_model.generate_content_async(prompt, generation_config=config)
+    return response.text
+
+
+@pytest.mark.asyncio
+async def test_cached_generation_reuses_answers_for_normalized_prompts(monkeypatch):
+    monkeypatch.setattr(ai_cache.cache, "_local", type(ai_cache.cache._local)())
+    monkeypatch.setattr(ai_cache, "_stats", {})
+    monkeypatch.setattr(ai_cache.constants, "AI_CACHE_VARIANTS", {})
+    gemini_model = MagicMock(model_name="models/test")
+    gemini_model.generate_content_async = AsyncMock(side_effect=lambda *a, **k: MagicMock(text=f"answer {gemini_model.generate_content_async.await_count}"))
+
+    assert await _ask(gemini_model, "Title for  Lucknow\n", 0.2) == "answer 1"
+    assert await _ask(gemini_model, "Title for Lucknow", 0.2) == "answer 1"
+    assert await _ask(gemini_model, "Title for Lucknow", 0.3) == "answer 2"
+    # Creative calls are not cached unless variants are enabled.
+    assert await _ask(gemini_model, "Title for Lucknow", 0.9) == "answer 3"
+    assert await _ask(gemini_model, "Title for Lucknow", 0.9) == "answer 4"
+
+    monkeypatch.setattr(ai_cache.constants, "AI_CACHE_VARIANTS", {"test_fn": 2})
+    answers = {await _ask(gemini_model, "Tip for Hazratganj", 0.9) for _ in range(6)}
+    assert answers == {"answer 5", "answer 6"}
+    assert ai_cache.stats()["test_fn"] == {"hits": 5, "misses": 4, "bypassed": 2, "hit_rate": 0.556}
+
+
+@pytest.mark.asyncio
+async def test_variant_slots_fill_with_repeated_answers_and_merge_concurrent_ones(monkeypatch):
+    monkeypatch.setattr(ai_cache.cache, "_local", type(ai_cache.cache._local)())
+    monkeypatch.setattr(ai_cache.constants, "AI_CACHE_VARIANTS", {"test_fn": 2})
+    gemini_model = MagicMock(model_name="models/test")
+    gemini_model.generate_content_async = AsyncMock(return_value=MagicMock(text="same every time"))
+
+    for _ in range(4):
+        assert await _ask(gemini_model, "Tip for Chowk", 0.9) == "same every time"
+    # Two misses fill both slots even though the answers are identical.
+    assert gemini_model.generate_content_async.await_count == 2
+
+    # A variant stored by another worker while this miss was generating is kept.
+    monkeypatch.setattr(ai_cache.cache, "_local", type(ai_cache.cache._local)())
+    monkeypatch.setattr(ai_cache.constants, "AI_CACHE_VARIANTS", {"test_fn": 3})
+    gemini_model.generate_content_async = AsyncMock(return_value=MagicMock(text="first"))
+    await _ask(gemini_model, "Tip for Aminabad", 0.9)
+    [key] = list(ai_cache.cache._local)
+
+    async def answer_while_another_worker_stores(*args, **kwargs):
+        await ai_cache.cache.set_json(key, {"texts": ["first", "from another worker"], "slots": 2}, 60)
+        return MagicMock(text="mine")
+
+    gemini_model.generate_content_async = AsyncMock(side_effect=answer_while_another_worker_stores)
+    await _ask(gemini_model, "Tip for Aminabad", 0.9)
+    assert await ai_cache.cache.get_json(key) == {"texts": ["first", "from another worker", "mine"], "slots": 3}
+
+
+@pytest.mark.asyncio
+async def test_a_spent_budget_in_the_flight_leader_does_not_refuse_its_followers(monkeypatch):
+    monkeypatch.setattr(ai_cache.cache, "_local", type(ai_cache.cache._local)())
+    gemini_model = MagicMock(model_name="models/test")
+    gemini_model.generate_content_async = AsyncMock(return_value=MagicMock(text="Carry water.", usage_metadata=None))
+    model = ai_cache._CachingModel(ai_cache.ai_bulkhead._GuardedModel(gemini_model, "test_fn"), "test_fn")
+    config = genai.types.GenerationConfig(candidate_count=1, temperature=0.2)
+
+    async def request(spent: bool):
+        budget = await ai_cache.ai_bulkhead.begin_request(None)
+        if spent:
+            budget.used = budget.limit
+        return (await model.generate_content_async("Tip for Chowk", generation_config=config)).text
+
+    leader, follower = await asyncio.gather(request(spent=True), request(spent=False), return_exceptions=True)
+    assert isinstance(leader, ai_cache.ai_bulkhead.AiBudgetExhausted)
+    assert follower == "Carry water."
+    assert gemini_model.generate_content_async.await_count == 1
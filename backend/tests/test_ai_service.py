@@ -0,0 +1,68 @@
+import asyncio
+import importlib
+import json
+from types import SimpleNamespace
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from ..services import ai_service
+from ..schemas import itinerary_schemas
+
+
+def _activity(name, osm_id):
+    return itinerary_schemas.ItineraryItem(leg_type='ACTIVITY', activity=name, osm_id=osm_id, estimated_duration_hrs=1.0)
+
+
+@pytest.mark.asyncio
+async def test_insights_batch_maps_answers_and_falls_back_for_missing_items():
+    activities = [_activity("Bara Imambara", 11), _activity("Tunday Kababi", 22), _activity("Hazratganj", 33)]
+    batch_answer = {"insights": [{"id": 0, "tip": "Take the labyrinth tour."}, {"osm_id": 33, "tip": "Go for an evening stroll."}]}
+    single_answer = MagicMock(text="Order the galouti kebab.")
+    gemini_model = MagicMock()
+    gemini_model.generate_content_async = AsyncMock(side_effect=[MagicMock(text=json.dumps(batch_answer)), single_answer])
+
+    insights = await ai_service.generate_ai_insights_batch(gemini_model, activities)
+
+    assert insights == ["Take the labyrinth tour.", "Order the galouti kebab.", "Go for an evening stroll."]
+    assert gemini_model.generate_content_async.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_insight_fallback_calls_take_one_slot_and_are_charged_once(monkeypatch):
+    # The bulkhead module as ai_service sees it (imported as `core.ai_bulkhead`).
+    ai_bulkhead = importlib.import_module(ai_service.guarded_generation.__module__)
+    monkeypatch.setattr(ai_bulkhead, "_bulkhead", None)
+    monkeypatch.setattr(ai_bulkhead, "_stats", {})
+
+    class CountingModel:
+        model_name = "counting"
+
+        def __init__(self):
+            self.calls = 0
+            self.in_flight = 0
+            self.slot_counts = []
+
+        async def generate_content_async(self, prompt, **kwargs):
+            self.calls += 1
+            self.in_flight += 1
+            await asyncio.sleep(0.01)
+            self.slot_counts.append((ai_bulkhead.get_bulkhead().active, self.in_flight))
+            self.in_flight -= 1
+            text = '{"insights": []}' if "JSON list" in prompt else "A tip."
+            return SimpleNamespace(text=text, usage_metadata=SimpleNamespace(total_token_count=10))
+
+    model = CountingModel()
+    activities = [_activity(f"Fallback Place {idx}", 9000 + idx) for idx in range(4)]
+
+    async def run():
+        budget = await ai_bulkhead.begin_request(None)
+        return budget, await ai_service.generate_ai_insights_batch(model, activities)
+
+    budget, insights = await asyncio.create_task(run())
+
+    assert insights == ["A tip."] * 4
+    assert model.calls == 5
+    assert all(active == in_flight for active, in_flight in model.slot_counts)
+    assert ai_bulkhead.stats()["functions"]["place_insight"]["calls"] == 4
+    assert budget.used == 10 * model.calls
@@ -0,0 +1,40 @@
+from ..services import autocomplete_service
+from ..services.autocomplete_service import PlaceEntry, PlaceNameIndex, normalize_place_name
+
+
+def _entry(name, population, source="gazetteer"):
+    return normalize_place_name(name), PlaceEntry(name, f"{name}, IN", 10.0, 70.0, "IN", population, source)
+
+
+def test_prefix_matches_rank_exact_then_population_and_fall_back_to_fuzzy():
+    index = PlaceNameIndex([_entry("Lucknow", 2817105), _entry("Ludhiana", 1618879), _entry("Lonavala", 57698), _entry("Luck", 10)])
+
+    assert [s["name"] for s in index.suggest("  LU ", 5)] == ["Lucknow", "Ludhiana", "Luck"]
+    assert [s["name"] for s in index.suggest("luck", 5)] == ["Luck", "Lucknow"]
+    # A typo has no prefix match but is still found, with coordinates for the build request.
+    fuzzy = index.suggest("lukcnow", 5)
+    assert fuzzy[0]["name"] == "Lucknow" and fuzzy[0]["match"] == "fuzzy"
+    assert (fuzzy[0]["lat"], fuzzy[0]["lon"]) == (10.0, 70.0)
+
+
+def test_geocoded_places_are_suggested_once(monkeypatch):
+    monkeypatch.setattr(autocomplete_service, "_index", PlaceNameIndex([_entry("Lucknow", 2817105)]))
+    result = {"lat": "26.8502", "lon": "80.9499", "name": "Hazratganj", "display_name": "Hazratganj, Lucknow, Uttar Pradesh, India", "address": {"country_code": "in"}}
+
+    autocomplete_service.remember_geocoded_place("hazratganj, lucknow", result)
+    autocomplete_service.remember_geocoded_place("hazratganj, lucknow", result)
+    # Already covered by the gazetteer entry.
+    autocomplete_service.remember_geocoded_place("lucknow", result)
+
+    suggestions = autocomplete_service.suggest("hazrat")
+    assert len(suggestions) == 1
+    assert suggestions[0]["source"] == "geocoded" and suggestions[0]["country_code"] == "IN"
+    assert suggestions[0]["lat"] == 26.8502
+    assert autocomplete_service.get_index().geocoded_count == 1
+
+
+def test_short_prefix_ranks_the_whole_range_by_population():
+    small_towns = [_entry(f"Saa {idx:04d}", 100) for idx in range(1000)]
+    index = PlaceNameIndex(small_towns + [_entry("Surat", 4467797)])
+
+    assert index.suggest("s", 3)[0]["name"] == "Surat"
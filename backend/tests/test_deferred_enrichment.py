@@ -0,0 +1,112 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from ..services import itinerary_service
+from ..schemas import itinerary_schemas
+
+
+@pytest.mark.asyncio
+async def test_enrichment_job_patches_the_stored_trip(monkeypatch):
+    user_trip = itinerary_service.models.all_models.UserTrip
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(user_trip.metadata.create_all)
+    session_factory = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    monkeypatch.setattr(itinerary_service, "AsyncSessionLocal", session_factory)
+
+    response = itinerary_schemas.ItineraryResponse(
+        trip_uuid="trip-1",
+        itinerary=[itinerary_schemas.ItineraryItem(leg_type='ACTIVITY', activity="Bara Imambara", osm_id=11, estimated_duration_hrs=1.0, matched_preferences=["history"])],
+        total_estimated_cost=0.0,
+        custom_heading="Your Trip to Lucknow",
+        enrichment_status="pending",
+    )
+    now = datetime.now(timezone.utc)
+    async with session_factory() as db:
+        db.add(user_trip(
+            trip_uuid="trip-1", user_id="cit_test", original_request_details={}, generated_itinerary_response=response.model_dump(mode='json'),
+            trip_title="Your Trip to Lucknow", location_display_name="Lucknow", trip_start_datetime_utc=now, trip_end_datetime_utc=now
+        ))
+        await db.commit()
+
+    monkeypatch.setattr(itinerary_service.insight_service, "get_insights", AsyncMock(return_value=["Take the labyrinth tour."]))
+    monkeypatch.setattr(itinerary_service.ai_service, "generate_creative_trip_title", AsyncMock(return_value="Nawabi Nights in Lucknow"))
+    await itinerary_service._enrich_trip_itinerary("trip-1", MagicMock())
+
+    async with session_factory() as db:
+        trip = (await db.execute(select(user_trip).where(user_trip.trip_uuid == "trip-1"))).scalars().first()
+    stored = itinerary_schemas.ItineraryResponse(**trip.generated_itinerary_response)
+    assert stored.enrichment_status == "complete"
+    assert stored.itinerary[0].ai_insight == "Take the labyrinth tour."
+    assert stored.custom_heading == trip.trip_title == "Nawabi Nights in Lucknow"
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_deferred_build_leaves_the_weather_sentence_to_enrichment(monkeypatch):
+    user_trip = itinerary_service.models.all_models.UserTrip
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(user_trip.metadata.create_all)
+    session_factory = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    monkeypatch.setattr(itinerary_service, "AsyncSessionLocal", session_factory)
+
+    async def directions(http_client, origin, destination, mode="driving"):
+        distance_km = ((origin[0] - destination[0]) ** 2 + (origin[1] - destination[1]) ** 2) ** 0.5 * 100
+        return {"distance_km": distance_km, "duration_hrs": distance_km / 20, "overview_polyline": None}
+
+    async def enrich(element, *args):
+        return {
+            "osm_id": element["id"], "name": f"Place {element['id']}", "lat": element["lat"], "lon": element["lon"],
+            "avg_visit_duration_hrs": 1.0, "estimated_cost_inr": 0, "description": "", "tags": {},
+            "_matched_prefs": ["history"], "opening_hours": None,
+        }
+
+    async def run_inline(func, *args, **kwargs):
+        return func(*args)
+
+    start_epoch = int(datetime(2026, 3, 10, tzinfo=timezone.utc).timestamp())
+    hourly = {
+        "temperature_2m": [31.0] * 24, "apparent_temperature": [33.0] * 24, "precipitation_probability": [0] * 24,
+        "wind_speed_10m": [5.0] * 24, "weathercode": [0] * 24, "is_day": [1] * 24,
+    }
+    monkeypatch.setattr(itinerary_service.constants, "ROUTING_MIN_SLOT_SECONDS", 0.0)
+    monkeypatch.setattr(itinerary_service.location_service, "get_directions", directions)
+    monkeypatch.setattr(itinerary_service, "enrich_candidate", enrich)
+    monkeypatch.setattr(itinerary_service.planning_service, "run_cpu_bound", run_inline)
+    monkeypatch.setattr(itinerary_service.planning_service, "prepare_candidates", lambda candidates, *args: candidates)
+    monkeypatch.setattr(itinerary_service.planning_service, "rank_candidates", lambda candidates, *args: [(100 - i, c["osm_id"]) for i, c in enumerate(candidates)])
+    monkeypatch.setattr(itinerary_service.keyword_service, "get_local_keywords", AsyncMock(return_value=[]))
+    monkeypatch.setattr(itinerary_service.weather_service, "get_hourly_series", AsyncMock(return_value={"start": start_epoch, "hourly": hourly}))
+    monkeypatch.setattr(itinerary_service.weather_service, "generate_weather_ai_sentence", AsyncMock(return_value="Sunny and warm, so find some shade."))
+    monkeypatch.setattr(itinerary_service.insight_service, "get_insights", AsyncMock(return_value=["Climb to the rooftop."]))
+    monkeypatch.setattr(itinerary_service.ai_service, "generate_creative_trip_title", AsyncMock(return_value="Your Trip to Lucknow"))
+    background = []
+    monkeypatch.setattr(itinerary_service, "_spawn_background", lambda coro: background.append(asyncio.ensure_future(coro)) or background[-1])
+
+    overpass_response = MagicMock()
+    overpass_response.json.return_value = {"elements": [{"type": "node", "id": i, "lat": 26.85 + 0.01 * i, "lon": 80.95} for i in range(1, 4)]}
+    http_client = MagicMock()
+    http_client.post = AsyncMock(return_value=overpass_response)
+    request = itinerary_schemas.ItineraryRequest(
+        start_lat=26.85, start_lon=80.95, location="Lucknow", selected_preferences=["history"], budget=1000,
+        start_datetime="2026-03-10T04:00:00Z", end_datetime="2026-03-10T09:00:00Z", defer_enrichment=True,
+    )
+    async with session_factory() as db:
+        response = await itinerary_service.build_itinerary(request, db, MagicMock(id="cit_test"), http_client, MagicMock())
+    assert response.enrichment_status == "pending"
+    assert response.weather_info is not None and response.weather_info.ai_weather_sentence is None
+
+    await asyncio.gather(*background)
+    async with session_factory() as db:
+        trip = (await db.execute(select(user_trip).where(user_trip.trip_uuid == response.trip_uuid))).scalars().first()
+    stored = itinerary_schemas.ItineraryResponse(**trip.generated_itinerary_response)
+    assert stored.enrichment_status == "complete"
+    assert stored.weather_info.ai_weather_sentence == "Sunny and warm, so find some shade."
+    await engine.dispose()
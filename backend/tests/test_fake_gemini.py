@@ -0,0 +1,29 @@
+import pytest
+
+from ..core.fake_gemini import FakeGenerativeModel, SimulatedGeminiError
+from ..services import ai_service
+
+
+@pytest.mark.asyncio
+async def test_fake_model_answers_structured_prompts_deterministically():
+    model = FakeGenerativeModel(latency_ms=0)
+    places = [{"osm_id": 1, "name": "Bara Imambara"}, {"osm_id": 2, "name": "Airtel Telecom Tower"}]
+
+    verdicts = await ai_service.judge_places_suitability(model, "Lucknow", places)
+
+    assert verdicts == {1: True, 2: False}
+    prompt = "You are 'Cabito Memory Weaver'. A user completed a trip titled \"Old Lucknow\" in Lucknow."
+    assert FakeGenerativeModel.respond(prompt) == FakeGenerativeModel.respond(prompt)
+    stats = model.stats()
+    assert stats["calls_by_kind"] == {"suitability_verdicts": 1}
+    assert stats["estimated_prompt_tokens"] > 0 and stats["estimated_output_tokens"] > 0
+
+
+@pytest.mark.asyncio
+async def test_fake_model_failure_rate_raises_and_is_counted():
+    model = FakeGenerativeModel(latency_distribution="fixed", latency_ms=1, failure_rate=1.0, seed=7)
+
+    with pytest.raises(SimulatedGeminiError):
+        await model.generate_content_async("Hello")
+
+    assert model.stats()["failures_by_kind"] == {"other": 1}
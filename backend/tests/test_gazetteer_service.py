@@ -0,0 +1,36 @@
+from ..services import itinerary_service
+from ..services.gazetteer_service import Gazetteer, Settlement, get_gazetteer
+
+
+def test_nearest_prefers_the_metro_over_a_closer_small_town():
+    gazetteer = Gazetteer([
+        Settlement("Mumbai", 19.0760, 72.8777, "IN", "Maharashtra", 12442373),
+        Settlement("Thane", 19.2183, 72.9781, "IN", "Maharashtra", 1841488),
+        Settlement("Pune", 18.5204, 73.8567, "IN", "Maharashtra", 3124458),
+    ])
+    # Borivali, in north Mumbai, is nearer to Thane's centre than to Mumbai's.
+    assert gazetteer.nearest(19.2307, 72.8567).name == "Mumbai"
+    assert gazetteer.nearest(18.53, 73.85).key == "pune"
+    # Open sea far from every centroid.
+    assert gazetteer.nearest(15.0, 70.0) is None
+
+
+def test_bundled_gazetteer_resolves_lucknow():
+    gazetteer = get_gazetteer()
+    assert len(gazetteer) > 100
+    assert gazetteer.nearest(26.8550, 80.9450).name == "Lucknow"
+
+
+def test_place_utc_offset_comes_from_the_settlement_time_zone():
+    mumbai = (19.0760, 72.8777)
+    # The frontend always sends UTC ('Z'); Mumbai is on IST (+5:30), not the +5:00 its longitude suggests.
+    assert itinerary_service._resolve_place_utc_offset_minutes("2026-03-10T04:30:00.000Z", mumbai) == 330
+    assert itinerary_service._resolve_place_utc_offset_minutes("2026-03-10T10:00:00+05:30", mumbai) == 330
+    # Daylight saving time follows the zone's rules on the trip date.
+    london = (51.5074, -0.1278)
+    assert itinerary_service._resolve_place_utc_offset_minutes("2026-01-10T09:00:00Z", london) == 0
+    assert itinerary_service._resolve_place_utc_offset_minutes("2026-07-10T09:00:00Z", london) == 60
+    # Away from every settlement, an explicit offset is used, and only a bare UTC time falls back to the longitude.
+    open_sea = (15.0, 70.0)
+    assert itinerary_service._resolve_place_utc_offset_minutes("2026-03-10T10:00:00+00:00", open_sea) == 0
+    assert itinerary_service._resolve_place_utc_offset_minutes("2026-03-10T10:00:00Z", open_sea) == 270
@@ -0,0 +1,47 @@
+import asyncio
+import time
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from ..core.rate_gate import RateGate, RateGateBusy
+from ..services import location_service
+
+
+@pytest.mark.asyncio
+async def test_geocode_is_cached_by_normalized_query(monkeypatch):
+    monkeypatch.setattr(location_service, "_nominatim_gate", RateGate("nominatim-test", 0.0, 1.0))
+    response = MagicMock(json=MagicMock(return_value=[{"lat": "26.85", "lon": "80.94"}]), raise_for_status=MagicMock())
+    http_client = MagicMock(get=AsyncMock(return_value=response))
+
+    first = await location_service.geocode_location_text("Hazratganj, Lucknow", http_client)
+    second = await location_service.geocode_location_text("  hazratganj ,LUCKNOW ", http_client)
+
+    assert first == second == {"lat": "26.85", "lon": "80.94"}
+    assert http_client.get.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_rate_gate_spaces_calls_and_rejects_long_queues():
+    gate = RateGate("spacing-test", interval_seconds=0.05, max_wait_seconds=0.08)
+    started = time.monotonic()
+    await gate.wait_turn()
+    await gate.wait_turn()
+    assert time.monotonic() - started >= 0.045
+
+    # Three callers at once on a fresh gate: the third would wait past max_wait_seconds.
+    gate = RateGate("busy-test", interval_seconds=0.05, max_wait_seconds=0.08)
+    results = await asyncio.gather(gate.wait_turn(), gate.wait_turn(), gate.wait_turn(), return_exceptions=True)
+    assert [isinstance(result, RateGateBusy) for result in results] == [False, False, True]
+
+
+@pytest.mark.asyncio
+async def test_overpass_answers_are_cached_and_locked_past_the_read_timeout(monkeypatch):
+    monkeypatch.setattr(location_service.cache, "_local", type(location_service.cache._local)())
+    response = MagicMock(json=MagicMock(return_value={"elements": [{"type": "node", "id": 1}]}), raise_for_status=MagicMock())
+    http_client = MagicMock(post=AsyncMock(return_value=response))
+
+    for _ in range(2):
+        assert (await location_service.run_overpass_query("[out:json];node(1);out;", http_client))["elements"][0]["id"] == 1
+    assert http_client.post.await_count == 1
+    assert location_service._overpass_lock_ttl_seconds() > location_service.settings.HTTP_UPSTREAMS["overpass"].read_timeout_seconds
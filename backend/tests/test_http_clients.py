@@ -0,0 +1,23 @@
+import httpx
+import pytest
+
+from ..core.config import UpstreamHttpConfig
+from ..core.http_clients import UpstreamClients
+
+
+@pytest.mark.asyncio
+async def test_requests_are_routed_to_the_upstream_pool_and_counted():
+    clients = UpstreamClients({"nominatim": UpstreamHttpConfig(max_connections=2), "default": UpstreamHttpConfig()})
+    seen = []
+    for name in clients.clients:
+        await clients.clients[name].aclose()
+        clients.clients[name] = httpx.AsyncClient(transport=httpx.MockTransport(lambda request, name=name: seen.append(name) or httpx.Response(200)))
+
+    await clients.get("https://nominatim.openstreetmap.org/search?q=Lucknow")
+    await clients.post("https://example.org/api", json={})
+    await clients.aclose()
+
+    assert seen == ["nominatim", "default"]
+    stats = clients.stats()
+    assert stats["nominatim"]["requests"] == 1 and stats["nominatim"]["in_flight"] == 0
+    assert stats["nominatim"]["max_connections"] == 2
@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from ..services import insight_service
+from ..schemas import itinerary_schemas
+
+
+def _activity(name, osm_id, prefs):
+    return itinerary_schemas.ItineraryItem(leg_type='ACTIVITY', activity=name, osm_id=osm_id, estimated_duration_hrs=1.0, matched_preferences=prefs)
+
+
+def test_preference_key_ignores_order_and_case():
+    assert insight_service.preference_key(["Sights", "history ", "sights"]) == "history,sights"
+    assert insight_service.preference_key(None) == ""
+
+
+@pytest.mark.asyncio
+async def test_get_insights_serves_cached_variants_and_generates_only_misses(monkeypatch):
+    monkeypatch.setattr(insight_service.constants, "INSIGHT_CACHE_NEW_VARIANT_PROBABILITY", 0.0)
+    cached_row = MagicMock(osm_id=11, preference_key="history,sights", variants=["Take the labyrinth tour."])
+    db = MagicMock()
+    db.execute = AsyncMock(return_value=MagicMock(scalars=MagicMock(return_value=MagicMock(all=MagicMock(return_value=[cached_row])))))
+    batch = AsyncMock(return_value=["Order the galouti kebab."])
+    monkeypatch.setattr(insight_service.ai_service, "generate_ai_insights_batch", batch)
+
+    activities = [_activity("Bara Imambara", 11, ["sights", "history"]), _activity("Tunday Kababi", 22, ["foodie"])]
+    insights = await insight_service.get_insights(db, MagicMock(), activities)
+
+    assert insights == ["Take the labyrinth tour.", "Order the galouti kebab."]
+    assert [item.activity for item in batch.await_args.args[1]] == ["Tunday Kababi"]
+    # One lookup and one upsert for the newly generated tip.
+    assert db.execute.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_batcher_merges_concurrent_requests_into_one_call(monkeypatch):
+    async def fake_batch(gemini_model, items):
+        return [f"Tip for {item.activity}" for item in items]
+
+    batch = AsyncMock(side_effect=fake_batch)
+    monkeypatch.setattr(insight_service.ai_service, "generate_ai_insights_batch", batch)
+    batcher = insight_service.InsightBatcher()
+    model = MagicMock()
+    imambara = _activity("Bara Imambara", 11, ["history"])
+
+    first, second = await asyncio.gather(
+        batcher.generate(model, [imambara, _activity("Tunday Kababi", 22, ["foodie"])]),
+        batcher.generate(model, [_activity("Bara Imambara", 11, ["history"])]),
+    )
+
+    assert first == ["Tip for Bara Imambara", "Tip for Tunday Kababi"]
+    assert second == ["Tip for Bara Imambara"]
+    assert batch.await_count == 1
+    assert [item.activity for item in batch.await_args.args[1]] == ["Bara Imambara", "Tunday Kababi"]
@@ -0,0 +1,37 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from ..services import keyword_service
+
+
+@pytest.mark.asyncio
+async def test_local_keywords_are_cached_per_preference(monkeypatch):
+    monkeypatch.setattr(keyword_service.cache, "_local", type(keyword_service.cache._local)())
+    fetch = AsyncMock(side_effect=[
+        {"history": ["nawabi era"], "foodie": ["galouti kebab"]},
+        {"shopping": ["chikankari"]},
+    ])
+    monkeypatch.setattr(keyword_service.ai_service, "get_dynamic_local_keywords_by_preference", fetch)
+    gemini_model = MagicMock()
+
+    assert await keyword_service.get_local_keywords(gemini_model, "Lucknow", ["history", "foodie"]) == ["nawabi era", "galouti kebab"]
+    # A new combination only asks the AI for the preference it has not seen yet.
+    keywords = await keyword_service.get_local_keywords(gemini_model, "lucknow ", ["foodie", "shopping"])
+
+    assert keywords == ["galouti kebab", "chikankari"]
+    assert fetch.await_args.args[2] == ["shopping"]
+    assert fetch.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_background_refresh_reaches_the_model(monkeypatch):
+    from ..core.fake_gemini import FakeGenerativeModel
+
+    monkeypatch.setattr(keyword_service.cache, "_local", type(keyword_service.cache._local)())
+    model = FakeGenerativeModel(latency_ms=0)
+
+    await keyword_service.get_local_keywords(model, "Agra", ["history"])
+    # The refresh must get a fresh answer, not one from a prompt cache under this one.
+    await keyword_service._fetch_and_store(model, "Agra", ["history"])
+
+    assert model.stats()["calls"] == 2
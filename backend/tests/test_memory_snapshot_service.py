@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from ..services import memory_snapshot_service
+
+
+def _trip(activities):
+    return MagicMock(
+        trip_uuid="trip-1", trip_title="Nawabi Nights", location_display_name="Lucknow",
+        trip_start_datetime_utc=datetime(2025, 6, 5, 9, tzinfo=timezone.utc),
+        generated_itinerary_response={"itinerary": [{"leg_type": "ACTIVITY", "activity": name} for name in activities]},
+        memory_snapshot_text=None, memory_snapshot_hash=None,
+    )
+
+
+@pytest.mark.asyncio
+async def test_snapshot_is_regenerated_only_when_trip_content_changes(monkeypatch):
+    generate = AsyncMock(side_effect=["A day of domes and kebabs.", "A longer day.", "Forced again."])
+    monkeypatch.setattr(memory_snapshot_service.ai_service, "generate_ai_memory_snapshot_text", generate)
+    db = MagicMock(commit=AsyncMock())
+    trip = _trip(["Bara Imambara", "Tunday Kababi"])
+
+    assert await memory_snapshot_service.get_or_generate_snapshot(db, MagicMock(), trip) == ("A day of domes and kebabs.", True)
+    assert await memory_snapshot_service.get_or_generate_snapshot(db, MagicMock(), trip) == ("A day of domes and kebabs.", False)
+
+    trip.generated_itinerary_response["itinerary"].append({"leg_type": "ACTIVITY", "activity": "Hazratganj"})
+    assert await memory_snapshot_service.get_or_generate_snapshot(db, MagicMock(), trip) == ("A longer day.", True)
+    assert await memory_snapshot_service.get_or_generate_snapshot(db, MagicMock(), trip, force=True) == ("Forced again.", True)
+    assert generate.await_count == 3
+
+
+@pytest.mark.asyncio
+async def test_failed_generation_keeps_the_previous_snapshot(monkeypatch):
+    unavailable = memory_snapshot_service.ai_service.MEMORY_SNAPSHOT_UNAVAILABLE_TEXTS[-1]
+    monkeypatch.setattr(memory_snapshot_service.ai_service, "generate_ai_memory_snapshot_text", AsyncMock(return_value=unavailable))
+    trip = _trip(["Bara Imambara"])
+    trip.memory_snapshot_text = "An older memory."
+
+    text, generated = await memory_snapshot_service.get_or_generate_snapshot(MagicMock(commit=AsyncMock()), MagicMock(), trip, force=True)
+    assert (text, generated) == ("An older memory.", False)
+    assert trip.memory_snapshot_hash is None
+
+
+@pytest.mark.asyncio
+async def test_pregeneration_backs_off_trips_that_keep_failing():
+    from datetime import timedelta
+
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+    UserTrip = memory_snapshot_service.UserTrip
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(UserTrip.__table__.create)
+
+    now = datetime(2025, 6, 10, 12, tzinfo=timezone.utc)
+
+    def completed(uuid, completed_days_ago, attempted_hours_ago=None):
+        return UserTrip(
+            trip_uuid=uuid, user_id="u1", original_request_details={}, generated_itinerary_response={},
+            trip_start_datetime_utc=now, trip_end_datetime_utc=now, status="completed",
+            marked_completed_at=now - timedelta(days=completed_days_ago),
+            memory_snapshot_attempted_at=None if attempted_hours_ago is None else now - timedelta(hours=attempted_hours_ago),
+        )
+
+    async with AsyncSession(engine) as db:
+        db.add_all([
+            completed("failed-recently", 0, attempted_hours_ago=1),
+            completed("never-tried", 5),
+            completed("failed-long-ago", 1, attempted_hours_ago=48),
+        ])
+        await db.commit()
+        trips = (await db.execute(memory_snapshot_service._pregeneration_query(now))).scalars().all()
+    await engine.dispose()
+
+    assert [trip.trip_uuid for trip in trips] == ["never-tried", "failed-long-ago"]
+
+
+@pytest.mark.asyncio
+async def test_pregeneration_continues_after_a_failed_trip(monkeypatch):
+    from sqlalchemy import text
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from sqlalchemy.orm import sessionmaker
+
+    UserTrip = memory_snapshot_service.UserTrip
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(UserTrip.__table__.create)
+    session_factory = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    monkeypatch.setattr(memory_snapshot_service, "AsyncSessionLocal", session_factory)
+
+    now = datetime.now(timezone.utc)
+    async with session_factory() as db:
+        db.add_all([
+            UserTrip(
+                trip_uuid=uuid, user_id="u1", original_request_details={}, generated_itinerary_response={},
+                trip_start_datetime_utc=now, trip_end_datetime_utc=now, status="completed", marked_completed_at=now - timedelta(days=days_ago),
+            )
+            for uuid, days_ago in (("fails", 0), ("succeeds", 1))
+        ])
+        await db.commit()
+
+    async def generate(db, gemini_model, trip):
+        if trip.trip_uuid == "fails":
+            await db.execute(text("SELECT 1"))  # fails inside a transaction, like a rejected commit
+            raise RuntimeError("database hiccup")
+        return "A day of kebabs.", True
+
+    monkeypatch.setattr(memory_snapshot_service, "get_or_generate_snapshot", generate)
+    assert await memory_snapshot_service.pregenerate_completed_snapshots(MagicMock()) == 1
+    await engine.dispose()
@@ -0,0 +1,33 @@
+from datetime import datetime, timezone
+
+from ..services import opening_hours_service
+
+
+def test_weekday_schedule_open_and_next_change():
+    schedule = opening_hours_service.compile_opening_hours("Mo-Fr 09:00-17:00; Sa 10:00-14:00,16:00-20:00; Su off")
+
+    # 2025-06-05 is a Thursday
+    assert schedule.is_open(datetime(2025, 6, 5, 10, 0))
+    assert not schedule.is_open(datetime(2025, 6, 5, 18, 0))
+    assert schedule.next_change(datetime(2025, 6, 5, 18, 0)) == datetime(2025, 6, 6, 9, 0)
+    assert schedule.next_change(datetime(2025, 6, 7, 14, 30)) == datetime(2025, 6, 7, 16, 0)
+    assert not schedule.is_open(datetime(2025, 6, 8, 12, 0))
+
+
+def test_overnight_span_and_utc_offset():
+    schedule = opening_hours_service.compile_opening_hours("Mo-Su 18:00-02:00")
+    assert schedule.is_open(datetime(2025, 6, 9, 1, 0))
+    assert schedule.next_change(datetime(2025, 6, 9, 1, 0)) == datetime(2025, 6, 9, 2, 0)
+
+    office = opening_hours_service.compile_opening_hours("Mo-Fr 09:00-17:00")
+    arrival_utc = datetime(2025, 6, 5, 4, 0, tzinfo=timezone.utc)  # 09:30 at UTC+05:30
+    assert office.is_open(arrival_utc, 330)
+    assert office.next_change(arrival_utc, 330) == datetime(2025, 6, 5, 11, 30, tzinfo=timezone.utc)
+
+
+def test_special_values_and_unsupported_syntax():
+    assert opening_hours_service.compile_opening_hours("24/7").is_always_open
+    assert opening_hours_service.compile_opening_hours("off").is_always_closed
+    assert opening_hours_service.compile_opening_hours("Jan-Mar Mo 10:00-12:00") is None
+    assert opening_hours_service.compile_opening_hours(None) is None
+    assert opening_hours_service.compile_opening_hours("Mo-Fr 09:00-17:00") is opening_hours_service.compile_opening_hours("Mo-Fr 09:00-17:00")
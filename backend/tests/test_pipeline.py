@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+from ..core.pipeline import Pipeline
+
+
+@pytest.mark.asyncio
+async def test_pipeline_runs_independent_stages_concurrently():
+    order = []
+
+    async def slow(name, result):
+        order.append(f"{name} started")
+        await asyncio.sleep(0.05)
+        order.append(f"{name} done")
+        return result
+
+    async def combine(left, right):
+        return left + right
+
+    events = []
+
+    async def on_stage(stage, stage_status, elapsed_seconds):
+        events.append((stage, stage_status))
+
+    pipeline = Pipeline("test", on_stage=on_stage)
+    pipeline.stage("left", lambda: slow("left", 1))
+    pipeline.stage("right", lambda: slow("right", 2))
+    pipeline.stage("total", combine, ["left", "right"])
+    results = await pipeline.run()
+
+    assert results["total"] == 3
+    assert order[:2] == ["left started", "right started"]
+    assert set(pipeline.timings) == {"left", "right", "total"}
+    assert events[-2:] == [("total", "started"), ("total", "done")]
+
+    with pytest.raises(ValueError):
+        pipeline.stage("orphan", combine, ["missing"])
+
+
+@pytest.mark.asyncio
+async def test_pipeline_failure_cancels_remaining_stages():
+    cancelled = asyncio.Event()
+
+    async def fail():
+        raise RuntimeError("geocoding failed")
+
+    async def wait_forever():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    pipeline = Pipeline("test")
+    pipeline.stage("start", fail)
+    pipeline.stage("weather", wait_forever)
+    with pytest.raises(RuntimeError):
+        await pipeline.run()
+    assert cancelled.is_set()
@@ -0,0 +1,19 @@
+import pytest
+
+from ..services import planning_service
+
+
+@pytest.mark.asyncio
+async def test_run_cpu_bound_skips_the_pool_for_inline_work(monkeypatch):
+    class ExplodingPool:
+        def submit(self, *args, **kwargs):
+            raise AssertionError("small inputs should not be sent to a worker")
+
+    monkeypatch.setattr(planning_service, "_process_pool", ExplodingPool())
+    assert await planning_service.run_cpu_bound(sum, [1, 2, 3], inline=True) == 6
+
+
+def test_matched_preferences_keep_the_users_order():
+    tags = {"historic": "monument", "tourism": "attraction", "amenity": "place_of_worship"}
+    assert planning_service.get_matched_preferences(tags, ["sights", "history"])[0] == "sights"
+    assert planning_service.get_matched_preferences(tags, ["history", "sights"])[0] == "history"
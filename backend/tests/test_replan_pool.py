@@ -0,0 +1,31 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from unittest.mock import AsyncMock
+
+from ..services import itinerary_service
+
+
+@pytest.mark.asyncio
+async def test_replan_pool_is_built_on_the_first_replan_only(monkeypatch):
+    monkeypatch.setattr(itinerary_service.cache, "_local", type(itinerary_service.cache._local)())
+    matrix = AsyncMock(side_effect=lambda http_client, coords, mode: {
+        "durations_hrs": [[0.1] * len(coords) for _ in coords], "distances_km": [[1.0] * len(coords) for _ in coords],
+    })
+    monkeypatch.setattr(itinerary_service.location_service, "get_distance_matrix", matrix)
+    monkeypatch.setattr(itinerary_service.planning_service, "rank_candidates", lambda candidates, *args: [(10 - i, c["osm_id"]) for i, c in enumerate(candidates)][:args[-1]])
+    now = datetime.now(timezone.utc)
+    candidates = [{"osm_id": i, "lat": 26.85 + 0.01 * i, "lon": 80.95} for i in range(1, 4)]
+
+    # Saving the build's leftovers needs no ranking or routing.
+    await itinerary_service._store_replan_candidates("trip-1", candidates, ["kebab"], now + timedelta(hours=6))
+    assert matrix.await_count == 0
+
+    for _ in range(2):
+        pool = await itinerary_service._get_replan_pool("trip-1", (26.85, 80.95), now, now + timedelta(hours=6), [], "driving", None)
+        assert [cand["osm_id"] for cand in pool["candidates"]] == [1, 2, 3]
+        assert len(pool["durations_hrs"]) == 4
+    assert matrix.await_count == 1
+
+    # A trip built before the pool could be saved replans its stored stops only.
+    assert await itinerary_service._get_replan_pool("trip-2", (26.85, 80.95), now, now + timedelta(hours=6), [], "driving", None) is None
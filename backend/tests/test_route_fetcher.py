@@ -0,0 +1,31 @@
+import asyncio
+
+import pytest
+
+from ..services import itinerary_service
+
+
+@pytest.mark.asyncio
+async def test_prefetches_yield_to_required_legs_and_stay_within_budget(monkeypatch):
+    monkeypatch.setattr(itinerary_service.constants, "ROUTING_MAX_CONCURRENCY", 1)
+    monkeypatch.setattr(itinerary_service.constants, "ROUTING_MIN_SLOT_SECONDS", 0.0)
+    monkeypatch.setattr(itinerary_service.constants, "ROUTE_PREFETCH_BUDGET_PER_BUILD", 2)
+    called = []
+
+    async def get_directions(http_client, origin, destination, travel_mode):
+        called.append(destination)
+        await asyncio.sleep(0.02)
+        return {"duration_hrs": 0.1, "distance_km": 1.0}
+
+    monkeypatch.setattr(itinerary_service.location_service, "get_directions", get_directions)
+    fetcher = itinerary_service._RouteFetcher(None, "walking")
+    origin = (26.85, 80.94)
+
+    fetcher.prefetch(origin, [(1, 1), (2, 2), (3, 3)])
+    await asyncio.sleep(0.005)
+    # Issued while the first prefetch is running, it goes ahead of the queued second one.
+    required = fetcher.request(origin, (9, 9))
+    await required
+    await asyncio.sleep(0.05)
+
+    assert called == [(1, 1), (9, 9), (2, 2)]
@@ -0,0 +1,75 @@
+from ..services import route_optimizer
+
+# Four stops on a line: start(0) - 1 - 2 - 3, one hour between neighbours.
+LINE_DURATIONS = [[abs(a - b) * 1.0 for b in range(4)] for a in range(4)]
+
+
+def test_cheapest_insertion_places_nodes_on_the_way():
+    route, unplaced = route_optimizer.cheapest_insertion(
+        [0, 3, 0], [1, 2], LINE_DURATIONS, [0.0, 0.5, 0.5, 0.5], horizon_hrs=10.0
+    )
+    assert route == [0, 1, 2, 3, 0]
+    assert unplaced == []
+
+
+def test_cheapest_insertion_respects_horizon_budget_and_windows():
+    service_hrs = [0.0, 1.0, 1.0, 1.0]
+
+    route, unplaced = route_optimizer.cheapest_insertion([0, 1, 0], [3], LINE_DURATIONS, service_hrs, horizon_hrs=5.0)
+    assert (route, unplaced) == ([0, 1, 0], [3])
+
+    leg_costs = [[10.0 * duration for duration in row] for row in LINE_DURATIONS]
+    node_costs = [0.0, 0.0, 100.0, 0.0]
+    route, unplaced = route_optimizer.cheapest_insertion(
+        [0, 1, 0], [2], LINE_DURATIONS, service_hrs, horizon_hrs=10.0,
+        leg_costs=leg_costs, node_costs=node_costs, budget=100.0
+    )
+    assert unplaced == [2]
+
+    # Stop 2 only opens at hour 6: visiting it after stop 1 means waiting too long.
+    windows = [None, None, [(6.0, 9.0)], None]
+    assert route_optimizer.route_finish_hrs([0, 1, 2, 0], LINE_DURATIONS, service_hrs, windows, max_wait_hrs=1.5) == float("inf")
+    visits = route_optimizer.schedule_route([0, 1, 2, 0], LINE_DURATIONS, service_hrs, windows, max_wait_hrs=4.0)
+    assert visits[2] == (3.0, 6.0, 7.0)
+
+
+def _line_matrix(size):
+    return [[abs(a - b) * 0.5 for b in range(size)] for a in range(size)]
+
+
+def test_optimize_route_exact_and_local_search_untangle_a_line():
+    durations = _line_matrix(5)
+    route = route_optimizer.optimize_route([0, 3, 1, 4, 2, 0], durations, [0.0] * 5, horizon_hrs=24.0)
+    assert route_optimizer.route_travel_hrs(route, durations) == 4.0
+
+    durations = _line_matrix(13)
+    shuffled = [0, 7, 2, 11, 5, 9, 1, 12, 4, 8, 3, 10, 6, 0]
+    route = route_optimizer.optimize_route(shuffled, durations, [0.0] * 13, horizon_hrs=48.0, exact_max_stops=9)
+    assert sorted(route[1:-1]) == list(range(1, 13))
+    assert route_optimizer.route_travel_hrs(route, durations) == 12.0
+
+
+def test_optimize_route_keeps_time_windows():
+    durations = _line_matrix(4)
+    service_hrs = [0.0, 1.0, 1.0, 1.0]
+    # Stop 3 closes early, so the shortest feasible order has to visit it first.
+    windows = [None, None, None, [(0.0, 2.6)]]
+    assert route_optimizer.schedule_route([0, 1, 2, 3, 0], durations, service_hrs, windows) is None
+    route = route_optimizer.optimize_route([0, 3, 1, 2, 0], durations, service_hrs, 24.0, windows)
+    assert route == [0, 3, 2, 1, 0]
+
+
+def test_replan_route_drops_late_stops_and_refills_by_priority():
+    # Node 0 is the current position, node 1 the trip start; 2-3 are planned, 4-5 candidates.
+    positions = [0.0, 0.0, 1.0, 5.0, 1.5, 0.5]
+    durations = [[abs(a - b) * 0.5 for b in positions] for a in positions]
+    service_hrs = [0.0, 0.0, 1.0, 1.0, 0.25, 0.25]
+    windows = [None, None, None, [(0.0, 1.0)], None, None]
+
+    # Only one candidate fits in the time left, so the priority order decides which.
+    route, dropped = route_optimizer.replan_route(0, 1, [2, 3], [4, 5], durations, service_hrs, 2.8, windows)
+    assert dropped == [3]
+    assert route[0] == 0 and route[-1] == 1 and sorted(route[1:-1]) == [2, 4]
+
+    route, _ = route_optimizer.replan_route(0, 1, [2, 3], [5, 4], durations, service_hrs, 2.8, windows)
+    assert route == [0, 5, 2, 1]
@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+from ..core import singleflight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_with_the_same_key_share_one_call():
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"lat": "26.85"}
+
+    results = await asyncio.gather(*(singleflight.run("nominatim:lucknow", fetch) for _ in range(5)))
+    assert results == [{"lat": "26.85"}] * 5
+    assert len(calls) == 1
+
+    await singleflight.run("nominatim:lucknow", fetch)
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_failures_are_shared_and_not_cached():
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    results = await asyncio.gather(*(singleflight.run("overpass:q", fail) for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert await singleflight.run("overpass:q", lambda: asyncio.sleep(0, result="ok")) == "ok"
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.values = {}
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.values:
+            return False
+        self.values[key] = value
+        return True
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def exists(self, key):
+        return key in self.values
+
+    async def delete(self, key):
+        self.values.pop(key, None)
+
+
+@pytest.mark.asyncio
+async def test_unpublished_results_are_read_by_waiting_workers_from_their_own_cache(monkeypatch):
+    redis = _FakeRedis()
+    monkeypatch.setattr(singleflight.cache, "_redis", redis)
+    monkeypatch.setattr(singleflight.constants, "SINGLEFLIGHT_POLL_INTERVAL_SECONDS", 0.01)
+    lock_key, result_key = singleflight._redis_keys("overpass:big")
+    redis.values[lock_key] = "1"  # another worker is running the query
+    stored = {}
+
+    async def fetch():
+        return stored.get("answer") or {"elements": ["fetched again"]}
+
+    async def other_worker_finishes():
+        await asyncio.sleep(0.03)
+        stored["answer"] = {"elements": ["from the other worker"]}
+        await redis.delete(lock_key)
+
+    result, _ = await asyncio.gather(
+        singleflight.run("overpass:big", fetch, share_across_processes=True, lock_ttl_seconds=5, publish_result=False),
+        other_worker_finishes()
+    )
+    assert result == {"elements": ["from the other worker"]}
+
+    # Holding the lock itself, a worker leaves the (large) result unpublished.
+    assert await singleflight.run("overpass:big", fetch, share_across_processes=True, publish_result=False) == stored["answer"]
+    assert result_key not in redis.values and lock_key not in redis.values
@@ -0,0 +1,32 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from ..services import suitability_service
+
+
+def _candidate(osm_id, name, **tags):
+    return {"osm_id": osm_id, "name": name, "tags": tags}
+
+
+@pytest.mark.asyncio
+async def test_filter_uses_stored_verdicts_and_judges_only_unknown_places(monkeypatch):
+    db = MagicMock()
+    db.execute = AsyncMock(return_value=MagicMock(all=MagicMock(return_value=[(11, False), (22, True)])))
+    judge = AsyncMock(return_value={33: False, 44: True})
+    monkeypatch.setattr(suitability_service.ai_service, "judge_places_suitability", judge)
+
+    candidates = [
+        _candidate(11, "Water Pumping Station", man_made="water_works"),
+        _candidate(22, "Bara Imambara", historic="monument"),
+        _candidate(33, "Reliance Fresh", shop="supermarket"),
+        _candidate(44, "Chowk Market", amenity="marketplace"),
+        _candidate(55, "Ambedkar Park", leisure="park"),
+    ]
+    suitable = await suitability_service.filter_suitable_candidates(db, MagicMock(), candidates, "lucknow")
+
+    # 55 is left unjudged by the AI answer and is kept.
+    assert [cand["osm_id"] for cand in suitable] == [22, 44, 55]
+    judged = judge.await_args.args[2]
+    assert [place["osm_id"] for place in judged] == [33, 44, 55]
+    assert judged[0]["kind"] == "shop=supermarket"
+    assert db.execute.await_count == 2
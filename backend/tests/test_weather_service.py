@@ -0,0 +1,38 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock
+
+from ..services import weather_service
+
+
+def _open_meteo_response(start_epoch, hours):
+    body = {"hourly": {
+        "time": [start_epoch + h * 3600 for h in range(hours)],
+        "temperature_2m": [20.0 + h % 24 for h in range(hours)],
+        "apparent_temperature": [21.0] * hours,
+        "precipitation_probability": [80 if h == 30 else 0 for h in range(hours)],
+        "weathercode": [61 if h == 30 else 0 for h in range(hours)],
+        "wind_speed_10m": [5.0] * hours,
+        "is_day": [1] * hours,
+    }}
+    return MagicMock(json=MagicMock(return_value=body), raise_for_status=MagicMock())
+
+
+@pytest.mark.asyncio
+async def test_hourly_series_is_fetched_once_and_serves_every_leg():
+    day_start = datetime(2031, 3, 1, tzinfo=timezone.utc)
+    http_client = MagicMock()
+    http_client.get = AsyncMock(return_value=_open_meteo_response(int(day_start.timestamp()), 48))
+    trip_start, trip_end = day_start + timedelta(hours=9), day_start + timedelta(hours=31)
+
+    series = await weather_service.get_hourly_series(26.8467, 80.9462, trip_start, trip_end, http_client)
+    again = await weather_service.get_hourly_series(26.8312, 80.9401, trip_start, trip_end, http_client)
+
+    assert http_client.get.await_count == 1
+    assert again == series
+    morning, rainy_leg, outside = weather_service.forecasts_at(
+        series, [trip_start + timedelta(minutes=20), day_start + timedelta(hours=29, minutes=45), day_start + timedelta(days=3)], 330
+    )
+    assert morning.temperature_celsius == 29.0 and morning.time_of_day_descriptor == "Afternoon"
+    assert rainy_leg.condition.description == "Slight rain" and outside is None
+    assert "umbrella" in await weather_service.weather_sentence(None, rainy_leg)
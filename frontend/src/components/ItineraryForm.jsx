@@ -5,9 +5,20 @@ import { toast } from 'react-toastify';
 import DatePicker from 'react-datepicker';
 import "react-datepicker/dist/react-datepicker.css";
 import { useDebounce } from '../hooks/useDebounce';
-import { apiNominatimSearch, apiReverseGeocode } from '../services/api';
+import { apiAutocompletePlaces, apiNominatimSearch, apiReverseGeocode } from '../services/api';
 import styles from './ItineraryForm.module.css';
 
+// Below this many local suggestions (gazetteer + past geocodes), Nominatim is asked as well.
+const MIN_LOCAL_SUGGESTIONS = 3;
+
+const searchPlaces = async (query) => {
+  const local = await apiAutocompletePlaces(query).catch(() => []);
+  if (local.length >= MIN_LOCAL_SUGGESTIONS) return local;
+  const remote = await apiNominatimSearch(query).catch(() => []);
+  const seen = new Set(local.map(result => result.display_name.toLowerCase()));
+  return [...local, ...(remote || []).filter(result => !seen.has(result.display_name.toLowerCase()))];
+};
+
 const calculateDurationString = (startStr, endStr) => {
     if (!startStr || !endStr) return "";
     try {
@@ -102,8 +113,11 @@ function ItineraryForm({ onSubmit, activeLoader }) {
   useEffect(() => {
     if (debouncedSearchTerm && !latitude && !locationInputText.startsWith('[')) {
         setIsSearchLoading(true);
-        apiNominatimSearch(debouncedSearchTerm).then(results => {
-            setSearchResults(results || []);
+        searchPlaces(debouncedSearchTerm).then(results => {
+            setSearchResults(results);
+        }).catch(() => {
+            setSearchResults([]);
+        }).finally(() => {
             setIsSearchLoading(false);
         });
     } else {
@@ -333,7 +347,7 @@ function ItineraryForm({ onSubmit, activeLoader }) {
                                     <li style={{padding: '10px', color: '#888'}}>Searching...</li>
                                 ) : (
                                     searchResults.map(result => (
-                                        <li key={result.place_id} onClick={() => handleLocationSelect(result)} style={{padding: '10px', cursor: 'pointer', borderBottom: '1px solid #eee'}}>
+                                        <li key={`${result.lat},${result.lon},${result.display_name}`} onClick={() => handleLocationSelect(result)} style={{padding: '10px', cursor: 'pointer', borderBottom: '1px solid #eee'}}>
                                             {result.display_name}
                                         </li>
                                     ))
@@ -201,6 +201,14 @@ export const apiNominatimSearch = async (query) => {
     return handleResponse(response);
 };
 
+// Served from the backend's local index (gazetteer + past geocodes); each suggestion has lat/lon.
+export const apiAutocompletePlaces = async (query, limit = 8) => {
+    if (!query) return [];
+    const response = await customFetch(`${API_BASE_URL}/api/itinerary/autocomplete?q=${encodeURIComponent(query)}&limit=${limit}`);
+    const data = await handleResponse(response);
+    return data.suggestions || [];
+};
+
 export const apiReverseGeocode = async (lat, lon) => {
     const response = await customFetch(`${API_BASE_URL}/api/itinerary/reverse-geocode?lat=${lat}&lon=${lon}`);
     return handleResponse(response);